@@ -0,0 +1,192 @@
+"""Online backups of the bot database while the bot keeps running.
+
+Each database file (``bot.db``, or every shard) is copied with SQLite's
+online backup API, ``BACKUP_PAGES_PER_STEP`` pages at a time with a short
+sleep between steps, on a worker thread with its own connection: the event
+loop and the DB thread keep serving commands. The copy is checked with
+``PRAGMA integrity_check``, gzip-compressed to
+``BACKUP_DIR/<name>-YYYYmmdd-HHMMSS.db.gz`` and only the newest
+``BACKUP_KEEP`` snapshots per file are kept.
+
+A write from another connection makes the backup API restart. If that
+happens ``BACKUP_MAX_RESTARTS`` times, the file is copied in a single step
+instead, which in WAL mode still does not block writers.
+
+Runs every ``BACKUP_INTERVAL_SECONDS`` (0 disables) once :func:`start` is
+called, on demand through the owner ``backup`` command, or from the shell::
+
+    python scripts/backup_db.py
+
+Restore by stopping the bot and un-gzipping a snapshot over ``bot.db``.
+"""
+import asyncio
+import glob
+import gzip
+import logging
+import os
+import shutil
+import sqlite3
+import time
+from typing import NamedTuple
+
+import config
+import ledger
+import sharding
+
+logger = logging.getLogger('bot')
+
+_lock = asyncio.Lock()
+_task = None
+
+
+class BackupResult(NamedTuple):
+    source: str
+    path: str | None   # the .db.gz written, None if the check failed
+    pages: int
+    size: int          # compressed bytes
+    restarts: int
+    integrity: str     # 'ok' or the first integrity_check message
+    seconds: float
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+def _snapshot_name(source: str, stamp: str) -> str:
+    base = os.path.splitext(os.path.basename(source))[0]
+    return f'{base}-{stamp}.db'
+
+
+def _copy(source: str, target: str, pages: int, sleep: float) -> tuple:
+    """Online-backup source into target. Returns (page_count, restarts)."""
+    restarts = 0
+    last = None
+
+    def progress(status, remaining, total):
+        nonlocal restarts, last
+        if last is not None and remaining > last:
+            # another connection wrote to the source; SQLite started over
+            restarts += 1
+            if restarts >= config.BACKUP_MAX_RESTARTS:
+                raise _TooManyRestarts()
+        last = remaining
+
+    src = sqlite3.connect(source, timeout=config.DB_BUSY_TIMEOUT_MS / 1000)
+    try:
+        dst = sqlite3.connect(target)
+        try:
+            try:
+                src.backup(dst, pages=max(pages, 1), progress=progress, sleep=sleep)
+            except _TooManyRestarts:
+                # one step = one read transaction, so nothing can restart it
+                src.backup(dst, pages=-1)
+            page_count = dst.execute("PRAGMA page_count").fetchone()[0]
+        finally:
+            dst.close()
+    finally:
+        src.close()
+    return page_count, restarts
+
+
+def _check(path: str) -> str:
+    conn = sqlite3.connect(path)
+    try:
+        rows = conn.execute("PRAGMA integrity_check").fetchall()
+    finally:
+        conn.close()
+    return rows[0][0] if rows else 'no result'
+
+
+def _compress(path: str) -> str:
+    out = path + '.gz'
+    with open(path, 'rb') as f, gzip.open(out + '.tmp', 'wb', compresslevel=config.BACKUP_GZIP_LEVEL) as g:
+        shutil.copyfileobj(f, g, 1024 * 1024)
+    os.replace(out + '.tmp', out)
+    os.remove(path)
+    return out
+
+
+def rotate(source: str, directory: str, keep: int) -> list:
+    """Delete all but the newest ``keep`` snapshots of source. Returns the removed paths."""
+    base = os.path.splitext(os.path.basename(source))[0]
+    # names end in a fixed-width timestamp, so lexical order is age order
+    snapshots = sorted(glob.glob(os.path.join(directory, f'{glob.escape(base)}-????????-??????.db.gz')))
+    removed = snapshots[:-keep] if keep > 0 else []
+    for path in removed:
+        os.remove(path)
+    return removed
+
+
+def backup_file(source: str, directory: str | None = None, stamp: str | None = None) -> BackupResult:
+    """Back up one database file. Blocking; run it off the event loop."""
+    directory = directory or config.BACKUP_DIR
+    os.makedirs(directory, exist_ok=True)
+    stamp = stamp or time.strftime('%Y%m%d-%H%M%S')
+    started = time.monotonic()
+    target = os.path.join(directory, _snapshot_name(source, stamp))
+    pages, restarts = _copy(source, target, config.BACKUP_PAGES_PER_STEP, config.BACKUP_STEP_SLEEP_MS / 1000)
+    integrity = _check(target)
+    if integrity != 'ok':
+        # keep the bad copy out of rotation but on disk for inspection
+        os.replace(target, target + '.corrupt')
+        return BackupResult(source, None, pages, 0, restarts, integrity, time.monotonic() - started)
+    path = _compress(target)
+    rotate(source, directory, config.BACKUP_KEEP)
+    return BackupResult(source, path, pages, os.path.getsize(path), restarts, integrity,
+                        time.monotonic() - started)
+
+
+def backup_all(directory: str | None = None) -> list:
+    """Back up every database file in use (one per shard). Blocking."""
+    stamp = time.strftime('%Y%m%d-%H%M%S')
+    return [backup_file(p, directory, stamp) for p in sharding.all_paths() if os.path.exists(p)]
+
+
+async def run(directory: str | None = None) -> list:
+    """Back up every database file from async code; runs are never concurrent."""
+    if config.STORAGE_BACKEND.lower() != 'sqlite':
+        return []
+    from database_async import run_db
+    from storage import backend
+    async with _lock:
+        # commit writes held back by group commit / the ledger buffer so the
+        # snapshot has them
+        await ledger.flush()
+        await run_db(backend.flush)
+        # a worker thread with its own connections; the DB thread is never involved
+        results = await asyncio.to_thread(backup_all, directory)
+        for r in results:
+            if r.path:
+                logger.info(f'[backup] {r.source} -> {r.path} ({r.pages} pages, {r.size} bytes, '
+                            f'{r.restarts} restarts, {r.seconds:.1f}s)')
+            else:
+                logger.error(f'[backup] {r.source}: integrity check failed: {r.integrity}')
+        return results
+
+
+async def _scheduler():
+    interval = config.BACKUP_INTERVAL_SECONDS
+    try:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await run()
+            except Exception:
+                logger.exception('[backup] scheduled backup failed')
+    except asyncio.CancelledError:
+        return
+
+
+def start():
+    """Start scheduled backups (if BACKUP_INTERVAL_SECONDS > 0). Call once the loop runs."""
+    global _task
+    if _task is None and config.BACKUP_INTERVAL_SECONDS > 0:
+        _task = asyncio.get_running_loop().create_task(_scheduler())
+
+
+def shutdown():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        _task = None
@@ -0,0 +1,119 @@
+"""In-process LRU caches for hot database rows.
+
+The profile and XP rows of active players are read on nearly every command,
+and the guild config (prefix) on every message. ``database`` keeps them here
+and writes through or invalidates on every update, so repeat reads never touch
+SQLite.
+
+Each cache is bounded by ``CACHE_MAX_ENTRIES`` (least recently used entries are
+evicted first) and entries older than ``CACHE_TTL_SECONDS`` are re-read, which
+bounds staleness if something outside the bot edits the database.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+import config
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe LRU cache with an optional per-entry TTL and hit/miss counters."""
+
+    def __init__(self, name: str, max_entries: int, ttl: float = 0):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (stored_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=_MISSING):
+        """Return the cached value, or ``default`` (``_MISSING``) on a miss."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if not self.ttl or time.monotonic() - stored_at < self.ttl:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def peek(self, key, default=None):
+        """The cached value without counting a lookup or refreshing its recency."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or (self.ttl and time.monotonic() - entry[0] >= self.ttl):
+                return default
+            return entry[1]
+
+    def update(self, key, **fields):
+        """Merge ``fields`` into a cached dict value. Does nothing if ``key`` is not cached."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                self._data[key] = (stored_at, {**value, **fields})
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'name': self.name,
+            'size': len(self._data),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+
+_max_entries = config.CACHE_MAX_ENTRIES if config.CACHE_ENABLED else 0
+
+# (guild_id, user_id) -> get_profile() dict
+profiles = LRUCache('user_profile', _max_entries, config.CACHE_TTL_SECONDS)
+# (guild_id, user_id) -> xp
+user_xp = LRUCache('user_xp', _max_entries, config.CACHE_TTL_SECONDS)
+# guild_id -> database.GuildConfig. Read for every message (prefix), written
+# almost never, so no TTL: the setters invalidate explicitly.
+guild_configs = LRUCache('guild_config', _max_entries)
+
+_ALL = (profiles, user_xp, guild_configs)
+
+
+def stats() -> list:
+    """Counters for every cache, e.g. for an owner command or the logs."""
+    return [c.stats() for c in _ALL]
+
+
+def clear_all():
+    """Drop every cached row (after a rollback, restore or manual DB edit)."""
+    for c in _ALL:
+        c.clear()
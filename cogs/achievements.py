@@ -1,6 +1,6 @@
 import discord
 from discord.ext import commands
-from database import award_achievement, list_user_achievements, set_selected_badge, get_selected_badge
+from database_async import award_achievement, list_user_achievements, set_selected_badge, get_selected_badge
 
 BADGES = {
     'starter': ('Pemula', 'Badge untuk pemain baru'),
@@ -39,7 +39,7 @@ class Achievements(commands.Cog):
         if not ctx.guild:
             await ctx.reply('Hanya di server')
             return
-        rows = list_user_achievements(ctx.guild.id, member.id)
+        rows = await list_user_achievements(ctx.guild.id, member.id)
         if not rows:
             await ctx.reply('Belum ada badge')
             return
@@ -47,7 +47,7 @@ class Achievements(commands.Cog):
         for key, ts in rows:
             name, desc = BADGES.get(key, (key, ''))
             lines.append(f"**{name}** (`{key}`) — {desc}")
-        sel = get_selected_badge(ctx.guild.id, member.id)
+        sel = await get_selected_badge(ctx.guild.id, member.id)
         footer = f"Selected: {sel}" if sel else "No badge selected"
         await ctx.reply(embed=discord.Embed(title=f"Badges — {member.display_name}", description='\n'.join(lines), color=0xF39C12).set_footer(text=footer))
 
@@ -85,7 +85,7 @@ class Achievements(commands.Cog):
             await ctx.reply('Hanya staff (Manage Guild) atau owner bot yang dapat memberikan badge ke owner')
             return
         owner_id = ctx.guild.owner_id
-        award_achievement(ctx.guild.id, owner_id, badge_key)
+        await award_achievement(ctx.guild.id, owner_id, badge_key)
         owner_member = ctx.guild.get_member(owner_id)
         name = owner_member.display_name if owner_member else f"Owner ({owner_id})"
         await ctx.reply(f'✅ Badge `{badge_key}` diberikan ke **{name}**')
@@ -103,12 +103,12 @@ award <member> <badge_key> — staff: award a badge to a user
                 return
             key = args.strip()
             # check ownership of badge
-            rows = list_user_achievements(ctx.guild.id, ctx.author.id)
+            rows = await list_user_achievements(ctx.guild.id, ctx.author.id)
             owned = [r[0] for r in rows]
             if key not in owned:
                 await ctx.reply('Kamu belum mendapatkan badge ini')
                 return
-            set_selected_badge(ctx.guild.id, ctx.author.id, key)
+            await set_selected_badge(ctx.guild.id, ctx.author.id, key)
             await ctx.reply(f'✅ Badge `{key}` dipilih')
             return
 
@@ -132,7 +132,7 @@ award <member> <badge_key> — staff: award a badge to a user
             except Exception:
                 await ctx.reply('Member tidak ditemukan')
                 return
-            set_selected_badge(ctx.guild.id, member.id, badge_key)
+            await set_selected_badge(ctx.guild.id, member.id, badge_key)
             await ctx.reply(f'✅ Badge `{badge_key}` dipaksa dipilih untuk **{member.display_name}**')
             return
 
@@ -155,7 +155,7 @@ award <member> <badge_key> — staff: award a badge to a user
             except Exception:
                 await ctx.reply('Member tidak ditemukan')
                 return
-            award_achievement(ctx.guild.id, member.id, badge_key)
+            await award_achievement(ctx.guild.id, member.id, badge_key)
             await ctx.reply(f'✅ Badge `{badge_key}` diberikan ke **{member.display_name}**')
             return
 
@@ -171,7 +171,7 @@ async def setup(bot: commands.Bot):
         for g in bot.guilds:
             for key in BADGES.keys():
                 try:
-                    award_achievement(g.id, owner.id, key)
+                    await award_achievement(g.id, owner.id, key)
                 except Exception:
                     continue
     except Exception:
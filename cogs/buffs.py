@@ -1,6 +1,6 @@
 import discord
 from discord.ext import commands
-from database import get_active_buffs, delete_buff
+from database_async import get_active_buffs, delete_buff
 
 
 class Buffs(commands.Cog):
@@ -15,7 +15,7 @@ class Buffs(commands.Cog):
         if not ctx.guild:
             await ctx.reply('Hanya di server')
             return
-        rows = get_active_buffs(ctx.guild.id, member.id)
+        rows = await get_active_buffs(ctx.guild.id, member.id)
         if not rows:
             await ctx.reply('Tidak ada buff aktif')
             return
@@ -31,7 +31,7 @@ class Buffs(commands.Cog):
         if not ctx.guild:
             await ctx.reply('Hanya di server')
             return
-        delete_buff(ctx.guild.id, member.id, buff_key)
+        await delete_buff(ctx.guild.id, member.id, buff_key)
         await ctx.reply(f'✅ Buff `{buff_key}` dihapus dari **{member.display_name}**')
 
 
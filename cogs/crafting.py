@@ -1,6 +1,7 @@
 import discord
 from discord.ext import commands
-from database import get_inventory, remove_item, add_item, get_profile, spend_gold
+from database_async import run_db
+from storage import backend as db
 
 # Simple recipes: name -> {ingredients: {item_name: qty}, result: (item_name, qty), cost_gold}
 RECIPES = {
@@ -25,6 +26,32 @@ RECIPES = {
 }
 
 
+def _craft(guild_id, user_id, recipe):
+    """Consume ingredients and gold and add the result in one transaction.
+
+    Runs on the DB thread. Returns None on success, otherwise the reply
+    explaining why nothing was changed.
+    """
+    with db.transaction(guild_id):
+        inv_map = {row[0]: row[1] for row in db.get_inventory(guild_id, user_id)}
+        # check ingredients
+        missing = []
+        for item_name, qty in recipe['ingredients'].items():
+            if inv_map.get(item_name, 0) < qty:
+                missing.append(f"{item_name} x{qty}")
+        if missing:
+            return f"Bahan kurang: {', '.join(missing)}"
+        # charge gold
+        cost = recipe.get('cost_gold', 0)
+        if cost and not db.spend_gold(guild_id, user_id, cost):
+            return 'Gold tidak cukup untuk crafting'
+        # consume ingredients
+        db.remove_items_bulk(guild_id, user_id, recipe['ingredients'].items())
+        # give result
+        db.add_items_bulk(guild_id, user_id, [recipe['result']])
+    return None
+
+
 class Crafting(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
@@ -66,31 +93,11 @@ class Crafting(commands.Cog):
             await ctx.reply('Recipe tidak ditemukan')
             return
         v = RECIPES[key]
-        inv = get_inventory(guild_id, user_id)
-        inv_map = {row[0]: row[1] for row in inv}
-        # check ingredients
-        missing = []
-        for item_name, qty in v['ingredients'].items():
-            if inv_map.get(item_name, 0) < qty:
-                missing.append(f"{item_name} x{qty}")
-        if missing:
-            await ctx.reply(f"Bahan kurang: {', '.join(missing)}")
-            return
-        # check gold
-        cost = v.get('cost_gold', 0)
-        profile = get_profile(guild_id, user_id)
-        if cost and profile['gold'] < cost:
-            await ctx.reply('Gold tidak cukup untuk crafting')
+        error = await run_db(_craft, guild_id, user_id, v)
+        if error:
+            await ctx.reply(error)
             return
-        # consume ingredients
-        for item_name, qty in v['ingredients'].items():
-            remove_item(guild_id, user_id, item_name, qty=qty)
-        # charge gold
-        if cost:
-            spend_gold(guild_id, user_id, cost)
-        # give result
         result_name, result_qty = v['result']
-        add_item(guild_id, user_id, result_name, qty=result_qty)
         await ctx.reply(f'✅ Berhasil craft {result_qty}x {result_name}!')
 
 
@@ -2,7 +2,7 @@ import random
 import time
 import discord
 from discord.ext import commands
-from database import (
+from database_async import (
     get_daily_quest,
     create_daily_quest,
     increment_daily_progress,
@@ -35,7 +35,7 @@ class Daily(commands.Cog):
         guild_id = ctx.guild.id
         user_id = ctx.author.id
 
-        q = get_daily_quest(guild_id, user_id)
+        q = await get_daily_quest(guild_id, user_id)
         if not q:
             # create random quest
             template = random.choice(DAILY_POOL)
@@ -45,8 +45,8 @@ class Daily(commands.Cog):
                 t = random.randint(target[0], target[1])
             else:
                 t = target
-            create_daily_quest(guild_id, user_id, quest_key, target=t, reward_gold=reward_gold, reward_xp=reward_xp, reward_item=reward_item)
-            q = get_daily_quest(guild_id, user_id)
+            await create_daily_quest(guild_id, user_id, quest_key, target=t, reward_gold=reward_gold, reward_xp=reward_xp, reward_item=reward_item)
+            q = await get_daily_quest(guild_id, user_id)
             desc = desc_template.format(target=t)
         else:
             # find description from pool
@@ -60,7 +60,10 @@ class Daily(commands.Cog):
 
         embed = discord.Embed(title="🎯 Quest Harian", color=0xF1C40F)
         embed.add_field(name="Quest", value=desc, inline=False)
-        embed.add_field(name="Progress", value=f"{q['progress']}/{q['target']}", inline=True)
+        progress = f"{q['progress']}/{q['target']}"
+        if q['completed']:
+            progress += " ✅ Selesai"
+        embed.add_field(name="Progress", value=progress, inline=True)
         rewards = []
         if q['reward_gold']:
             rewards.append(f"{q['reward_gold']} gold")
@@ -69,7 +72,10 @@ class Daily(commands.Cog):
         if q['reward_item']:
             rewards.append(q['reward_item'])
         embed.add_field(name="Reward", value=", ".join(rewards) if rewards else "(none)", inline=True)
-        embed.set_footer(text="Quest akan direset 24 jam sejak dibuat")
+        if q['completed']:
+            embed.set_footer(text="Quest hari ini sudah selesai, quest baru tersedia besok")
+        else:
+            embed.set_footer(text="Quest akan direset 24 jam sejak dibuat")
         await ctx.reply(embed=embed)
 
     @commands.hybrid_command(name="progress", with_app_command=True)
@@ -80,7 +86,7 @@ class Daily(commands.Cog):
             return
         guild_id = ctx.guild.id
         user_id = ctx.author.id
-        res = increment_daily_progress(guild_id, user_id, amount=amount)
+        res = await increment_daily_progress(guild_id, user_id, amount=amount)
         if res.get('error') == 'no_quest':
             await ctx.reply('Belum ada quest hari ini. Jalankan `!quest` untuk membuat quest.')
             return
@@ -125,6 +131,8 @@ class Daily(commands.Cog):
                 await ctx.reply(embed=embed, file=f)
             except Exception:
                 pass
+        elif res.get('completed'):
+            await ctx.reply('Quest hari ini sudah selesai dan reward sudah diklaim. Quest baru tersedia besok.')
         else:
             await ctx.reply(f"Progress tercatat: {res.get('progress')}/{res.get('target')}")
 
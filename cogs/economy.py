@@ -1,35 +1,24 @@
 import discord
 from discord.ext import commands
 import random
-import time
 import asyncio
 from datetime import datetime, timedelta
-import re
-
-
-def slugify(name: str) -> str:
-    s = name.lower()
-    s = re.sub(r"[^a-z0-9]+", "_", s)
-    return s.strip("_")
-from database import (
-    list_shop_items,
+from models import slugify
+from database_async import (
+    list_shop_items_with_stats,
     get_shop_item,
     add_shop_item,
+    add_shop_items_bulk,
     remove_shop_item,
-    get_user_xp,
-    set_user_xp,
     get_inventory,
-    get_shop_item_with_stats,
-    add_item,
+    find_inventory_item,
     set_equipped,
-    get_equipped_items,
+    get_shop_item_with_stats,
     spend_gold,
-    get_cooldown,
-    set_cooldown,
-    add_user_xp,
-    add_gold,
-    add_buff,
 )
+import cooldowns
+from database_async import run_db
+from storage import backend as db
 # Larger pool of possible shop items used for refresh
 SHOP_POOL = [
     ("Sword of Light", 200, "ATK +10", 10, 0, 'weapon'),
@@ -49,6 +38,54 @@ SHOP_POOL = [
 ]
 
 
+def _equip(guild_id, user_id, name, slot):
+    """Swap out same-slot items and equip this one in one transaction (DB thread).
+
+    set_equipped keeps the player's equipment bonus totals current; the base
+    atk/def are not touched.
+    """
+    with db.transaction(guild_id):
+        # auto-unequip any item in the same slot
+        if slot and slot != 'none':
+            for ename, eq_qty, eslot in db.get_equipped_items(guild_id, user_id):
+                if eslot == slot and ename != name:
+                    db.set_equipped(guild_id, user_id, ename, False)
+        db.set_equipped(guild_id, user_id, name, True)
+
+
+def _grant_daily(guild_id, user_id, xp_gain, gold_gain):
+    """Apply the daily reward in one transaction (DB thread). Returns the dropped item or None."""
+    with db.transaction(guild_id):
+        db.add_user_xp(guild_id, user_id, xp_gain)
+        db.add_gold(guild_id, user_id, gold_gain)
+        # small chance to drop an item from shop
+        shop_items = db.list_shop_items(guild_id)
+        if shop_items and random.random() < 0.25:
+            # pick an item name from shop list
+            choice_name = random.choice(shop_items)[0]
+            db.add_item(guild_id, user_id, choice_name)
+            return choice_name
+    return None
+
+
+def _buy(guild_id, user_id, name, price, buff):
+    """Spend the XP and deliver the item in one transaction (DB thread).
+
+    buff is (stat, amount, duration) for buff items, None for inventory items.
+    Returns None on success, otherwise the user's XP balance (too low; nothing
+    was changed).
+    """
+    with db.transaction(guild_id):
+        # single conditional UPDATE, fails if balance too low
+        if db.spend_user_xp(guild_id, user_id, price) is None:
+            return db.get_user_xp(guild_id, user_id)
+        if buff:
+            db.add_buff(guild_id, user_id, name, *buff)
+        else:
+            db.add_item(guild_id, user_id, name)
+    return None
+
+
 class Economy(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
@@ -60,33 +97,19 @@ class Economy(commands.Cog):
         if not ctx.guild:
             await ctx.reply('Shop hanya tersedia di server')
             return
-        items = list_shop_items(ctx.guild.id)
+        # one query for names, prices and stats
+        items = await list_shop_items_with_stats(ctx.guild.id)
         # If shop is empty, seed some default items so it's not empty
         if not items:
             # choose a few items from pool to seed
             sample = random.sample(SHOP_POOL, min(len(SHOP_POOL), 6))
-            for name, price, desc, atk, defn, slot in sample:
-                add_shop_item(ctx.guild.id, name, price, desc, atk, defn, slot)
-            items = list_shop_items(ctx.guild.id)
+            await add_shop_items_bulk(ctx.guild.id, sample)
+            items = await list_shop_items_with_stats(ctx.guild.id)
         if not items:
             await ctx.reply('Shop kosong di server ini')
             return
-        def slugify(name: str) -> str:
-            s = name.lower()
-            s = re.sub(r"[^a-z0-9]+", "_", s)
-            s = s.strip("_")
-            return s
-
         lines = []
-        for name, price, desc in items:
-            # fetch stats to see if this is a buff
-            row = get_shop_item_with_stats(ctx.guild.id, name)
-            atk_b = 0
-            def_b = 0
-            slot = 'none'
-            if row:
-                _, _, _, atk_b, def_b, slot = row
-
+        for name, price, desc, atk_b, def_b, slot in items:
             slug = slugify(name)
             extra = ''
             if slot == 'buff':
@@ -110,34 +133,14 @@ class Economy(commands.Cog):
         if not ctx.guild:
             await ctx.reply('Command hanya di server')
             return
-        row = get_shop_item_with_stats(ctx.guild.id, item_name)
-        # fallback: try case-insensitive exact match if direct lookup fails
+        # exact name, any casing, or slug (e.g. sword_of_light)
+        row = await get_shop_item_with_stats(ctx.guild.id, item_name)
         if not row:
-            items = list_shop_items(ctx.guild.id)
-            found_name = None
-            for name, price, desc in items:
-                # direct case-insensitive match
-                if name.lower() == item_name.lower():
-                    found_name = name
-                    break
-                # slug match (e.g. sword_of_light)
-                slug = re.sub(r"[^a-z0-9]+", "_", name.lower()).strip('_')
-                if slug == item_name.lower():
-                    found_name = name
-                    break
-            if found_name:
-                row = get_shop_item_with_stats(ctx.guild.id, found_name)
-            else:
-                await ctx.reply('Item tidak ditemukan')
-                return
-        name, price, desc, atk_bonus, def_bonus, slot = row
-        xp = get_user_xp(ctx.guild.id, ctx.author.id)
-        if xp < price:
-            await ctx.reply(f'XP kamu kurang: {xp} XP (harga {price} XP)')
+            await ctx.reply('Item tidak ditemukan')
             return
-        # deduct xp
-        set_user_xp(ctx.guild.id, ctx.author.id, xp - price)
+        name, price, desc, atk_bonus, def_bonus, slot = row
         # If item is a temporary buff (slot == 'buff'), interpret atk as amount and def as duration (seconds)
+        buff = None
         if slot == 'buff':
             try:
                 buff_amount = int(atk_bonus or 0)
@@ -147,10 +150,14 @@ class Economy(commands.Cog):
                 duration = 3600
             # For simplicity, buff stat chosen by presence: if atk_bonus>0 -> 'atk', else 'def'
             stat = 'atk' if buff_amount > 0 else 'def'
-            add_buff(ctx.guild.id, ctx.author.id, name, stat, buff_amount, duration)
+            buff = (stat, buff_amount, duration)
+        xp = await run_db(_buy, ctx.guild.id, ctx.author.id, name, price, buff)
+        if xp is not None:
+            await ctx.reply(f'XP kamu kurang: {xp} XP (harga {price} XP)')
+            return
+        if buff:
             await ctx.reply(f'✅ Kamu membeli **{name}** dan mendapatkan buff {stat}+{buff_amount} selama {duration} detik')
         else:
-            add_item(ctx.guild.id, ctx.author.id, name)
             await ctx.reply(f'✅ Kamu membeli **{name}** seharga {price} XP')
 
     @commands.hybrid_command(name='shoprefresh', with_app_command=True)
@@ -162,25 +169,13 @@ class Economy(commands.Cog):
             return
         # clamp count
         count = max(1, min(count, len(SHOP_POOL)))
-        # remove existing items
-        existing = list_shop_items(ctx.guild.id)
-        for name, price, desc in existing:
-            remove_shop_item(ctx.guild.id, name)
-        # add random selection
-        sample = random.sample(SHOP_POOL, count)
-        for name, price, desc, atk, defn, slot in sample:
-            add_shop_item(ctx.guild.id, name, price, desc, atk, defn, slot)
+        await self._refresh_guild_shop(ctx.guild.id, count)
         await ctx.reply(f'✅ Shop telah diperbarui dengan {count} item.')
 
     async def _refresh_guild_shop(self, guild_id: int, count: int = 6):
-        # remove existing items
-        existing = list_shop_items(guild_id)
-        for name, price, desc in existing:
-            remove_shop_item(guild_id, name)
-        # add random selection
+        # replace existing items with a random selection, in one transaction
         sample = random.sample(SHOP_POOL, min(count, len(SHOP_POOL)))
-        for name, price, desc, atk, defn, slot in sample:
-            add_shop_item(guild_id, name, price, desc, atk, defn, slot)
+        await add_shop_items_bulk(guild_id, sample, replace=True)
 
     async def _daily_shop_refresher(self):
         """Background task: refresh all guild shops daily at UTC midnight."""
@@ -205,41 +200,24 @@ class Economy(commands.Cog):
             self._refresh_task.cancel()
 
     @commands.hybrid_command(name='daily', with_app_command=True)
+    @cooldowns.check('daily', 86400, '⌛ Kamu sudah klaim daily. Tunggu {h}j {m}m {s}s lagi.')
     async def daily(self, ctx: commands.Context):
         """Claim daily reward: XP, gold, and small chance to get an item (24h cooldown)"""
         if not ctx.guild:
             await ctx.reply('Hanya di server')
             return
-        last = get_cooldown(ctx.guild.id, ctx.author.id, 'daily')
-        now = int(time.time())
-        # owner bypass
-        try:
-            is_owner = await self.bot.is_owner(ctx.author)
-        except Exception:
-            is_owner = False
-        if not is_owner:
-            if last and now - last < 86400:
-                remaining = 86400 - (now - last)
-                h, rem = divmod(remaining, 3600)
-                m, s = divmod(rem, 60)
-                await ctx.reply(f'⌛ Kamu sudah klaim daily. Tunggu {h}j {m}m {s}s lagi.')
-                return
 
         xp_gain = random.randint(20, 50)
         gold_gain = random.randint(10, 30)
-        add_user_xp(ctx.guild.id, ctx.author.id, xp_gain)
-        add_gold(ctx.guild.id, ctx.author.id, gold_gain)
-
-        # small chance to drop an item from shop
-        drop_text = ''
-        shop_items = list_shop_items(ctx.guild.id)
-        if shop_items and random.random() < 0.25:
-            # pick an item name from shop list
-            choice_name = random.choice(shop_items)[0]
-            add_item(ctx.guild.id, ctx.author.id, choice_name)
-            drop_text = f"\n🎁 Kamu juga mendapatkan item: **{choice_name}**"
+        # the cooldown was taken by the check; nothing is written if this
+        # fails, so the user may try again
+        try:
+            choice_name = await run_db(_grant_daily, ctx.guild.id, ctx.author.id, xp_gain, gold_gain)
+        except Exception:
+            cooldowns.release(ctx)
+            raise
+        drop_text = f"\n🎁 Kamu juga mendapatkan item: **{choice_name}**" if choice_name else ''
 
-        set_cooldown(ctx.guild.id, ctx.author.id, 'daily', now)
         await ctx.reply(embed=discord.Embed(
             title='📅 Daily Reward',
             description=f'+{xp_gain} XP, +{gold_gain} gold{drop_text}',
@@ -252,7 +230,7 @@ class Economy(commands.Cog):
         if not ctx.guild:
             await ctx.reply('Hanya di server')
             return
-        inv = get_inventory(ctx.guild.id, ctx.author.id)
+        inv = await get_inventory(ctx.guild.id, ctx.author.id)
         if not inv:
             await ctx.reply('Inventory kosong')
             return
@@ -270,49 +248,19 @@ class Economy(commands.Cog):
             await ctx.reply('Hanya di server')
             return
         # Check ownership
-        inv = get_inventory(ctx.guild.id, ctx.author.id)
-        owned = None
-        target = item_name.lower()
-        for n, qty, equipped, slot in inv:
-            if qty <= 0:
-                continue
-            if n.lower() == target or slugify(n) == target:
-                owned = (n, qty, equipped, slot)
-                break
-        if not owned:
+        owned = await find_inventory_item(ctx.guild.id, ctx.author.id, item_name)
+        if not owned or owned[1] <= 0:
             await ctx.reply('Kamu tidak memiliki item ini')
             return
         name = owned[0]
         # get item stats
-        row = get_shop_item_with_stats(ctx.guild.id, name)
+        row = await get_shop_item_with_stats(ctx.guild.id, name)
         if not row:
             await ctx.reply('Item shop stat tidak ditemukan')
             return
         _, price, desc, atk_bonus, def_bonus, slot = row
 
-        # auto-unequip any item in the same slot
-        if slot and slot != 'none':
-            equipped_items = get_equipped_items(ctx.guild.id, ctx.author.id)
-            for ename, eq_qty, eslot in equipped_items:
-                if eslot == slot and ename != name:
-                    # remove bonuses of existing equipped same-slot item
-                    erow = get_shop_item_with_stats(ctx.guild.id, ename)
-                    if erow:
-                        _, _, _, eatk, edef, _ = erow
-                        from database import get_profile as db_get_profile, update_profile as db_update_profile
-                        prof = db_get_profile(ctx.guild.id, ctx.author.id)
-                        new_atk = max(0, prof['atk'] - (eatk or 0))
-                        new_def = max(0, prof['def'] - (edef or 0))
-                        db_update_profile(ctx.guild.id, ctx.author.id, **{'atk': new_atk, 'def': new_def})
-                    set_equipped(ctx.guild.id, ctx.author.id, ename, False)
-
-        # apply bonuses for this item
-        from database import get_profile as db_get_profile, update_profile as db_update_profile
-        prof = db_get_profile(ctx.guild.id, ctx.author.id)
-        new_atk = prof['atk'] + (atk_bonus or 0)
-        new_def = prof['def'] + (def_bonus or 0)
-        db_update_profile(ctx.guild.id, ctx.author.id, **{'atk': new_atk, 'def': new_def})
-        set_equipped(ctx.guild.id, ctx.author.id, name, True)
+        await run_db(_equip, ctx.guild.id, ctx.author.id, name, slot)
         await ctx.reply(f'✅ **{name}** telah dipasangkan. ATK +{atk_bonus}, DEF +{def_bonus}\nSlot: {slot}')
 
     @commands.hybrid_command(name='unequip', with_app_command=True)
@@ -321,31 +269,18 @@ class Economy(commands.Cog):
         if not ctx.guild:
             await ctx.reply('Hanya di server')
             return
-        inv = get_inventory(ctx.guild.id, ctx.author.id)
-        owned = None
-        target = item_name.lower()
-        for n, qty, equipped, slot in inv:
-            if not equipped:
-                continue
-            if n.lower() == target or slugify(n) == target:
-                owned = (n, qty, equipped, slot)
-                break
-        if not owned:
+        owned = await find_inventory_item(ctx.guild.id, ctx.author.id, item_name)
+        if not owned or not owned[2]:
             await ctx.reply('Item tidak terpasang')
             return
         name = owned[0]
-        row = get_shop_item_with_stats(ctx.guild.id, name)
-        if not row:
-            await ctx.reply('Item shop stat tidak ditemukan')
-            return
-        _, price, desc, atk_bonus, def_bonus, slot = row
-        from database import get_profile as db_get_profile, update_profile as db_update_profile
-        prof = db_get_profile(ctx.guild.id, ctx.author.id)
-        new_atk = max(0, prof['atk'] - (atk_bonus or 0))
-        new_def = max(0, prof['def'] - (def_bonus or 0))
-        db_update_profile(ctx.guild.id, ctx.author.id, **{'atk': new_atk, 'def': new_def})
-        set_equipped(ctx.guild.id, ctx.author.id, name, False)
-        await ctx.reply(f'✅ **{name}** dilepas. ATK -{atk_bonus}, DEF -{def_bonus}')
+        # the bonus comes off even if the item has since left the shop
+        await set_equipped(ctx.guild.id, ctx.author.id, name, False)
+        row = await get_shop_item_with_stats(ctx.guild.id, name)
+        if row:
+            await ctx.reply(f'✅ **{name}** dilepas. ATK -{row[3]}, DEF -{row[4]}')
+        else:
+            await ctx.reply(f'✅ **{name}** dilepas.')
 
     @commands.is_owner()
     @commands.hybrid_command(name='shopadd', with_app_command=True)
@@ -354,7 +289,7 @@ class Economy(commands.Cog):
         if not ctx.guild:
             await ctx.reply('Hanya untuk server')
             return
-        add_shop_item(ctx.guild.id, item_name, price, description)
+        await add_shop_item(ctx.guild.id, item_name, price, description)
         await ctx.reply(f'✅ Item **{item_name}** disimpan dengan harga {price} XP')
 
     @commands.is_owner()
@@ -364,7 +299,7 @@ class Economy(commands.Cog):
         if not ctx.guild:
             await ctx.reply('Hanya untuk server')
             return
-        remove_shop_item(ctx.guild.id, item_name)
+        await remove_shop_item(ctx.guild.id, item_name)
         await ctx.reply(f'✅ Item **{item_name}** dihapus')
 
 
@@ -0,0 +1,96 @@
+import asyncio
+import logging
+import time
+
+from discord.ext import commands
+
+import config
+from database_async import run_db
+from storage import backend as db
+
+logger = logging.getLogger('bot')
+
+# what each purge kind removes, for the summary message
+PURGE_LABELS = {
+    'buffs': 'buff kedaluwarsa',
+    'daily_quests': 'quest harian lama',
+    'cooldowns': 'cooldown basi',
+}
+
+
+class Housekeeping(commands.Cog):
+    """Background retention: purge dead rows in small batches and compact when idle.
+
+    Every HOUSEKEEPING_INTERVAL_SECONDS expired buffs, past daily quests and
+    cooldowns older than COOLDOWN_RETENTION_SECONDS are deleted, one executor
+    job per batch so commands run in between. After HOUSEKEEPING_QUIET_SECONDS
+    without commands it also runs ``PRAGMA incremental_vacuum`` and
+    ``PRAGMA optimize``. Files created before auto_vacuum=INCREMENTAL need one
+    ``python scripts/migrate_db.py --vacuum`` with the bot stopped.
+    """
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self._last_command = time.monotonic()
+        self._lock = asyncio.Lock()
+        self._task = self.bot.loop.create_task(self._housekeeper())
+
+    @commands.Cog.listener()
+    async def on_command_completion(self, ctx: commands.Context):
+        self._last_command = time.monotonic()
+
+    def _is_quiet(self) -> bool:
+        return time.monotonic() - self._last_command >= config.HOUSEKEEPING_QUIET_SECONDS
+
+    async def _purge(self, kind: str) -> int:
+        total = 0
+        for _ in range(max(config.HOUSEKEEPING_MAX_BATCHES, 1)):
+            # one executor job per batch so commands queue between them
+            n = await run_db(db.purge_expired_batch, kind, config.HOUSEKEEPING_BATCH_SIZE)
+            total += n
+            if n < config.HOUSEKEEPING_BATCH_SIZE:
+                break
+            await asyncio.sleep(0)
+        return total
+
+    async def run_once(self, force_compact: bool = False) -> dict:
+        """Purge every kind, then compact if the bot is idle (or forced)."""
+        async with self._lock:
+            report = {}
+            for kind in PURGE_LABELS:
+                report[kind] = await self._purge(kind)
+            report['compact'] = None
+            if force_compact or self._is_quiet():
+                report['compact'] = await run_db(db.compact, config.HOUSEKEEPING_VACUUM_PAGES)
+            logger.info('[housekeeping] %s', report)
+            return report
+
+    async def _housekeeper(self):
+        await self.bot.wait_until_ready()
+        try:
+            while True:
+                await asyncio.sleep(max(config.HOUSEKEEPING_INTERVAL_SECONDS, 60))
+                try:
+                    await self.run_once()
+                except Exception:
+                    logger.exception('[housekeeping] run failed')
+        except asyncio.CancelledError:
+            return
+
+    def cog_unload(self):
+        if self._task and not self._task.cancelled():
+            self._task.cancel()
+
+    @commands.is_owner()
+    @commands.hybrid_command(name='housekeeping', with_app_command=True)
+    async def housekeeping(self, ctx: commands.Context):
+        """Owner: purge expired rows and compact the database now"""
+        report = await self.run_once(force_compact=True)
+        lines = [f'• {PURGE_LABELS[k]}: {report[k]} baris' for k in PURGE_LABELS]
+        comp = report['compact']
+        lines.append(f"• halaman dibebaskan: {comp['pages_freed']} (sisa kosong {comp['pages_free']})")
+        await ctx.reply('🧹 Housekeeping selesai\n' + '\n'.join(lines))
+
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(Housekeeping(bot))
@@ -3,9 +3,14 @@ import discord
 import logging
 from discord.ext import commands
 from redis_client import set_bot_enabled
-from database import set_prefix_db
-from database import set_user_xp
-from database import add_shop_item, update_profile
+from database_async import set_prefix_db
+from database_async import set_user_xp
+from database_async import add_shop_items_bulk, update_profile
+from database_async import get_ledger_history, get_ledger_summary
+import backup
+import config
+import guild_export
+import ledger
 from cogs.rpg import load_monsters, save_monsters
 
 
@@ -61,13 +66,13 @@ class Owner(commands.Cog):
             if not monsters:
                 await ctx.reply('Belum ada monster untuk di-balance')
                 return
-            # compute average player level from xp
-            from database import get_all_user_xp
-            xps = get_all_user_xp(ctx.guild.id)
-            if not xps:
+            # compute average player level from xp (aggregated in SQL)
+            from database_async import get_xp_stats
+            stats = await get_xp_stats(ctx.guild.id, percentiles=())
+            if not stats.count:
                 await ctx.reply('Tidak ada data pemain untuk menghitung rata-rata level')
                 return
-            avg_xp = sum(xps) / len(xps)
+            avg_xp = stats.avg
             avg_level = max(1, int(avg_xp // 100))
             # target average monster HP
             target_avg_hp = 100 * avg_level
@@ -111,7 +116,7 @@ class Owner(commands.Cog):
         if len(prefix) > 5:
             await ctx.reply("Prefix terlalu panjang (maks 5 karakter)")
             return
-        set_prefix_db(ctx.guild.id, prefix)
+        await set_prefix_db(ctx.guild.id, prefix)
         await ctx.reply(f"✅ Prefix server diubah menjadi `{prefix}`")
 
     @commands.is_owner()
@@ -172,7 +177,7 @@ class Owner(commands.Cog):
         if not ctx.guild:
             await ctx.reply('Hanya bisa di server')
             return
-        set_user_xp(ctx.guild.id, member.id, xp)
+        await set_user_xp(ctx.guild.id, member.id, xp)
         await ctx.reply(f'✅ XP untuk **{member.display_name}** di-set ke {xp} XP')
 
     @commands.is_owner()
@@ -187,9 +192,119 @@ class Owner(commands.Cog):
         if stat not in allowed:
             await ctx.reply(f"Stat tidak valid. Pilih salah satu: {', '.join(sorted(allowed))}")
             return
-        update_profile(ctx.guild.id, member.id, **{stat: value})
+        await update_profile(ctx.guild.id, member.id, **{stat: value})
         await ctx.reply(f'✅ Stat `{stat}` untuk **{member.display_name}** diset ke {value}')
 
+    @commands.is_owner()
+    @commands.hybrid_command(name='backup', with_app_command=True)
+    async def backup_now(self, ctx: commands.Context):
+        """Owner: backup database sekarang (online, bot tetap jalan)"""
+        await ctx.reply('⏳ Membuat backup...')
+        results = await backup.run()
+        if not results:
+            await ctx.reply('Tidak ada file database untuk di-backup')
+            return
+        lines = []
+        for r in results:
+            if r.path:
+                lines.append(f'✅ `{os.path.basename(r.path)}` — {r.size / 1024:.0f} KiB, {r.seconds:.1f}s')
+            else:
+                lines.append(f'❌ `{r.source}` — integrity check gagal: {r.integrity}')
+        await ctx.reply('\n'.join(lines))
+
+    @commands.is_owner()
+    @commands.hybrid_command(name='ledger', with_app_command=True)
+    async def ledger_history(self, ctx: commands.Context, member: discord.Member, limit: int = 15, kind: str = None):
+        """Owner: riwayat perubahan XP/gold/item seorang user"""
+        if not ctx.guild:
+            await ctx.reply('Hanya bisa di server')
+            return
+        if kind and kind not in ledger.KINDS:
+            await ctx.reply(f"Jenis tidak valid. Pilih salah satu: {', '.join(ledger.KINDS)}")
+            return
+        await ledger.flush()
+        rows = await get_ledger_history(ctx.guild.id, member.id, limit=max(1, min(limit, 30)), kind=kind)
+        if not rows:
+            await ctx.reply(f'Belum ada catatan ledger untuk **{member.display_name}**')
+            return
+        lines = []
+        for k, item, delta, reason, ts in rows:
+            what = f'{k} {item}' if item else k
+            lines.append(f'<t:{ts}:R> `{delta:+}` {what} — {reason}')
+        embed = discord.Embed(title=f'📒 Ledger {member.display_name}', description='\n'.join(lines), color=0x95A5A6)
+        await ctx.reply(embed=embed)
+
+    @commands.is_owner()
+    @commands.hybrid_command(name='flow', with_app_command=True)
+    async def economy_flow(self, ctx: commands.Context, hours: int = 24):
+        """Owner: ringkasan XP/gold/item yang masuk dan keluar di server"""
+        if not ctx.guild:
+            await ctx.reply('Hanya bisa di server')
+            return
+        import time
+        await ledger.flush()
+        rows = await get_ledger_summary(ctx.guild.id, since=int(time.time()) - max(hours, 1) * 3600)
+        if not rows:
+            await ctx.reply(f'Tidak ada transaksi dalam {hours} jam terakhir')
+            return
+        lines = []
+        for kind, item, reason, created, destroyed, n in rows[:20]:
+            what = f'{kind} {item}' if item else kind
+            lines.append(f'**{what}** ({reason}, {n}x): +{created} / -{destroyed}')
+        embed = discord.Embed(title=f'💱 Arus ekonomi {hours} jam terakhir', description='\n'.join(lines), color=0x95A5A6)
+        await ctx.reply(embed=embed)
+
+    @commands.is_owner()
+    @commands.hybrid_command(name='export', with_app_command=True)
+    async def export_guild(self, ctx: commands.Context):
+        """Owner: ekspor semua data server ini ke file .jsonl.gz"""
+        if not ctx.guild:
+            await ctx.reply('Hanya bisa di server')
+            return
+        await ctx.reply('⏳ Mengekspor data server...')
+        try:
+            r = await guild_export.export_guild(ctx.guild.id)
+        except guild_export.ExportError as e:
+            await ctx.reply(f'Ekspor gagal: {e}')
+            return
+        text = f'✅ `{os.path.basename(r.path)}` — {r.rows} baris, {r.size / 1024:.0f} KiB, {r.seconds:.1f}s'
+        if r.size <= ctx.guild.filesize_limit:
+            await ctx.reply(text, file=discord.File(r.path))
+        else:
+            await ctx.reply(f'{text}\nFile terlalu besar untuk dikirim, ambil dari `{r.path}` di server bot.')
+
+    @commands.is_owner()
+    @commands.hybrid_command(name='import', with_app_command=True)
+    async def import_guild(self, ctx: commands.Context, filename: str = None, confirm: str = None):
+        """Owner: ganti data server ini dengan file ekspor (lampiran atau nama file di EXPORT_DIR)"""
+        if not ctx.guild:
+            await ctx.reply('Hanya bisa di server')
+            return
+        attachment = ctx.message.attachments[0] if ctx.message and ctx.message.attachments else None
+        if attachment and filename and filename.lower() == 'confirm':
+            filename, confirm = None, filename
+        name = os.path.basename(attachment.filename if attachment else filename or '')
+        if not name:
+            await ctx.reply('Gunakan: import <nama file di EXPORT_DIR> confirm, atau lampirkan file ekspor + confirm')
+            return
+        if (confirm or '').lower() != 'confirm':
+            await ctx.reply(f'⚠️ Semua data server ini akan diganti isi `{name}`. Ulangi dengan `confirm` di akhir untuk lanjut.')
+            return
+        os.makedirs(config.EXPORT_DIR, exist_ok=True)
+        path = os.path.join(config.EXPORT_DIR, name)
+        if attachment:
+            await attachment.save(path)
+        elif not os.path.isfile(path):
+            await ctx.reply(f'File `{name}` tidak ada di `{config.EXPORT_DIR}`')
+            return
+        await ctx.reply('⏳ Mengimpor data...')
+        try:
+            r = await guild_export.import_guild(path, ctx.guild.id)
+        except guild_export.ExportError as e:
+            await ctx.reply(f'❌ Impor dibatalkan, tidak ada data yang berubah: {e}')
+            return
+        await ctx.reply(f'✅ {r.rows} baris diimpor dari `{name}` ({r.seconds:.1f}s)')
+
     @commands.is_owner()
     @commands.hybrid_command(name='listmonsters', with_app_command=True)
     async def listmonsters(self, ctx: commands.Context):
@@ -258,14 +373,8 @@ class Owner(commands.Cog):
             ('Amulet of Power', 600, 'ATK +20, DEF +10', 20, 10, 'accessory'),
             ('Battle Tonic', 200, 'Buff ATK +10 for 1 hour', 10, 3600, 'buff'),
         ]
-        for item in items:
-            # support tuples with either (name,price,desc) or (name,price,desc,atk,def,slot)
-            if len(item) >= 6:
-                name, price, desc, atk, defn, slot = item
-                add_shop_item(ctx.guild.id, name, price, desc, atk, defn, slot)
-            else:
-                name, price, desc = item
-                add_shop_item(ctx.guild.id, name, price, desc)
+        # tuples may be (name,price,desc) or (name,price,desc,atk,def,slot)
+        await add_shop_items_bulk(ctx.guild.id, items)
         await ctx.reply(f'✅ Shop seeded with {len(items)} powerful items')
 
 
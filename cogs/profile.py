@@ -5,7 +5,7 @@ import io
 import aiohttp
 from PIL import Image, ImageDraw, ImageFont, ImageOps
 from utils.fonts import load_font
-from database import get_user_xp, get_leaderboard, get_equipped_items, get_profile, get_selected_badge
+from database_async import get_user_xp, get_player_snapshot, get_rank, get_rank_page, get_rank_total
 
 
 def xp_to_level(xp: int) -> int:
@@ -35,8 +35,9 @@ class Profile(commands.Cog):
         """Tampilkan profile XP & level"""
         if member is None:
             member = ctx.author
-        guild_id = ctx.guild.id if ctx.guild else 0
-        xp = get_user_xp(guild_id, member.id)
+        # one read for xp, equipment, stats and badge
+        snap = await get_player_snapshot(ctx.guild.id, member.id) if ctx.guild else None
+        xp = snap.xp if snap else await get_user_xp(0, member.id)
         level = xp_to_level(xp)
         cur, total = level_progress(xp)
         bar = render_bar(cur, total)
@@ -44,9 +45,8 @@ class Profile(commands.Cog):
         # We'll render a profile card image on top of background (like owo bot)
         # Determine equipped background (slot 'background')
         bg_name = None
-        if ctx.guild:
-            equipped = get_equipped_items(ctx.guild.id, member.id)
-            for item_name, qty, slot in equipped:
+        if snap:
+            for item_name, qty, slot in snap.equipment:
                 if slot and slot.lower() == 'background':
                     if '_' in item_name:
                         bg_name = item_name.split('_', 1)[1]
@@ -70,9 +70,7 @@ class Profile(commands.Cog):
                 bg_path = None
 
         # Fetch additional profile info
-        prof = None
-        if ctx.guild:
-            prof = get_profile(ctx.guild.id, member.id)
+        prof = snap.profile if snap else None
 
         # Compose image
         try:
@@ -152,16 +150,13 @@ class Profile(commands.Cog):
 
             # additional stats: atk/def/gold if available
             if prof:
-                stats_text = f"ATK: {prof.get('atk',0)}   DEF: {prof.get('def',0)}   Gold: {prof.get('gold',0)}"
+                atk = prof.get('atk', 0) + prof.get('equip_atk', 0)
+                deff = prof.get('def', 0) + prof.get('equip_def', 0)
+                stats_text = f"ATK: {atk}   DEF: {deff}   Gold: {prof.get('gold',0)}"
                 draw.text((TEXT_X, BAR_Y + BAR_H + 12), stats_text, font=font_small, fill=(200,200,200,255))
 
             # draw selected badge icon if present
-            badge_key = None
-            if ctx.guild:
-                try:
-                    badge_key = get_selected_badge(ctx.guild.id, member.id)
-                except Exception:
-                    badge_key = None
+            badge_key = snap.selected_badge if snap else None
             if badge_key:
                 try:
                     badge_path = os.path.join('Assets', 'badges', f"{badge_key}.png")
@@ -194,9 +189,7 @@ class Profile(commands.Cog):
             embed.add_field(name='Progress', value=bar, inline=False)
             # try to attach badge thumbnail if user has selected badge
             try:
-                badge_key = None
-                if ctx.guild:
-                    badge_key = get_selected_badge(ctx.guild.id, member.id)
+                badge_key = snap.selected_badge if snap else None
                 if badge_key:
                     # try Assets/badges/<key>.png first
                     badge_path = os.path.join('Assets', 'badges', f"{badge_key}.png")
@@ -232,24 +225,46 @@ class Profile(commands.Cog):
             await ctx.reply(embed=embed)
 
     @commands.hybrid_command(name='leaderboard', with_app_command=True)
-    async def leaderboard(self, ctx: commands.Context, limit: int = 10):
+    async def leaderboard(self, ctx: commands.Context, limit: int = 10, page: int = 1):
         """Tampilkan leaderboard XP server"""
         if not ctx.guild:
             await ctx.reply("Leaderboard hanya untuk server")
             return
-        rows = get_leaderboard(ctx.guild.id, limit=limit)
+        limit = max(1, min(limit, 25))
+        page = max(page, 1)
+        rows = await get_rank_page(ctx.guild.id, page, limit)
         if not rows:
-            await ctx.reply("Belum ada data XP di server ini")
+            await ctx.reply("Belum ada data XP di server ini" if page == 1 else "Halaman itu kosong")
             return
         lines = []
-        for i, (user_id, xp) in enumerate(rows, start=1):
+        for rank, user_id, xp in rows:
             member = ctx.guild.get_member(user_id)
             name = member.display_name if member else f"User {user_id}"
-            lines.append(f"**{i}. {name}** — `{xp} XP`")
+            lines.append(f"**{rank}. {name}** — `{xp} XP`")
+        total = await get_rank_total(ctx.guild.id)
+        pages = (total + limit - 1) // limit
         embed = discord.Embed(title='🏆 Leaderboard', description='Top users by XP', color=0xF1C40F)
-        embed.add_field(name='Top', value='\n'.join(lines), inline=False)
+        embed.add_field(name='Top' if page == 1 else f'Halaman {page}', value='\n'.join(lines), inline=False)
+        embed.set_footer(text=f'Halaman {page}/{pages} • {total} pemain')
         await ctx.reply(embed=embed)
 
+    @commands.hybrid_command(name='rank', with_app_command=True)
+    async def rank(self, ctx: commands.Context, member: discord.Member = None):
+        """Lihat peringkat XP kamu (atau member lain) di server"""
+        if not ctx.guild:
+            await ctx.reply("Rank hanya untuk server")
+            return
+        member = member or ctx.author
+        info = await get_rank(ctx.guild.id, member.id)
+        if info is None:
+            await ctx.reply(f"{member.display_name} belum punya XP di server ini")
+            return
+        percent = 100 * info.rank / info.total
+        embed = discord.Embed(title=f'📊 Rank {member.display_name}', color=0xF1C40F)
+        embed.add_field(name='Peringkat', value=f'#{info.rank} dari {info.total}', inline=True)
+        embed.add_field(name='XP', value=f'{info.xp} (Level {xp_to_level(info.xp)})', inline=True)
+        embed.set_footer(text=f'Top {percent:.1f}% di server ini')
+        await ctx.reply(embed=embed)
 
 async def setup(bot: commands.Bot):
     await bot.add_cog(Profile(bot))
@@ -1,7 +1,7 @@
 import discord
 from discord.ext import commands
 from discord import app_commands
-from database import get_prefix_db
+from database_async import get_prefix_db
 import os
 import inspect
 
@@ -122,7 +122,7 @@ class Public(commands.Cog):
         """Tampilkan daftar command (embed)"""
         prefix = '!'
         if ctx.guild:
-            prefix = get_prefix_db(ctx.guild.id)
+            prefix = await get_prefix_db(ctx.guild.id)
 
         embed = discord.Embed(
             title="📜 Daftar Command",
@@ -5,22 +5,15 @@ from discord.ext import commands
 from pathlib import Path
 import io
 from PIL import Image, ImageDraw, ImageFont, ImageOps
-from database import (
-    get_profile,
+from database_async import (
     update_profile,
-    add_user_xp,
-    add_gold,
-    get_user_xp,
-    get_effective_profile,
-    get_onboarded,
+    get_player_snapshot,
     set_onboarded,
-    get_inventory,
-    add_item,
-    increment_daily_progress,
-    add_win,
-    award_achievement,
 )
 from utils.fonts import load_font
+import cooldowns
+from database_async import run_db
+from storage import backend as db
 
 
 DATA_DIR = Path(__file__).resolve().parents[1] / 'data'
@@ -79,38 +72,54 @@ def save_monsters(lst):
         json.dump(lst, f, ensure_ascii=False, indent=2)
 
 
+def _grant_victory(guild_id, user_id, xp_gain, gold_gain, item):
+    """Apply every adventure reward in one transaction (DB thread)."""
+    with db.transaction(guild_id):
+        db.add_user_xp(guild_id, user_id, xp_gain)
+        db.add_gold(guild_id, user_id, gold_gain)
+        if item:
+            db.add_item(guild_id, user_id, item)
+        # increment daily 'adventures' quest progress automatically
+        try:
+            db.increment_daily_progress(guild_id, user_id, amount=1)
+        except Exception:
+            pass
+        # increment win counter and auto-award 'slayer' badge at 10 wins
+        try:
+            wins = db.add_win(guild_id, user_id, amount=1)
+            if wins >= 10:
+                db.award_achievement(guild_id, user_id, 'slayer')
+        except Exception:
+            pass
+
+
+def _heal(guild_id, user_id, cost):
+    """Charge the gold and heal to full in one transaction (DB thread). False if the gold is short."""
+    with db.transaction(guild_id):
+        if not db.spend_gold(guild_id, user_id, cost):
+            return False
+        profile = db.get_profile(guild_id, user_id)
+        db.update_profile(guild_id, user_id, hp=profile['max_hp'])
+    return True
+
+
 class RPG(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
 
     @commands.hybrid_command(name='adventure', with_app_command=True)
+    @cooldowns.check('adventure', 3600, '⌛ Kamu harus menunggu {minutes} menit {s} detik sebelum berpetualang lagi.')
     async def adventure(self, ctx: commands.Context):
         """Pergi berpetualang: lawan monster, dapat XP & gold"""
         if not ctx.guild:
             await ctx.reply('Hanya di server')
             return
-        # Cooldown: 1 hour (3600s)
-        from database import get_cooldown, set_cooldown
-        import time
-        last = get_cooldown(ctx.guild.id, ctx.author.id, 'adventure')
-        now = int(time.time())
-        # owners bypass cooldown
-        try:
-            is_owner = await self.bot.is_owner(ctx.author)
-        except Exception:
-            is_owner = False
-        if not is_owner:
-            if last and now - last < 3600:
-                remaining = 3600 - (now - last)
-                m, s = divmod(remaining, 60)
-                await ctx.reply(f'⌛ Kamu harus menunggu {m} menit {s} detik sebelum berpetualang lagi.')
-                return
+
+        # one read for profile, buffs and onboarding state
+        snap = await get_player_snapshot(ctx.guild.id, ctx.author.id)
 
         # Onboarding: first time user uses adventure, show short Indonesian tutorial
-        try:
-            onboarded = get_onboarded(ctx.guild.id, ctx.author.id)
-        except Exception:
-            onboarded = False
+        onboarded = snap.onboarded
         if not onboarded:
             emb = discord.Embed(title='Selamat datang di Adventure!', description='Panduan singkat untuk memulai:', color=0xF39C12)
             emb.add_field(name='Mulai', value='Gunakan `!adventure` untuk pergi berpetualang melawan monster dan dapatkan XP serta gold.', inline=False)
@@ -120,18 +129,19 @@ class RPG(commands.Cog):
             emb.set_footer(text='Selamat bermain — semoga beruntung!')
             await ctx.reply(embed=emb)
             try:
-                set_onboarded(ctx.guild.id, ctx.author.id)
+                await set_onboarded(ctx.guild.id, ctx.author.id)
             except Exception:
                 pass
 
-        # use effective profile (includes temporary buffs)
-        profile = get_effective_profile(ctx.guild.id, ctx.author.id)
-        user_hp = get_profile(ctx.guild.id, ctx.author.id)['hp']
+        # use effective profile (includes equipment and temporary buffs)
+        profile = snap.effective_profile()
+        user_hp = snap.hp
         user_atk = profile.get('atk', 0)
         user_def = profile.get('def', 0)
 
         monsters = load_monsters()
         if not monsters:
+            cooldowns.release(ctx)
             await ctx.reply('No monsters configured. Owner can add monsters.')
             return
         monster = random.choice(monsters).copy()
@@ -151,9 +161,6 @@ class RPG(commands.Cog):
             user_hp -= mdmg
             log.append(f"{monster['name']} hits you for {mdmg} dmg. ({max(0, user_hp)} hp left)")
 
-        # set cooldown now
-        set_cooldown(ctx.guild.id, ctx.author.id, 'adventure', now)
-
         # locate monster image (Assets/Mob/Transperent)
         ASSETS_DIR = Path(__file__).resolve().parents[1] / 'Assets' / 'Mob' / 'Transperent'
         monster_image_path = None
@@ -170,28 +177,15 @@ class RPG(commands.Cog):
             # win
             xp_gain = monster['xp'] + random.randint(0, 5)
             gold_gain = monster['gold'] + random.randint(0, 5)
-            add_user_xp(ctx.guild.id, ctx.author.id, xp_gain)
-            add_gold(ctx.guild.id, ctx.author.id, gold_gain)
             # small chance to drop item
-            if random.random() < 0.15:
-                item = 'Mysterious Shard'
-                add_item(ctx.guild.id, ctx.author.id, item)
-                drop_text = f"You found an item: **{item}**!"
-            else:
-                drop_text = ''
-
-            # increment daily 'adventures' quest progress automatically
+            item = 'Mysterious Shard' if random.random() < 0.15 else None
             try:
-                increment_daily_progress(ctx.guild.id, ctx.author.id, amount=1)
+                await run_db(_grant_victory, ctx.guild.id, ctx.author.id, xp_gain, gold_gain, item)
             except Exception:
-                pass
-            # increment win counter and auto-award 'slayer' badge at 10 wins
-            try:
-                wins = add_win(ctx.guild.id, ctx.author.id, amount=1)
-                if wins >= 10:
-                    award_achievement(ctx.guild.id, ctx.author.id, 'slayer')
-            except Exception:
-                pass
+                # nothing was granted; let the user go again
+                cooldowns.release(ctx)
+                raise
+            drop_text = f"You found an item: **{item}**!" if item else ''
 
             title = "🏹 Adventure — Victory!"
             desc = f"You defeated {monster['name']}!\n+{xp_gain} XP, +{gold_gain} gold\n{drop_text}"
@@ -251,7 +245,7 @@ class RPG(commands.Cog):
             await ctx.reply(embed=embed, file=file)
         else:
             # lose: set HP to 1 (can't go below), maybe penalty
-            update_profile(ctx.guild.id, ctx.author.id, hp=1)
+            await update_profile(ctx.guild.id, ctx.author.id, hp=1)
             title = "💀 Adventure — Defeat"
             desc = f"You were defeated by {monster['name']}."
             color = 0xE74C3C
@@ -312,14 +306,14 @@ class RPG(commands.Cog):
         if not ctx.guild:
             await ctx.reply('Hanya di server')
             return
-        profile = get_profile(ctx.guild.id, member.id)
-        xp = get_user_xp(ctx.guild.id, member.id)
+        snap = await get_player_snapshot(ctx.guild.id, member.id)
+        profile = snap.profile
+        xp = snap.xp
         level = xp_to_level(xp)
         cur, total = level_progress(xp)
         bar = render_bar(cur, total)
 
-        from database import get_selected_badge
-        badge = get_selected_badge(ctx.guild.id, member.id)
+        badge = snap.selected_badge
         title = f"{member.display_name} — RPG Stats"
         if badge:
             title = f"{member.display_name} — {badge}"
@@ -329,10 +323,10 @@ class RPG(commands.Cog):
         embed.add_field(name='XP', value=f"{xp} XP", inline=True)
         embed.add_field(name='Progress', value=bar, inline=False)
         embed.add_field(name='HP', value=f"{profile['hp']} / {profile['max_hp']}", inline=True)
-        embed.add_field(name='ATK', value=str(profile['atk']), inline=True)
-        embed.add_field(name='DEF', value=str(profile['def']), inline=True)
+        embed.add_field(name='ATK', value=str(profile['atk'] + profile['equip_atk']), inline=True)
+        embed.add_field(name='DEF', value=str(profile['def'] + profile['equip_def']), inline=True)
         embed.add_field(name='Gold', value=str(profile['gold']), inline=True)
-        inv = get_inventory(ctx.guild.id, member.id)
+        inv = snap.inventory
         if inv:
             embed.add_field(name='Inventory', value='\n'.join([f"{n} x{q}" for n, q, *rest in inv]), inline=False)
         await ctx.reply(embed=embed)
@@ -343,14 +337,10 @@ class RPG(commands.Cog):
         if not ctx.guild:
             await ctx.reply('Hanya di server')
             return
-        profile = get_profile(ctx.guild.id, ctx.author.id)
         cost = 10
-        if profile['gold'] < cost:
+        if not await run_db(_heal, ctx.guild.id, ctx.author.id, cost):
             await ctx.reply(f'Gold tidak cukup untuk heal (butuh {cost})')
             return
-        # heal to full
-        update_profile(ctx.guild.id, ctx.author.id, hp=profile['max_hp'])
-        add_gold(ctx.guild.id, ctx.author.id, -cost)
         await ctx.reply(f'✅ Kamu disembuhkan ke penuh (biaya {cost} gold)')
 
 
@@ -2,17 +2,12 @@ from discord.ext import commands
 from discord import app_commands
 import discord
 import random
-from database import (
+from database_async import (
     get_profile,
-    update_profile,
-    get_inventory,
-    set_equipped,
     add_user_xp,
     add_gold,
-    get_cooldown,
-    set_cooldown,
-    get_shop_item_with_stats,
 )
+import cooldowns
 
 COOLDOWN_SECONDS = 60 * 5
 
@@ -50,31 +45,15 @@ class VsCog(commands.Cog):
         self.bot = bot
 
     async def _calc_power(self, guild_id: int, user_id: int):
-        profile = get_profile(guild_id, user_id)
+        # equipment totals are kept on the profile row: one cached read.
+        # Temporary buffs do not count in PvP.
+        profile = await get_profile(guild_id, user_id)
         lvl = profile.get('level', 1) if profile else 1
-        base_atk = profile.get('atk', 0) if profile else 0
-        base_def = profile.get('def', 0) if profile else 0
-
-        inv = get_inventory(guild_id, user_id)
-        atk = 0
-        df = 0
-        for item in inv:
-            try:
-                item_name = item[0]
-                equipped = item[2]
-            except Exception:
-                continue
-            if equipped:
-                stats = get_shop_item_with_stats(guild_id, item_name)
-                if stats:
-                    try:
-                        atk += int(stats[3] or 0)
-                        df += int(stats[4] or 0)
-                    except Exception:
-                        pass
-
-        power = (lvl * 2) + base_atk + atk + random.randint(0, 5)
-        defense = (lvl * 2) + base_def + df + random.randint(0, 5)
+        atk = (profile.get('atk', 0) + profile.get('equip_atk', 0)) if profile else 0
+        df = (profile.get('def', 0) + profile.get('equip_def', 0)) if profile else 0
+
+        power = (lvl * 2) + atk + random.randint(0, 5)
+        defense = (lvl * 2) + df + random.randint(0, 5)
         return power, defense
 
     async def _resolve_duel(self, ctx: commands.Context, opponent: discord.Member):
@@ -93,23 +72,21 @@ class VsCog(commands.Cog):
 
         if result == 'draw':
             text = f"Duel antara {ctx.author.mention} dan {opponent.mention} berakhir seri!"
-            add_user_xp(ctx.guild.id, ctx.author.id, 5)
-            add_user_xp(ctx.guild.id, opponent.id, 5)
+            await add_user_xp(ctx.guild.id, ctx.author.id, 5)
+            await add_user_xp(ctx.guild.id, opponent.id, 5)
         elif result == 'author':
             text = f"{ctx.author.mention} menang melawan {opponent.mention}!"
-            add_user_xp(ctx.guild.id, ctx.author.id, 20)
-            add_gold(ctx.guild.id, ctx.author.id, 10)
-            add_user_xp(ctx.guild.id, opponent.id, 5)
+            await add_user_xp(ctx.guild.id, ctx.author.id, 20)
+            await add_gold(ctx.guild.id, ctx.author.id, 10)
+            await add_user_xp(ctx.guild.id, opponent.id, 5)
         else:
             text = f"{opponent.mention} menang melawan {ctx.author.mention}!"
-            add_user_xp(ctx.guild.id, opponent.id, 20)
-            add_gold(ctx.guild.id, opponent.id, 10)
-            add_user_xp(ctx.guild.id, ctx.author.id, 5)
+            await add_user_xp(ctx.guild.id, opponent.id, 20)
+            await add_gold(ctx.guild.id, opponent.id, 10)
+            await add_user_xp(ctx.guild.id, ctx.author.id, 5)
 
-        # set cooldowns for both participants
-        now = int(__import__('time').time())
-        set_cooldown(ctx.guild.id, ctx.author.id, 'vs', now)
-        set_cooldown(ctx.guild.id, opponent.id, 'vs', now)
+        # the challenger's cooldown was started by the check; the opponent's starts now
+        cooldowns.mark(ctx.guild.id, opponent.id, 'vs')
 
         embed = discord.Embed(title="Duel PvP", description=text)
         embed.add_field(name=str(ctx.author), value=f"Score: {p_score}", inline=True)
@@ -118,25 +95,15 @@ class VsCog(commands.Cog):
 
     @commands.hybrid_command(name="vs", with_app_command=True, description="Duel user lain (PvP)")
     @app_commands.describe(opponent="User to duel")
+    @cooldowns.check('vs', COOLDOWN_SECONDS, 'Kamu harus menunggu {minutes} menit {s} detik sebelum duel lagi.')
     async def vs(self, ctx: commands.Context, opponent: discord.Member):
         """Challenge another member to a duel with confirmation."""
-        # cooldown check with owner bypass
-        last = get_cooldown(ctx.guild.id, ctx.author.id, 'vs')
-        now = int(__import__('time').time())
-        try:
-            is_owner = await self.bot.is_owner(ctx.author)
-        except Exception:
-            is_owner = False
-        if not is_owner:
-            if last and now - last < COOLDOWN_SECONDS:
-                remaining = COOLDOWN_SECONDS - (now - last)
-                m, s = divmod(remaining, 60)
-                await ctx.reply(f'Kamu harus menunggu {m} menit {s} detik sebelum duel lagi.')
-                return
         if opponent.bot:
+            cooldowns.release(ctx)
             await ctx.reply("Kamu tidak bisa menantang bot.")
             return
         if opponent.id == ctx.author.id:
+            cooldowns.release(ctx)
             await ctx.reply("Tidak bisa duel dengan diri sendiri.")
             return
 
@@ -150,7 +117,8 @@ class VsCog(commands.Cog):
             embed = await self._resolve_duel(ctx, opponent)
             await ctx.followup.send(embed=embed) if hasattr(ctx, 'followup') else await ctx.reply(embed=embed)
         else:
-            # accepted == False or None (declined or timed out)
+            # accepted == False or None (declined or timed out): no duel, no cooldown
+            cooldowns.release(ctx)
             if view.accepted is False:
                 await ctx.reply(f"{opponent.mention} menolak tantangan.")
             else:
@@ -0,0 +1,121 @@
+"""Runtime settings, read once from environment variables.
+
+Every value has a default that works for a local bot, so nothing here needs to
+be set unless you want to tune it. See README for the full list.
+"""
+import os
+
+
+def _env_bool(name: str, default: bool = False) -> bool:
+    return os.getenv(name, '1' if default else '0').lower() in ('1', 'true', 'yes')
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+# ======================
+# STORAGE
+# ======================
+# 'sqlite' (default) or 'memory' (nothing is saved; for load tests/dev bots).
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'sqlite')
+
+# ======================
+# DATABASE (SQLite)
+# ======================
+DB_PATH = os.getenv('DB_PATH', 'bot.db')
+# WAL lets dashboard readers and bot writers work at the same time.
+DB_JOURNAL_MODE = os.getenv('DB_JOURNAL_MODE', 'WAL')
+# NORMAL is safe with WAL: a crash can lose the last commits but never corrupts.
+DB_SYNCHRONOUS = os.getenv('DB_SYNCHRONOUS', 'NORMAL')
+# Page cache per connection, in KiB.
+DB_CACHE_SIZE_KB = _env_int('DB_CACHE_SIZE_KB', 16 * 1024)
+# Memory-mapped I/O window in bytes (0 disables).
+DB_MMAP_SIZE = _env_int('DB_MMAP_SIZE', 64 * 1024 * 1024)
+# How long a connection waits on a locked database before raising.
+DB_BUSY_TIMEOUT_MS = _env_int('DB_BUSY_TIMEOUT_MS', 5000)
+# Warn at startup when a registered hot query would scan a whole table.
+DB_CHECK_QUERY_PLANS = _env_bool('DB_CHECK_QUERY_PLANS', True)
+# Group commit: batch many writes into one transaction/fsync. A crash can
+# lose up to DB_GROUP_COMMIT_MS worth of writes.
+DB_GROUP_COMMIT = _env_bool('DB_GROUP_COMMIT')
+DB_GROUP_COMMIT_MS = _env_int('DB_GROUP_COMMIT_MS', 50)
+DB_GROUP_COMMIT_MAX_STATEMENTS = _env_int('DB_GROUP_COMMIT_MAX_STATEMENTS', 200)
+# Sharding: store guilds in DB_SHARDS files under DB_SHARD_DIR (guild_id % N)
+# instead of DB_PATH. 0 keeps everything in one file. Changing it needs
+# scripts/shard_db.py to move existing data.
+DB_SHARDS = _env_int('DB_SHARDS', 0)
+DB_SHARD_DIR = os.getenv('DB_SHARD_DIR', 'shards')
+# Threads (each with read-only connections) serving analytics queries:
+# leaderboard, XP stats, ledger history. See database.get_read_conn.
+DB_READ_POOL_SIZE = _env_int('DB_READ_POOL_SIZE', 2)
+
+# ======================
+# ROW CACHE (cache.py)
+# ======================
+# Profile and XP rows of active players are kept in memory and written through.
+CACHE_ENABLED = _env_bool('CACHE_ENABLED', True)
+# Per cache; least recently used players are evicted beyond this.
+CACHE_MAX_ENTRIES = _env_int('CACHE_MAX_ENTRIES', 5000)
+# Entries older than this are re-read from the database (0 = never expire).
+CACHE_TTL_SECONDS = _env_int('CACHE_TTL_SECONDS', 300)
+# Guilds whose XP ranking (ranks.py) stays in memory; the least recently
+# queried are dropped beyond this and reload on their next !rank/!leaderboard.
+RANKS_MAX_GUILDS = _env_int('RANKS_MAX_GUILDS', 200)
+
+# ======================
+# COOLDOWNS (cooldowns.py)
+# ======================
+# Cooldowns are kept in memory and written to the cooldowns table this often.
+# A crash loses at most this many seconds of started cooldowns.
+COOLDOWN_FLUSH_SECONDS = _env_int('COOLDOWN_FLUSH_SECONDS', 30)
+# Cooldown rows older than this are purged by housekeeping. Must exceed the
+# longest cooldown (daily, 24h).
+COOLDOWN_RETENTION_SECONDS = _env_int('COOLDOWN_RETENTION_SECONDS', 7 * 86400)
+
+# ======================
+# HOUSEKEEPING (cogs/housekeeping.py)
+# ======================
+# How often expired buffs, old quests and stale cooldowns are purged.
+HOUSEKEEPING_INTERVAL_SECONDS = _env_int('HOUSEKEEPING_INTERVAL_SECONDS', 3600)
+# Rows deleted per statement, and at most this many batches per kind per run.
+HOUSEKEEPING_BATCH_SIZE = _env_int('HOUSEKEEPING_BATCH_SIZE', 500)
+HOUSEKEEPING_MAX_BATCHES = _env_int('HOUSEKEEPING_MAX_BATCHES', 50)
+# Compaction (incremental_vacuum + optimize) only runs when no command was
+# used for this long; otherwise it waits for the next run.
+HOUSEKEEPING_QUIET_SECONDS = _env_int('HOUSEKEEPING_QUIET_SECONDS', 300)
+HOUSEKEEPING_VACUUM_PAGES = _env_int('HOUSEKEEPING_VACUUM_PAGES', 1000)
+
+# ======================
+# LEDGER (ledger.py)
+# ======================
+# Record every XP/gold/item change in the append-only ledger table.
+LEDGER_ENABLED = _env_bool('LEDGER_ENABLED', True)
+# Buffered entries are written in one batch this often (and on shutdown).
+LEDGER_FLUSH_SECONDS = _env_int('LEDGER_FLUSH_SECONDS', 5)
+
+# ======================
+# BACKUPS (backup.py)
+# ======================
+BACKUP_DIR = os.getenv('BACKUP_DIR', 'backups')
+# Scheduled snapshot interval; 0 = only on demand (!backup, scripts/backup_db.py).
+BACKUP_INTERVAL_SECONDS = _env_int('BACKUP_INTERVAL_SECONDS', 6 * 3600)
+# Snapshots kept per database file.
+BACKUP_KEEP = _env_int('BACKUP_KEEP', 8)
+# Online backup step size and pause between steps.
+BACKUP_PAGES_PER_STEP = _env_int('BACKUP_PAGES_PER_STEP', 256)
+BACKUP_STEP_SLEEP_MS = _env_int('BACKUP_STEP_SLEEP_MS', 10)
+# After this many restarts (source written mid-backup) copy in a single step.
+BACKUP_MAX_RESTARTS = _env_int('BACKUP_MAX_RESTARTS', 5)
+BACKUP_GZIP_LEVEL = _env_int('BACKUP_GZIP_LEVEL', 6)
+
+# ======================
+# GUILD EXPORT / IMPORT (guild_export.py)
+# ======================
+# Compressed with BACKUP_GZIP_LEVEL.
+EXPORT_DIR = os.getenv('EXPORT_DIR', 'exports')
+# Rows read per fetchmany / written per executemany.
+EXPORT_BATCH_SIZE = _env_int('EXPORT_BATCH_SIZE', 5000)
@@ -0,0 +1,222 @@
+"""In-memory cooldowns for commands like adventure, claim, daily and vs.
+
+Cooldowns live in a dict keyed by ``(guild_id, user_id, command)`` with a heap
+of expiry times, so checking one is a dict lookup and expired entries are
+dropped as time passes. The first check of a command loads its still-running
+cooldowns from the ``cooldowns`` table once; after that the table is only
+written, in batches, every ``COOLDOWN_FLUSH_SECONDS`` and on shutdown. A user
+spamming a command that is on cooldown therefore never reaches the database.
+
+Usage in a cog::
+
+    @commands.hybrid_command(name='claim')
+    @cooldowns.check('claim', 3600, '⌛ Tunggu {minutes} menit {s} detik lagi.')
+    async def claim(self, ctx):
+        if nothing_to_claim:
+            cooldowns.release(ctx)
+            return
+        ...
+
+A passing check starts the cooldown right away, before the command body
+awaits anything, so a second invocation sent while the first is still
+running is rejected instead of paying out twice. Commands that end without
+doing anything call :func:`release` to give the cooldown back; so does
+``main.on_command_error`` for errors raised before the body ran (bad
+arguments, later checks). Bot owners always pass the check and never hold a
+cooldown.
+"""
+import asyncio
+import heapq
+import logging
+import time
+import weakref
+
+from discord.ext import commands
+
+import config
+import database_async
+from errors import CooldownActive
+
+logger = logging.getLogger('bot')
+
+# command -> cooldown length in seconds, filled by check()
+DURATIONS = {}
+
+_last_used = {}   # (guild_id, user_id, command) -> last_used ts
+_expiry = []      # heap of (expires_ts, key, last_used); stale entries skipped
+_dirty = {}       # key -> last_used, not yet written to the cooldowns table
+_loaded = set()   # commands whose rows were read from the database
+_taken = weakref.WeakKeyDictionary()   # ctx -> key whose cooldown check() started
+_load_lock = asyncio.Lock()
+_flush_task = None
+
+
+def _expire(now: int):
+    while _expiry and _expiry[0][0] <= now:
+        _, key, ts = heapq.heappop(_expiry)
+        # a newer mark() pushed its own heap entry; keep the key for that one
+        if _last_used.get(key) == ts:
+            del _last_used[key]
+
+
+def _store(key, ts: int):
+    duration = DURATIONS.get(key[2])
+    if duration is None or ts <= _last_used.get(key, 0):
+        return
+    _last_used[key] = ts
+    heapq.heappush(_expiry, (ts + duration, key, ts))
+
+
+async def _load(command: str):
+    async with _load_lock:
+        if command in _loaded:
+            return
+        since = int(time.time()) - DURATIONS[command]
+        rows = await database_async.get_active_cooldowns(command, since)
+        for guild_id, user_id, ts in rows:
+            _store((guild_id, user_id, command), ts)
+        _loaded.add(command)
+
+
+def remaining(guild_id, user_id, command, now: int | None = None) -> int:
+    """Seconds left on the cooldown, 0 if none (only valid once the command is loaded)."""
+    if now is None:
+        now = int(time.time())
+    _expire(now)
+    last = _last_used.get((guild_id, user_id, command))
+    if last is None:
+        return 0
+    return max(0, last + DURATIONS[command] - now)
+
+
+def mark(guild_id, user_id, command, ts: int | None = None):
+    """Start the cooldown now (or at ``ts``). Persisted on the next flush."""
+    if ts is None:
+        ts = int(time.time())
+    key = (guild_id, user_id, command)
+    _store(key, ts)
+    _dirty[key] = max(ts, _dirty.get(key, 0))
+
+
+def release(ctx: commands.Context):
+    """Give back the cooldown check() started for this invocation, if any.
+
+    Call it when the command ends without having done anything (early exit,
+    declined duel, error before any reward was written).
+    """
+    key = _taken.pop(ctx, None)
+    if key is None:
+        return
+    # the heap entry goes stale and is skipped by _expire
+    _last_used.pop(key, None)
+    if _dirty.pop(key, None) is None:
+        # a flush already wrote it; overwrite the row with an expired time
+        _dirty[key] = 0
+
+
+def forget_guild(guild_id):
+    """Drop a guild's cooldowns and its unflushed writes (its rows are being replaced)."""
+    for key in [k for k in _last_used if k[0] == guild_id]:
+        del _last_used[key]
+    for key in [k for k in _dirty if k[0] == guild_id]:
+        del _dirty[key]
+
+
+async def reload_guild(guild_id):
+    """Replace a guild's cooldowns with what the ``cooldowns`` table holds now (after an import)."""
+    forget_guild(guild_id)
+    now = int(time.time())
+    for command in list(_loaded):
+        rows = await database_async.get_active_cooldowns(command, now - DURATIONS[command])
+        for g, user_id, ts in rows:
+            if g == guild_id:
+                _store((g, user_id, command), ts)
+
+
+def _format(template: str, secs: int) -> str:
+    h, rem = divmod(secs, 3600)
+    m, s = divmod(rem, 60)
+    return template.format(h=h, m=m, s=s, minutes=secs // 60)
+
+
+async def _is_owner(ctx) -> bool:
+    try:
+        return await ctx.bot.is_owner(ctx.author)
+    except Exception:
+        return False
+
+
+def check(command: str, seconds: int, message: str):
+    """Command check that raises :class:`errors.CooldownActive` while on cooldown.
+
+    ``message`` may use ``{h}``, ``{m}``, ``{s}`` (hours, minutes, seconds) and
+    ``{minutes}`` (total minutes) for the remaining time.
+    """
+    DURATIONS[command] = seconds
+
+    async def predicate(ctx: commands.Context) -> bool:
+        if ctx.guild is None:
+            return True
+        if command not in _loaded:
+            await _load(command)
+        left = remaining(ctx.guild.id, ctx.author.id, command)
+        if not left:
+            # start the cooldown before anything awaits, so a concurrent
+            # invocation of the same command sees it
+            mark(ctx.guild.id, ctx.author.id, command)
+            _taken[ctx] = (ctx.guild.id, ctx.author.id, command)
+            if await _is_owner(ctx):
+                release(ctx)
+            return True
+        if await _is_owner(ctx):
+            return True
+        raise CooldownActive(command, left, _format(message, left))
+
+    return commands.check(predicate)
+
+
+async def flush():
+    """Write pending cooldowns to the database in one batch."""
+    if not _dirty:
+        return
+    rows = [(g, u, c, ts) for (g, u, c), ts in _dirty.items()]
+    _dirty.clear()
+    try:
+        await database_async.set_cooldowns_bulk(rows)
+    except Exception:
+        # keep them for the next attempt unless a newer mark() replaced them
+        for g, u, c, ts in rows:
+            _dirty.setdefault((g, u, c), ts)
+        raise
+
+
+async def _flusher():
+    interval = max(config.COOLDOWN_FLUSH_SECONDS, 1)
+    try:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await flush()
+            except Exception:
+                logger.exception('[cooldowns] flush failed')
+    except asyncio.CancelledError:
+        return
+
+
+def start():
+    """Start the periodic flush. Call once the event loop runs."""
+    global _flush_task
+    if _flush_task is None:
+        _flush_task = asyncio.get_running_loop().create_task(_flusher())
+
+
+async def shutdown():
+    """Stop the periodic flush and persist whatever is still pending."""
+    global _flush_task
+    if _flush_task is not None:
+        _flush_task.cancel()
+        _flush_task = None
+    try:
+        await flush()
+    except Exception:
+        logger.exception('[cooldowns] final flush failed')
@@ -9,11 +9,16 @@ import os
 from fastapi.responses import HTMLResponse, JSONResponse
 import datetime
 import asyncio
+import sqlite3
 import traceback
 
 # Muat variabel environment dari file .env jika ada
 load_dotenv()
 
+# after load_dotenv so config picks up DB_PATH/DB_SHARDS from .env; unlike
+# database, this module does not migrate or open the bot's files on import
+import readonly_db  # noqa: E402
+
 app = FastAPI(title="Bot Dashboard")
 
 # Tambahkan middleware session sederhana untuk menyimpan info login
@@ -132,6 +137,38 @@ async def maintenance_off():
     return {"maintenance": "off"}
 
 
+def _read_xp_stats(guild_id: int):
+    # read-only connection: the dashboard never migrates or writes the bot's
+    # database, and never creates it
+    conn = readonly_db.connect_guild(guild_id)
+    try:
+        return readonly_db.xp_stats(conn, guild_id), readonly_db.xp_histogram(conn, guild_id)
+    finally:
+        conn.close()
+
+
+@app.get("/stats/{guild_id}")
+async def guild_stats(guild_id: int):
+    """XP distribution of a guild, read through a read-only connection."""
+    try:
+        stats, histogram = await asyncio.to_thread(_read_xp_stats, guild_id)
+    except FileNotFoundError:
+        return JSONResponse({"detail": "database not found"}, status_code=503)
+    except sqlite3.OperationalError as e:
+        # e.g. the bot has not migrated this file to the current schema yet
+        return JSONResponse({"detail": f"database not readable: {e}"}, status_code=503)
+    return {
+        "guild_id": guild_id,
+        "players": stats.count,
+        "total_xp": stats.total,
+        "avg_xp": round(stats.avg, 1),
+        "min_xp": stats.min,
+        "max_xp": stats.max,
+        "percentiles": {str(p): xp for p, xp in stats.percentiles.items()},
+        "histogram": [{"xp": start, "players": n} for start, n in histogram],
+    }
+
+
 # Pasang static frontend terakhir supaya semua rute API di atas tetap bekerja
 if os.path.isdir(os.path.abspath(frontend_dist)):
     app.mount('/', StaticFiles(directory=os.path.abspath(frontend_dist), html=True), name='frontend')
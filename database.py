@@ -1,403 +1,860 @@
+import atexit
+import contextlib
+import os
 import sqlite3
+import threading
+import time
+
+import cache
+import config
+import ledger
+import migrations
+import ranks
+import readonly_db
+import sharding
+from models import XP_PERCENTILES, GuildConfig, PlayerSnapshot, XpStats, slugify
+
+# ======================
+# CONNECTION MANAGER
+# ======================
+# Each thread gets its own connection per database file (the bot's DB
+# executor, dashboard workers, scripts). With WAL journaling readers never wait
+# for the writer, so there is no shared cursor to serialize on. Which file a
+# guild lives in is decided by sharding.path_for (one file unless DB_SHARDS).
+_local = threading.local()
+_all_connections = []
+_connections_lock = threading.Lock()
+_generation = 0
+
+
+class _Connection(sqlite3.Connection):
+    """sqlite3 connection carrying its own group-commit and transaction state."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.generation = _generation
+        self.txn_depth = 0       # nesting level of transaction() blocks
+        self.pending = 0         # writes waiting for a group commit
+        self.pending_since = 0.0
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=config.DB_BUSY_TIMEOUT_MS / 1000, check_same_thread=False, factory=_Connection)
+    # only takes effect on a new, empty file; existing ones need a one-time
+    # VACUUM (scripts/migrate_db.py --vacuum) before incremental_vacuum works
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    conn.execute(f"PRAGMA journal_mode={config.DB_JOURNAL_MODE}")
+    conn.execute(f"PRAGMA synchronous={config.DB_SYNCHRONOUS}")
+    # negative cache_size is in KiB instead of pages
+    conn.execute(f"PRAGMA cache_size=-{int(config.DB_CACHE_SIZE_KB)}")
+    conn.execute(f"PRAGMA mmap_size={int(config.DB_MMAP_SIZE)}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+
+def _conn_for_path(path: str) -> sqlite3.Connection:
+    conns = getattr(_local, 'conns', None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(path)
+    if conn is None or conn.generation != _generation:
+        conn = _connect(path)
+        with _connections_lock:
+            _all_connections.append(conn)
+        conns[path] = conn
+    return conn
+
+
+def get_conn(guild_id=None) -> sqlite3.Connection:
+    """Return this thread's connection to the database holding guild_id, opening it on first use."""
+    return _conn_for_path(sharding.path_for(guild_id))
+
+
+def _connect_readonly(path: str) -> sqlite3.Connection:
+    return readonly_db.connect(path, factory=_Connection)
+
+
+def get_read_conn(guild_id=None) -> sqlite3.Connection:
+    """This thread's read-only connection to guild_id's database file.
+
+    Used by analytics-style helpers (leaderboard, XP stats, ledger queries),
+    which database_async runs on a separate reader pool. In WAL mode the reads
+    see the last committed state and never wait for, or hold up, the writer;
+    writes still waiting for a group commit are not visible yet.
+    """
+    path = sharding.path_for(guild_id)
+    conns = getattr(_local, 'read_conns', None)
+    if conns is None:
+        conns = _local.read_conns = {}
+    conn = conns.get(path)
+    if conn is None or conn.generation != _generation:
+        conn = _connect_readonly(path)
+        with _connections_lock:
+            _all_connections.append(conn)
+        conns[path] = conn
+    return conn
+
+
+def all_conns() -> list:
+    """This thread's connection to every database file, for cross-guild work."""
+    return [_conn_for_path(path) for path in sharding.all_paths()]
+
+
+def close_connections():
+    """Commit anything still pending and close every connection (call on shutdown)."""
+    global _generation, _pending_total
+    with _connections_lock:
+        conns = list(_all_connections)
+        _all_connections.clear()
+        # threads holding a closed connection reconnect on next use
+        _generation += 1
+        _pending_total = 0
+    for conn in conns:
+        try:
+            if conn.in_transaction:
+                conn.commit()
+            conn.close()
+        except Exception:
+            pass
+
+
+# ======================
+# GROUP COMMIT
+# ======================
+# Helpers call _commit() instead of conn.commit(). Normally that commits right
+# away. With DB_GROUP_COMMIT on, the transaction stays open and is committed
+# once DB_GROUP_COMMIT_MAX_STATEMENTS writes have piled up or the oldest one is
+# DB_GROUP_COMMIT_MS old, so a burst of commands shares one fsync.
+# database_async flushes on a timer; flush() does it by hand.
+_pending_total = 0
 
-# Use check_same_thread=False because discord.py may call DB from different threads
-conn = sqlite3.connect("bot.db", check_same_thread=False)
-cursor = conn.cursor()
-
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS permissions (
-    guild_id INTEGER PRIMARY KEY,
-    admin_role TEXT,
-    mod_role TEXT
-)
-""")
-conn.commit()
-
-# Table for storing user XP per guild
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS user_xp (
-    guild_id INTEGER,
-    user_id INTEGER,
-    xp INTEGER DEFAULT 0,
-    PRIMARY KEY (guild_id, user_id)
-)
-""")
-conn.commit()
-
-# Table for shop items per guild
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS shop_items (
-    guild_id INTEGER,
-    item_name TEXT,
-    price INTEGER,
-    description TEXT,
-    PRIMARY KEY (guild_id, item_name)
-)
-""")
-conn.commit()
-
-# Ensure shop_items has atk and def columns (migrations)
-try:
-    cursor.execute("ALTER TABLE shop_items ADD COLUMN atk INTEGER DEFAULT 0")
-    cursor.execute("ALTER TABLE shop_items ADD COLUMN def INTEGER DEFAULT 0")
-    conn.commit()
-except Exception:
-    # ignore if columns already exist
-    pass
-
-# Table for user profiles (HP, ATK, DEF, gold)
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS user_profile (
-    guild_id INTEGER,
-    user_id INTEGER,
-    max_hp INTEGER DEFAULT 100,
-    hp INTEGER DEFAULT 100,
-    atk INTEGER DEFAULT 10,
-    def INTEGER DEFAULT 5,
-    gold INTEGER DEFAULT 0,
-    PRIMARY KEY (guild_id, user_id)
-)
-""")
-conn.commit()
-try:
-    cursor.execute("ALTER TABLE user_profile ADD COLUMN selected_badge TEXT DEFAULT NULL")
-    cursor.execute("ALTER TABLE user_profile ADD COLUMN onboarded INTEGER DEFAULT 0")
-    conn.commit()
-except Exception:
-    pass
-try:
-    cursor.execute("ALTER TABLE user_profile ADD COLUMN wins INTEGER DEFAULT 0")
-    conn.commit()
-except Exception:
-    pass
-
-# Table for user inventory (item_name, qty, equipped, slot)
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS inventory (
-    guild_id INTEGER,
-    user_id INTEGER,
-    item_name TEXT,
-    qty INTEGER DEFAULT 1,
-    PRIMARY KEY (guild_id, user_id, item_name)
-)
-""")
-conn.commit()
-
-# Add equipped/slot columns if missing
-try:
-    cursor.execute("ALTER TABLE inventory ADD COLUMN equipped INTEGER DEFAULT 0")
-    cursor.execute("ALTER TABLE inventory ADD COLUMN slot TEXT DEFAULT 'none'")
-    conn.commit()
-except Exception:
-    pass
-
-# Table for cooldowns (per command per user)
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS cooldowns (
-    guild_id INTEGER,
-    user_id INTEGER,
-    command TEXT,
-    last_used INTEGER,
-    PRIMARY KEY (guild_id, user_id, command)
-)
-""")
-conn.commit()
-
-# Table for daily quests per user (one quest per day)
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS daily_quests (
-    guild_id INTEGER,
-    user_id INTEGER,
-    date TEXT,
-    quest_key TEXT,
-    progress INTEGER DEFAULT 0,
-    target INTEGER DEFAULT 1,
-    completed INTEGER DEFAULT 0,
-    reward_gold INTEGER DEFAULT 0,
-    reward_xp INTEGER DEFAULT 0,
-    reward_item TEXT,
-    created_ts INTEGER DEFAULT 0,
-    PRIMARY KEY (guild_id, user_id, date)
-)
-""")
-conn.commit()
-try:
-    cursor.execute("ALTER TABLE daily_quests ADD COLUMN created_ts INTEGER DEFAULT 0")
-    conn.commit()
-except Exception:
-    pass
-
-# Table for per-guild prefix and other per-guild config
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS guild_config (
-    guild_id INTEGER PRIMARY KEY,
-    prefix TEXT DEFAULT '!'
-)
-""")
-conn.commit()
-
-# Ensure shop_items has atk/def/slot columns (migrations)
-def ensure_table_columns(table: str, required: dict):
-    cursor.execute(f"PRAGMA table_info({table})")
-    existing = [r[1] for r in cursor.fetchall()]
-    for col, col_def in required.items():
-        if col not in existing:
+
+def _commit(conn: sqlite3.Connection):
+    global _pending_total
+    if conn.txn_depth:
+        # inside transaction(): the outermost block commits
+        return
+    if not config.DB_GROUP_COMMIT:
+        conn.commit()
+        return
+    if conn.pending == 0:
+        conn.pending_since = time.monotonic()
+    conn.pending += 1
+    with _connections_lock:
+        _pending_total += 1
+    age_ms = (time.monotonic() - conn.pending_since) * 1000
+    if conn.pending >= config.DB_GROUP_COMMIT_MAX_STATEMENTS or age_ms >= config.DB_GROUP_COMMIT_MS:
+        _flush_conn(conn)
+
+
+def _flush_conn(conn: sqlite3.Connection):
+    global _pending_total
+    pending = conn.pending
+    conn.pending = 0
+    try:
+        if conn.generation == _generation and conn.in_transaction and not conn.txn_depth:
             try:
-                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {col} {col_def}")
+                conn.commit()
             except Exception:
-                # ignore failures (race conditions or locked DB); best-effort
-                pass
-    conn.commit()
-
-
-# Ensure necessary columns exist on startup (safe, idempotent)
-ensure_table_columns('shop_items', {
-    'atk': 'INTEGER DEFAULT 0',
-    'def': 'INTEGER DEFAULT 0',
-    "slot": "TEXT DEFAULT 'none'",
-})
-ensure_table_columns('inventory', {
-    'equipped': 'INTEGER DEFAULT 0',
-    "slot": "TEXT DEFAULT 'none'",
-})
-ensure_table_columns('user_profile', {
-    'onboarded': 'INTEGER DEFAULT 0',
-})
+                _rollback(conn)
+                raise
+    finally:
+        with _connections_lock:
+            _pending_total = max(0, _pending_total - pending)
 
 
-import time
+def flush():
+    """Commit writes deferred by group commit on this thread's connections."""
+    for conn in list(getattr(_local, 'conns', {}).values()):
+        _flush_conn(conn)
+
+
+def _rollback(conn: sqlite3.Connection):
+    """Roll back and drop cached rows, which may hold values that never landed."""
+    try:
+        conn.rollback()
+    finally:
+        cache.clear_all()
+        ranks.clear()
+
+
+def pending_writes() -> int:
+    """Number of writes waiting for a group commit, across all threads."""
+    return _pending_total
+
+
+if config.DB_GROUP_COMMIT:
+    # scripts that never call flush() still persist their writes
+    atexit.register(flush)
+
+
+# ======================
+# TRANSACTIONS
+# ======================
+@contextlib.contextmanager
+def transaction(guild_id=None):
+    """Run several helpers as one unit of work on guild_id's connection.
+
+    Everything inside the block commits together (through _commit, so group
+    commit still applies) or, if the block raises, is rolled back. Helpers
+    called inside skip their own commits. Blocks can nest; an inner block that
+    raises only undoes its own writes::
+
+        with transaction(guild_id):
+            if not spend_gold(guild_id, user_id, cost):
+                return False
+            add_item(guild_id, user_id, name)
+
+    A transaction covers one guild's database file; with sharding on, writes
+    for another guild inside the block are not part of it.
+
+    From async code, put the block in a plain function and run it with
+    database_async.run_db so it executes on the DB thread in one hop.
+    """
+    conn = get_conn(guild_id)
+    depth = conn.txn_depth
+    began = False
+    if depth == 0 and not conn.in_transaction:
+        # take the write lock up front instead of failing on upgrade later
+        conn.execute("BEGIN IMMEDIATE")
+        began = True
+    # a savepoint per level; under group commit the outermost one also keeps
+    # other deferred writes intact if this block rolls back
+    savepoint = f"txn_{depth}"
+    conn.execute(f"SAVEPOINT {savepoint}")
+    conn.txn_depth = depth + 1
+    ledger_mark = ledger.position()
+    try:
+        yield conn
+    except BaseException:
+        conn.txn_depth = depth
+        # changes that are undone never happened
+        ledger.discard_since(ledger_mark)
+        try:
+            conn.execute(f"ROLLBACK TO {savepoint}")
+            conn.execute(f"RELEASE {savepoint}")
+            if began:
+                conn.rollback()
+        finally:
+            # cached rows may hold values written inside the block
+            cache.clear_all()
+            ranks.clear()
+        raise
+    conn.txn_depth = depth
+    conn.execute(f"RELEASE {savepoint}")
+    if depth == 0:
+        _commit(conn)
+
+
+# Bring the schema up to date. When nothing is pending this is one PRAGMA read
+# per database file.
+for _conn in all_conns():
+    migrations.migrate(_conn)
+del _conn
+
+
+# ======================
+# HOT QUERIES
+# ======================
+# Queries that run on nearly every command are registered here so that
+# check_query_plans() can verify at startup that each one is served by an
+# index. Helpers use the returned SQL string directly, so the checked query
+# and the executed query cannot drift apart.
+HOT_QUERIES = {}
+
+
+def _hot_query(name: str, sql: str) -> str:
+    HOT_QUERIES[name] = sql
+    return sql
+
+
+def check_query_plans() -> dict:
+    """Run EXPLAIN QUERY PLAN on every hot query and warn about full scans.
+
+    Returns ``{name: [plan detail, ...]}`` for the queries that scan a table or
+    need a temporary B-tree to sort.
+    """
+    import logging
+    logger = logging.getLogger('bot')
+    conn = get_conn()
+    problems = {}
+    for name, sql in HOT_QUERIES.items():
+        params = (0,) * sql.count('?')
+        details = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+        # 'SCAN CONSTANT ROW' is the outer SELECT of scalar subqueries, not a table
+        bad = [d for d in details if (d.startswith('SCAN ') and d != 'SCAN CONSTANT ROW') or 'TEMP B-TREE' in d]
+        if bad:
+            problems[name] = bad
+            logger.warning(f"[db] hot query '{name}' is not fully indexed: {'; '.join(bad)}")
+    return problems
+
+
+# one row holds a player's XP, profile and progression; xp is NULL until the
+# player first gets XP (they are not ranked before that)
+_SQL_GET_PLAYER = _hot_query(
+    'get_player',
+    "SELECT xp, max_hp, hp, atk, def, gold, equip_atk, equip_def, wins, onboarded, selected_badge"
+    " FROM players WHERE guild_id=? AND user_id=?")
+_SQL_LEADERBOARD = _hot_query(
+    'leaderboard',
+    "SELECT user_id, xp FROM players WHERE guild_id=? AND xp IS NOT NULL ORDER BY xp DESC LIMIT ?")
+_SQL_GET_INVENTORY = _hot_query(
+    'get_inventory', "SELECT item_name, qty, equipped, slot FROM inventory WHERE guild_id=? AND user_id=?")
+_SQL_EQUIPPED_ITEMS = _hot_query(
+    'equipped_items', "SELECT item_name, qty, slot FROM inventory WHERE guild_id=? AND user_id=? AND equipped=1")
+_SQL_EQUIPMENT_TOTALS = _hot_query(
+    'equipment_totals',
+    "SELECT COALESCE(SUM(atk), 0), COALESCE(SUM(def), 0) FROM inventory WHERE guild_id=? AND user_id=? AND equipped=1")
+_SQL_GET_COOLDOWN = _hot_query(
+    'get_cooldown', "SELECT last_used FROM cooldowns WHERE guild_id=? AND user_id=? AND command=?")
+_SQL_ACTIVE_BUFFS = _hot_query(
+    'active_buffs', "SELECT buff_key, stat, amount, expires_ts FROM buffs WHERE guild_id=? AND user_id=? AND expires_ts>?")
+_SQL_SHOP_ITEM = _hot_query(
+    'shop_item',
+    "SELECT item_name, price, description, atk, def, slot FROM shop_items WHERE guild_id=? AND item_name=?")
+_SQL_SHOP_ITEM_BY_SLUG = _hot_query(
+    'shop_item_by_slug',
+    "SELECT item_name, price, description, atk, def, slot FROM shop_items WHERE guild_id=? AND slug=?"
+    " ORDER BY item_name LIMIT 1")
+_SQL_INVENTORY_BY_SLUG = _hot_query(
+    'inventory_by_slug',
+    "SELECT item_name, qty, equipped, slot FROM inventory WHERE guild_id=? AND user_id=? AND slug=?"
+    " ORDER BY item_name LIMIT 1")
+# created_ts=0 marks rows from before quests expired (see get_daily_quest)
+_SQL_ADVANCE_QUEST = _hot_query(
+    'advance_daily_quest',
+    "UPDATE daily_quests SET progress=progress+?, completed=(progress+?>=target)"
+    " WHERE guild_id=? AND user_id=? AND date=? AND completed=0 AND (COALESCE(created_ts, 0)=0 OR created_ts>?)"
+    " RETURNING progress, target, completed, reward_gold, reward_xp, reward_item")
+_SQL_CLEANUP_BUFFS = _hot_query(
+    'cleanup_expired_buffs', "DELETE FROM buffs WHERE expires_ts<=?")
+_SQL_GUILD_CONFIG = _hot_query(
+    'guild_config',
+    "SELECT (SELECT prefix FROM guild_config WHERE guild_id=?),"
+    " (SELECT admin_role FROM permissions WHERE guild_id=?),"
+    " (SELECT mod_role FROM permissions WHERE guild_id=?)")
+
+
+def get_guild_config(guild_id) -> GuildConfig:
+    """Return the guild's settings, from memory after the first call.
+
+    set_prefix_db and set_roles_db invalidate the cached entry.
+    """
+    conf = cache.guild_configs.get(guild_id)
+    if conf is not cache._MISSING:
+        return conf
+    conn = get_conn(guild_id)
+    prefix, admin, mod = conn.execute(_SQL_GUILD_CONFIG, (guild_id,) * 3).fetchone()
+    conf = GuildConfig(guild_id, prefix or '!', admin, mod)
+    cache.guild_configs.put(guild_id, conf)
+    return conf
 
 
 def get_roles_db(guild_id):
-    cursor.execute(
-        "SELECT admin_role, mod_role FROM permissions WHERE guild_id=?",
-        (guild_id,)
-    )
-    return cursor.fetchone()
+    conf = get_guild_config(guild_id)
+    if conf.admin_role is None and conf.mod_role is None:
+        return None
+    return conf.admin_role, conf.mod_role
 
 
 def set_roles_db(guild_id, admin, mod):
-    cursor.execute("""
+    conn = get_conn(guild_id)
+    conn.execute("""
     INSERT INTO permissions VALUES (?, ?, ?)
     ON CONFLICT(guild_id)
     DO UPDATE SET admin_role=?, mod_role=?
     """, (guild_id, admin, mod, admin, mod))
-    conn.commit()
+    _commit(conn)
+    cache.guild_configs.invalidate(guild_id)
 
 
 def get_prefix_db(guild_id):
-    cursor.execute("SELECT prefix FROM guild_config WHERE guild_id=?", (guild_id,))
-    row = cursor.fetchone()
-    return row[0] if row else '!'
+    return get_guild_config(guild_id).prefix
 
 
 def set_prefix_db(guild_id, prefix):
-    cursor.execute(
+    conn = get_conn(guild_id)
+    conn.execute(
         "INSERT INTO guild_config(guild_id, prefix) VALUES (?, ?)"
         " ON CONFLICT(guild_id) DO UPDATE SET prefix=?",
         (guild_id, prefix, prefix)
     )
-    conn.commit()
+    _commit(conn)
+    cache.guild_configs.invalidate(guild_id)
+
+
+def _cache_player(guild_id, user_id, row) -> dict:
+    """Fill the profile and XP caches from one _SQL_GET_PLAYER row; returns the profile dict."""
+    xp, max_hp, hp, atk, deff, gold, equip_atk, equip_def = row[:8]
+    prof = {
+        'max_hp': max_hp,
+        'hp': hp,
+        'atk': atk,
+        'def': deff,
+        'gold': gold,
+        'equip_atk': equip_atk or 0,
+        'equip_def': equip_def or 0,
+    }
+    cache.profiles.put((guild_id, user_id), prof)
+    cache.user_xp.put((guild_id, user_id), xp or 0)
+    return prof
 
 
 def get_user_xp(guild_id, user_id):
-    cursor.execute("SELECT xp FROM user_xp WHERE guild_id=? AND user_id=?", (guild_id, user_id))
-    row = cursor.fetchone()
-    return row[0] if row else 0
+    xp = cache.user_xp.get((guild_id, user_id))
+    if xp is not cache._MISSING:
+        return xp
+    conn = get_conn(guild_id)
+    cur = conn.execute(_SQL_GET_PLAYER, (guild_id, user_id))
+    row = cur.fetchone()
+    if row:
+        # the same read serves the profile too
+        _cache_player(guild_id, user_id, row)
+        return row[0] or 0
+    cache.user_xp.put((guild_id, user_id), 0)
+    return 0
 
 
 def set_user_xp(guild_id, user_id, xp):
-    cursor.execute(
-        "INSERT INTO user_xp(guild_id, user_id, xp) VALUES (?, ?, ?)"
+    old = None
+    if ledger.enabled():
+        # the old total is only needed for the ledger delta; active players
+        # have it in the row cache, so only a miss reads the row
+        old = get_user_xp(guild_id, user_id)
+    conn = get_conn(guild_id)
+    conn.execute(
+        "INSERT INTO players(guild_id, user_id, xp) VALUES (?, ?, ?)"
         " ON CONFLICT(guild_id, user_id) DO UPDATE SET xp=?",
         (guild_id, user_id, xp, xp)
     )
-    conn.commit()
+    _commit(conn)
+    cache.user_xp.put((guild_id, user_id), xp)
+    ranks.update(guild_id, user_id, xp)
+    if old is not None:
+        ledger.record(guild_id, user_id, 'xp', xp - old)
 
 
 def add_user_xp(guild_id, user_id, delta):
-    cur = get_user_xp(guild_id, user_id) + delta
-    set_user_xp(guild_id, user_id, cur)
-    return cur
+    """Atomically add delta XP (creating the row if needed) and return the new total."""
+    conn = get_conn(guild_id)
+    cur = conn.execute(
+        "INSERT INTO players(guild_id, user_id, xp) VALUES (?, ?, ?)"
+        " ON CONFLICT(guild_id, user_id) DO UPDATE SET xp=COALESCE(xp, 0)+excluded.xp"
+        " RETURNING xp",
+        (guild_id, user_id, delta)
+    )
+    new = cur.fetchall()[0][0]
+    _commit(conn)
+    cache.user_xp.put((guild_id, user_id), new)
+    ranks.update(guild_id, user_id, new)
+    ledger.record(guild_id, user_id, 'xp', delta)
+    return new
 
 
-def get_leaderboard(guild_id, limit=10):
-    cursor.execute(
-        "SELECT user_id, xp FROM user_xp WHERE guild_id=? ORDER BY xp DESC LIMIT ?",
-        (guild_id, limit)
+def spend_user_xp(guild_id, user_id, amount):
+    """Deduct amount XP only if the user has enough. Returns the new total, or None."""
+    conn = get_conn(guild_id)
+    cur = conn.execute(
+        "UPDATE players SET xp=xp-? WHERE guild_id=? AND user_id=? AND xp>=? RETURNING xp",
+        (amount, guild_id, user_id, amount)
     )
-    return cursor.fetchall()
+    rows = cur.fetchall()
+    _commit(conn)
+    if not rows:
+        return None
+    cache.user_xp.put((guild_id, user_id), rows[0][0])
+    ranks.update(guild_id, user_id, rows[0][0])
+    ledger.record(guild_id, user_id, 'xp', -amount)
+    return rows[0][0]
+
+
+def get_leaderboard(guild_id, limit=10):
+    conn = get_read_conn(guild_id)
+    cur = conn.execute(_SQL_LEADERBOARD, (guild_id, limit))
+    return cur.fetchall()
 
 
 def add_shop_item(guild_id, item_name, price, description='', atk=0, defn=0, slot='none'):
+    conn = get_conn(guild_id)
     try:
-        cursor.execute(
-            "INSERT INTO shop_items(guild_id, item_name, price, description, atk, def, slot) VALUES (?, ?, ?, ?, ?, ?, ?)"
+        conn.execute(
+            "INSERT INTO shop_items(guild_id, item_name, price, description, atk, def, slot, slug)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
             " ON CONFLICT(guild_id, item_name) DO UPDATE SET price=?, description=?, atk=?, def=?, slot=?",
-            (guild_id, item_name, price, description, atk, defn, slot, price, description, atk, defn, slot)
+            (guild_id, item_name, price, description, atk, defn, slot, slugify(item_name),
+             price, description, atk, defn, slot)
         )
-        conn.commit()
+        _sync_item_stats(conn, guild_id, [(item_name, atk, defn)])
+        _commit(conn)
     except Exception as e:
         # Fallback for older DB schema without atk/def/slot columns
         try:
-            cursor.execute(
+            conn.execute(
                 "INSERT INTO shop_items(guild_id, item_name, price, description) VALUES (?, ?, ?, ?)"
                 " ON CONFLICT(guild_id, item_name) DO UPDATE SET price=?, description=?",
                 (guild_id, item_name, price, description, price, description)
             )
-            conn.commit()
+            _commit(conn)
         except Exception:
             # Re-raise original exception for visibility if fallback fails
             raise e
 
 
+def add_shop_items_bulk(guild_id, items, replace=False):
+    """Upsert many shop items in one transaction and return how many were written.
+
+    ``items`` holds ``(name, price, description)`` or
+    ``(name, price, description, atk, def, slot)`` tuples. With ``replace`` the
+    guild's current shop is cleared first, so the result is exactly ``items``.
+    """
+    rows = []
+    for item in items:
+        name, price, desc, atk, defn, slot = (tuple(item) + (0, 0, 'none'))[:6]
+        rows.append((guild_id, name, price, desc, atk, defn, slot, slugify(name)))
+    conn = get_conn(guild_id)
+    with transaction(guild_id):
+        if replace:
+            conn.execute("DELETE FROM shop_items WHERE guild_id=?", (guild_id,))
+        conn.executemany(
+            "INSERT INTO shop_items(guild_id, item_name, price, description, atk, def, slot, slug)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT(guild_id, item_name) DO UPDATE SET price=excluded.price, description=excluded.description,"
+            " atk=excluded.atk, def=excluded.def, slot=excluded.slot",
+            rows
+        )
+        _sync_item_stats(conn, guild_id, [(name, atk, defn) for _, name, _, _, atk, defn, _, _ in rows])
+    return len(rows)
+
+
+def _sync_item_stats(conn, guild_id, items):
+    """Copy new (item_name, atk, def) shop stats onto every owned copy.
+
+    Players with a changed item equipped get their equipment totals refreshed.
+    """
+    users = set()
+    for name, atk, defn in items:
+        atk, defn = atk or 0, defn or 0
+        cur = conn.execute(
+            "UPDATE inventory SET atk=?, def=? WHERE guild_id=? AND item_name=? AND (atk IS NOT ? OR def IS NOT ?)"
+            " RETURNING user_id, equipped",
+            (atk, defn, guild_id, name, atk, defn)
+        )
+        users.update(user_id for user_id, equipped in cur.fetchall() if equipped)
+    for user_id in users:
+        _refresh_equipment(conn, guild_id, user_id)
+
+
 def remove_shop_item(guild_id, item_name):
-    cursor.execute("DELETE FROM shop_items WHERE guild_id=? AND item_name=?", (guild_id, item_name))
-    conn.commit()
+    conn = get_conn(guild_id)
+    conn.execute("DELETE FROM shop_items WHERE guild_id=? AND item_name=?", (guild_id, item_name))
+    _commit(conn)
 
 
 def list_shop_items(guild_id):
-    cursor.execute("SELECT item_name, price, description FROM shop_items WHERE guild_id=?", (guild_id,))
-    return cursor.fetchall()
+    conn = get_conn(guild_id)
+    cur = conn.execute("SELECT item_name, price, description FROM shop_items WHERE guild_id=?", (guild_id,))
+    return cur.fetchall()
+
+
+def list_shop_items_with_stats(guild_id):
+    """Every shop item with its stats, in one query (for the shop listing)."""
+    conn = get_conn(guild_id)
+    cur = conn.execute(
+        "SELECT item_name, price, description, atk, def, slot FROM shop_items WHERE guild_id=?", (guild_id,)
+    )
+    return cur.fetchall()
 
 
 def get_shop_item(guild_id, item_name):
-    cursor.execute("SELECT item_name, price, description, atk, def, slot FROM shop_items WHERE guild_id=? AND item_name=?", (guild_id, item_name))
-    return cursor.fetchone()
+    conn = get_conn(guild_id)
+    cur = conn.execute(_SQL_SHOP_ITEM, (guild_id, item_name))
+    return cur.fetchone()
 
 
 def get_profile(guild_id, user_id):
-    cursor.execute("SELECT max_hp, hp, atk, def, gold FROM user_profile WHERE guild_id=? AND user_id=?", (guild_id, user_id))
-    row = cursor.fetchone()
+    prof = cache.profiles.get((guild_id, user_id))
+    if prof is not cache._MISSING:
+        # callers may modify the dict they get back
+        return dict(prof)
+    conn = get_conn(guild_id)
+    cur = conn.execute(_SQL_GET_PLAYER, (guild_id, user_id))
+    row = cur.fetchone()
     if row:
-        return {
-            'max_hp': row[0],
-            'hp': row[1],
-            'atk': row[2],
-            'def': row[3],
-            'gold': row[4],
-        }
+        return dict(_cache_player(guild_id, user_id, row))
     # create default profile
-    cursor.execute("INSERT INTO user_profile(guild_id, user_id) VALUES (?, ?)", (guild_id, user_id))
-    conn.commit()
+    conn.execute("INSERT INTO players(guild_id, user_id) VALUES (?, ?)", (guild_id, user_id))
+    _commit(conn)
     return get_profile(guild_id, user_id)
 
 
 def update_profile(guild_id, user_id, **kwargs):
+    conn = get_conn(guild_id)
     # Allowed keys: max_hp, hp, atk, def, gold
     fields = []
     values = []
+    changed = {}
     for k, v in kwargs.items():
         if k in ('max_hp', 'hp', 'atk', 'def', 'gold'):
             fields.append(f"{k}=?")
             values.append(v)
+            changed[k] = v
     if not fields:
         return False
+    old_gold = None
+    if 'gold' in changed and ledger.enabled():
+        # for the ledger delta: from the row cache, else just the balance. Not
+        # get_profile, which would create a missing row the UPDATE skips.
+        prof = cache.profiles.get((guild_id, user_id))
+        if prof is not cache._MISSING:
+            old_gold = prof['gold']
+        else:
+            row = conn.execute("SELECT gold FROM players WHERE guild_id=? AND user_id=?",
+                               (guild_id, user_id)).fetchone()
+            old_gold = row[0] if row else None
     values.extend([guild_id, user_id])
-    sql = f"UPDATE user_profile SET {', '.join(fields)} WHERE guild_id=? AND user_id=?"
-    cursor.execute(sql, tuple(values))
-    conn.commit()
+    sql = f"UPDATE players SET {', '.join(fields)} WHERE guild_id=? AND user_id=?"
+    conn.execute(sql, tuple(values))
+    _commit(conn)
+    cache.profiles.update((guild_id, user_id), **changed)
+    if old_gold is not None:
+        ledger.record(guild_id, user_id, 'gold', changed['gold'] - old_gold)
     return True
 
 
 def add_gold(guild_id, user_id, amount):
-    prof = get_profile(guild_id, user_id)
-    new = prof['gold'] + amount
-    update_profile(guild_id, user_id, gold=new)
+    """Atomically add gold (creating the profile if needed) and return the new balance."""
+    conn = get_conn(guild_id)
+    cur = conn.execute(
+        "INSERT INTO players(guild_id, user_id, gold) VALUES (?, ?, ?)"
+        " ON CONFLICT(guild_id, user_id) DO UPDATE SET gold=gold+excluded.gold"
+        " RETURNING gold",
+        (guild_id, user_id, amount)
+    )
+    new = cur.fetchall()[0][0]
+    _commit(conn)
+    cache.profiles.update((guild_id, user_id), gold=new)
+    ledger.record(guild_id, user_id, 'gold', amount)
     return new
 
 
 def spend_gold(guild_id, user_id, amount):
-    prof = get_profile(guild_id, user_id)
-    if prof['gold'] < amount:
-        return False
-    update_profile(guild_id, user_id, gold=prof['gold'] - amount)
-    return True
+    """Debit gold in one statement, only if the balance covers it. Returns True on success."""
+    conn = get_conn(guild_id)
+    cur = conn.execute(
+        "UPDATE players SET gold=gold-? WHERE guild_id=? AND user_id=? AND gold>=? RETURNING gold",
+        (amount, guild_id, user_id, amount)
+    )
+    rows = cur.fetchall()
+    _commit(conn)
+    if rows:
+        cache.profiles.update((guild_id, user_id), gold=rows[0][0])
+        ledger.record(guild_id, user_id, 'gold', -amount)
+    return bool(rows)
 
 
 def add_item(guild_id, user_id, item_name, qty=1):
-    # determine item slot from shop (if exists)
-    cursor.execute("SELECT slot FROM shop_items WHERE guild_id=? AND item_name=?", (guild_id, item_name))
-    row = cursor.fetchone()
-    slot = row[0] if row else 'none'
+    add_items_bulk(guild_id, user_id, [(item_name, qty)])
 
-    cursor.execute("SELECT qty FROM inventory WHERE guild_id=? AND user_id=? AND item_name=?", (guild_id, user_id, item_name))
-    row = cursor.fetchone()
-    if row:
-        cursor.execute("UPDATE inventory SET qty=qty+?, slot=? WHERE guild_id=? AND user_id=? AND item_name=?", (qty, slot, guild_id, user_id, item_name))
-    else:
-        cursor.execute("INSERT INTO inventory(guild_id, user_id, item_name, qty, equipped, slot) VALUES (?, ?, ?, ?, 0, ?)", (guild_id, user_id, item_name, qty, slot))
-    conn.commit()
+
+def _merge_quantities(items) -> dict:
+    """Sum (item_name, qty) pairs per item, keeping first-seen order."""
+    totals = {}
+    for name, qty in items:
+        totals[name] = totals.get(name, 0) + qty
+    return totals
+
+
+def _inventory_quantities(conn, guild_id, user_id, names) -> dict:
+    """{item_name: qty} for names, with 0 for items the user does not have."""
+    marks = ', '.join('?' * len(names))
+    cur = conn.execute(
+        f"SELECT item_name, qty FROM inventory WHERE guild_id=? AND user_id=? AND item_name IN ({marks})",
+        (guild_id, user_id, *names)
+    )
+    found = dict(cur.fetchall())
+    return {name: found.get(name, 0) for name in names}
+
+
+def add_items_bulk(guild_id, user_id, items) -> dict:
+    """Add many (item_name, qty) pairs in one transaction.
+
+    Each item's slot comes from the shop (or 'none'). Returns the new
+    ``{item_name: qty}`` for every item touched.
+    """
+    totals = _merge_quantities(items)
+    if not totals:
+        return {}
+    conn = get_conn(guild_id)
+    with transaction(guild_id):
+        conn.executemany(
+            "INSERT INTO inventory(guild_id, user_id, item_name, qty, equipped, slot, slug, atk, def)"
+            " VALUES (?, ?, ?, ?, 0, COALESCE((SELECT slot FROM shop_items WHERE guild_id=? AND item_name=?), 'none'), ?,"
+            " COALESCE((SELECT atk FROM shop_items WHERE guild_id=? AND item_name=?), 0),"
+            " COALESCE((SELECT def FROM shop_items WHERE guild_id=? AND item_name=?), 0))"
+            " ON CONFLICT(guild_id, user_id, item_name) DO UPDATE SET qty=qty+excluded.qty, slot=excluded.slot",
+            [(guild_id, user_id, name, qty, guild_id, name, slugify(name), guild_id, name, guild_id, name)
+             for name, qty in totals.items()]
+        )
+        for name, qty in totals.items():
+            ledger.record(guild_id, user_id, 'item', qty, name)
+        return _inventory_quantities(conn, guild_id, user_id, list(totals))
 
 
 def get_inventory(guild_id, user_id):
-    cursor.execute("SELECT item_name, qty, equipped, slot FROM inventory WHERE guild_id=? AND user_id=?", (guild_id, user_id))
-    return cursor.fetchall()
+    conn = get_conn(guild_id)
+    cur = conn.execute(_SQL_GET_INVENTORY, (guild_id, user_id))
+    return cur.fetchall()
 
 
 def remove_item(guild_id, user_id, item_name, qty=1):
     """Remove qty of an item from inventory. If qty reaches <=0, delete the row."""
-    cursor.execute("SELECT qty FROM inventory WHERE guild_id=? AND user_id=? AND item_name=?", (guild_id, user_id, item_name))
-    row = cursor.fetchone()
+    conn = get_conn(guild_id)
+    cur = conn.execute("SELECT qty, equipped FROM inventory WHERE guild_id=? AND user_id=? AND item_name=?", (guild_id, user_id, item_name))
+    row = cur.fetchone()
     if not row:
         return False
-    cur_qty = row[0]
+    cur_qty, equipped = row
     if cur_qty <= qty:
-        cursor.execute("DELETE FROM inventory WHERE guild_id=? AND user_id=? AND item_name=?", (guild_id, user_id, item_name))
+        conn.execute("DELETE FROM inventory WHERE guild_id=? AND user_id=? AND item_name=?", (guild_id, user_id, item_name))
+        if equipped:
+            _refresh_equipment(conn, guild_id, user_id)
     else:
-        cursor.execute("UPDATE inventory SET qty=qty-? WHERE guild_id=? AND user_id=? AND item_name=?", (qty, guild_id, user_id, item_name))
-    conn.commit()
+        conn.execute("UPDATE inventory SET qty=qty-? WHERE guild_id=? AND user_id=? AND item_name=?", (qty, guild_id, user_id, item_name))
+    _commit(conn)
+    ledger.record(guild_id, user_id, 'item', -min(cur_qty, qty), item_name)
     return True
 
 
+def remove_items_bulk(guild_id, user_id, items) -> dict:
+    """Remove many (item_name, qty) pairs in one transaction.
+
+    Like remove_item, rows that reach zero are deleted and missing items are
+    ignored. Returns the remaining ``{item_name: qty}`` (0 when gone).
+    """
+    totals = _merge_quantities(items)
+    if not totals:
+        return {}
+    conn = get_conn(guild_id)
+    names = list(totals)
+    with transaction(guild_id):
+        before = _inventory_quantities(conn, guild_id, user_id, names) if ledger.enabled() else None
+        conn.executemany(
+            "UPDATE inventory SET qty=qty-? WHERE guild_id=? AND user_id=? AND item_name=?",
+            [(qty, guild_id, user_id, name) for name, qty in totals.items()]
+        )
+        marks = ', '.join('?' * len(names))
+        cur = conn.execute(
+            f"DELETE FROM inventory WHERE guild_id=? AND user_id=? AND qty<=0 AND item_name IN ({marks})"
+            " RETURNING equipped",
+            (guild_id, user_id, *names)
+        )
+        if any(equipped for equipped, in cur.fetchall()):
+            _refresh_equipment(conn, guild_id, user_id)
+        left = _inventory_quantities(conn, guild_id, user_id, names)
+        if before is not None:
+            for name in names:
+                ledger.record(guild_id, user_id, 'item', left[name] - before[name], name)
+        return left
+
+
 def set_equipped(guild_id, user_id, item_name, equipped: bool):
+    """Equip or unequip an item and refresh the player's equipment totals."""
+    conn = get_conn(guild_id)
     val = 1 if equipped else 0
-    cursor.execute("UPDATE inventory SET equipped=? WHERE guild_id=? AND user_id=? AND item_name=?", (val, guild_id, user_id, item_name))
-    conn.commit()
+    conn.execute("INSERT INTO players(guild_id, user_id) VALUES (?, ?) ON CONFLICT(guild_id, user_id) DO NOTHING", (guild_id, user_id))
+    conn.execute("UPDATE inventory SET equipped=? WHERE guild_id=? AND user_id=? AND item_name=?", (val, guild_id, user_id, item_name))
+    _refresh_equipment(conn, guild_id, user_id)
+    _commit(conn)
+
+
+def _refresh_equipment(conn, guild_id, user_id):
+    """Recompute players.equip_atk/equip_def from the equipped inventory rows.
+
+    Runs only when equipment changes, so combat reads the totals from the
+    profile row instead of walking the inventory and the shop.
+    """
+    atk, defn = conn.execute(_SQL_EQUIPMENT_TOTALS, (guild_id, user_id)).fetchone()
+    conn.execute("UPDATE players SET equip_atk=?, equip_def=? WHERE guild_id=? AND user_id=?", (atk, defn, guild_id, user_id))
+    cache.profiles.update((guild_id, user_id), equip_atk=atk, equip_def=defn)
 
 
 def get_equipped_items(guild_id, user_id):
-    cursor.execute("SELECT item_name, qty, slot FROM inventory WHERE guild_id=? AND user_id=? AND equipped=1", (guild_id, user_id))
-    return cursor.fetchall()
+    conn = get_conn(guild_id)
+    cur = conn.execute(_SQL_EQUIPPED_ITEMS, (guild_id, user_id))
+    return cur.fetchall()
 
 
 def get_shop_item_with_stats(guild_id, item_name):
-    # Try exact match first
-    cursor.execute("SELECT item_name, price, description, atk, def, slot FROM shop_items WHERE guild_id=? AND item_name=?", (guild_id, item_name))
-    row = cursor.fetchone()
+    """Shop row by exact name, else by slug (so any casing or "sword_of_light" works).
+
+    Both are index lookups. If several items share a slug the alphabetically
+    first one wins.
+    """
+    conn = get_conn(guild_id)
+    row = conn.execute(_SQL_SHOP_ITEM, (guild_id, item_name)).fetchone()
     if row:
         return row
-    # Fallback: fetch all guild shop items and attempt case-insensitive or slug match
-    cursor.execute("SELECT item_name, price, description, atk, def, slot FROM shop_items WHERE guild_id=?", (guild_id,))
-    rows = cursor.fetchall()
-    if not rows:
-        return None
-    import re
-    def slug(s: str) -> str:
-        return re.sub(r"[^a-z0-9]+", "_", s.lower()).strip("_")
-    target = item_name.lower()
-    for r in rows:
-        name = r[0]
-        if name.lower() == target or slug(name) == target:
-            return r
-    return None
+    return conn.execute(_SQL_SHOP_ITEM_BY_SLUG, (guild_id, slugify(item_name))).fetchone()
+
+
+def find_inventory_item(guild_id, user_id, item_name):
+    """(item_name, qty, equipped, slot) the user owns, matched like get_shop_item_with_stats."""
+    conn = get_conn(guild_id)
+    row = conn.execute(
+        "SELECT item_name, qty, equipped, slot FROM inventory WHERE guild_id=? AND user_id=? AND item_name=?",
+        (guild_id, user_id, item_name)
+    ).fetchone()
+    if row:
+        return row
+    return conn.execute(_SQL_INVENTORY_BY_SLUG, (guild_id, user_id, slugify(item_name))).fetchone()
 
 
 def set_cooldown(guild_id, user_id, command, ts=None):
+    conn = get_conn(guild_id)
     if ts is None:
         ts = int(time.time())
-    cursor.execute("INSERT INTO cooldowns(guild_id, user_id, command, last_used) VALUES (?, ?, ?, ?)"
-                   " ON CONFLICT(guild_id, user_id, command) DO UPDATE SET last_used=?",
-                   (guild_id, user_id, command, ts, ts))
-    conn.commit()
+    conn.execute("INSERT INTO cooldowns(guild_id, user_id, command, last_used) VALUES (?, ?, ?, ?)"
+                 " ON CONFLICT(guild_id, user_id, command) DO UPDATE SET last_used=?",
+                 (guild_id, user_id, command, ts, ts))
+    _commit(conn)
 
 
 def get_cooldown(guild_id, user_id, command):
-    cursor.execute("SELECT last_used FROM cooldowns WHERE guild_id=? AND user_id=? AND command=?", (guild_id, user_id, command))
-    row = cursor.fetchone()
+    conn = get_conn(guild_id)
+    cur = conn.execute(_SQL_GET_COOLDOWN, (guild_id, user_id, command))
+    row = cur.fetchone()
     return row[0] if row else None
 
 
+def get_active_cooldowns(command, since):
+    """Return (guild_id, user_id, last_used) for every use of command after since."""
+    rows = []
+    for conn in all_conns():
+        cur = conn.execute(
+            "SELECT guild_id, user_id, last_used FROM cooldowns WHERE command=? AND last_used>?",
+            (command, since)
+        )
+        rows.extend(cur.fetchall())
+    return rows
+
+
+def set_cooldowns_bulk(rows):
+    """Upsert many (guild_id, user_id, command, last_used) rows, one transaction per database file."""
+    by_conn = {}
+    for row in rows:
+        by_conn.setdefault(get_conn(row[0]), []).append(row)
+    for conn, conn_rows in by_conn.items():
+        conn.executemany(
+            "INSERT INTO cooldowns(guild_id, user_id, command, last_used) VALUES (?, ?, ?, ?)"
+            " ON CONFLICT(guild_id, user_id, command) DO UPDATE SET last_used=excluded.last_used",
+            conn_rows
+        )
+        _commit(conn)
+
+
 def _today_date():
     import time
     return time.strftime('%Y-%m-%d')
@@ -409,10 +866,14 @@ def _now_ts():
 
 
 def get_daily_quest(guild_id, user_id):
-    """Return today's daily quest for a user or None."""
+    """Return today's daily quest for a user or None.
+
+    A finished quest is still returned (``completed`` True) for the rest of the day.
+    """
+    conn = get_conn(guild_id)
     date = _today_date()
-    cursor.execute("SELECT quest_key, progress, target, completed, reward_gold, reward_xp, reward_item, created_ts FROM daily_quests WHERE guild_id=? AND user_id=? AND date=?", (guild_id, user_id, date))
-    row = cursor.fetchone()
+    cur = conn.execute("SELECT quest_key, progress, target, completed, reward_gold, reward_xp, reward_item, created_ts FROM daily_quests WHERE guild_id=? AND user_id=? AND date=?", (guild_id, user_id, date))
+    row = cur.fetchone()
     if not row:
         return None
     # If quest is older than 24 hours, consider it expired
@@ -437,112 +898,82 @@ def get_daily_quest(guild_id, user_id):
 
 
 def create_daily_quest(guild_id, user_id, quest_key: str, target: int = 1, reward_gold: int = 0, reward_xp: int = 0, reward_item: str | None = None):
+    conn = get_conn(guild_id)
     date = _today_date()
     created = _now_ts()
-    cursor.execute("INSERT OR REPLACE INTO daily_quests(guild_id, user_id, date, quest_key, progress, target, completed, reward_gold, reward_xp, reward_item, created_ts) VALUES (?, ?, ?, ?, 0, ?, 0, ?, ?, ?, ?)", (guild_id, user_id, date, quest_key, target, reward_gold, reward_xp, reward_item, created))
-    conn.commit()
+    conn.execute("INSERT OR REPLACE INTO daily_quests(guild_id, user_id, date, quest_key, progress, target, completed, reward_gold, reward_xp, reward_item, created_ts) VALUES (?, ?, ?, ?, 0, ?, 0, ?, ?, ?, ?)", (guild_id, user_id, date, quest_key, target, reward_gold, reward_xp, reward_item, created))
+    _commit(conn)
 
 
 def increment_daily_progress(guild_id, user_id, amount: int = 1):
-    """Increment progress for today's quest. If target reached, apply rewards and mark completed.
-    Returns a dict: {'completed': bool, 'claimed': bool, 'progress': int, 'target': int, 'rewards': {...}}
-    """
-    date = _today_date()
-    q = get_daily_quest(guild_id, user_id)
-    if not q:
-        return {'error': 'no_quest'}
-    if q['completed']:
-        return {'completed': True, 'claimed': True, 'progress': q['progress'], 'target': q['target']}
-
-    new_progress = q['progress'] + amount
-    cursor.execute("UPDATE daily_quests SET progress=? WHERE guild_id=? AND user_id=? AND date=?", (new_progress, guild_id, user_id, date))
-    conn.commit()
-
-    claimed = False
-    rewards = {}
-    if new_progress >= q['target']:
-        # mark completed and give rewards
-        cursor.execute("UPDATE daily_quests SET completed=1 WHERE guild_id=? AND user_id=? AND date=?", (guild_id, user_id, date))
-        conn.commit()
-        claimed = True
-        # apply rewards to profile/inventory
-        if q['reward_xp'] and q['reward_xp'] > 0:
-            try:
-                add_user_xp(guild_id, user_id, q['reward_xp'])
-                rewards['xp'] = q['reward_xp']
-            except Exception:
-                pass
-        if q['reward_gold'] and q['reward_gold'] > 0:
-            try:
-                add_gold(guild_id, user_id, q['reward_gold'])
-                rewards['gold'] = q['reward_gold']
-            except Exception:
-                pass
-        if q['reward_item']:
-            try:
-                add_item(guild_id, user_id, q['reward_item'], qty=1)
-                rewards['item'] = q['reward_item']
-            except Exception:
-                pass
-        # remove finished quest row so next get_daily_quest returns None
-        try:
-            cursor.execute("DELETE FROM daily_quests WHERE guild_id=? AND user_id=? AND date=?", (guild_id, user_id, date))
-            conn.commit()
-        except Exception:
-            pass
-
-    return {'completed': new_progress >= q['target'], 'claimed': claimed, 'progress': new_progress, 'target': q['target'], 'rewards': rewards, 'deleted': claimed}
+    """Advance today's quest; on reaching the target, pay out rewards.
 
-
-# Buffs management
-try:
-    cursor.execute("CREATE TABLE IF NOT EXISTS buffs (guild_id INTEGER, user_id INTEGER, buff_key TEXT, stat TEXT, amount INTEGER, expires_ts INTEGER, PRIMARY KEY (guild_id, user_id, buff_key))")
-    conn.commit()
-except Exception:
-    pass
-
-# Achievements / badges
-try:
-    cursor.execute("CREATE TABLE IF NOT EXISTS achievements (guild_id INTEGER, user_id INTEGER, badge_key TEXT, earned_ts INTEGER, PRIMARY KEY (guild_id, user_id, badge_key))")
-    conn.commit()
-except Exception:
-    pass
-
-try:
-    cursor.execute("ALTER TABLE user_profile ADD COLUMN selected_badge TEXT DEFAULT NULL")
-    conn.commit()
-except Exception:
-    pass
+    One conditional UPDATE ... RETURNING advances progress and flags
+    completion, so a quest completes (and pays) exactly once. The finished
+    row stays as today's completed marker. Returns a dict:
+    {'completed': bool, 'claimed': bool, 'progress': int, 'target': int, 'rewards': {...}},
+    where claimed means the rewards were paid by this call, or {'error': 'no_quest'}.
+    """
+    # progress, completion and rewards land together or not at all
+    with transaction(guild_id):
+        conn = get_conn(guild_id)
+        row = conn.execute(
+            _SQL_ADVANCE_QUEST, (amount, amount, guild_id, user_id, _today_date(), _now_ts() - 86400)
+        ).fetchone()
+        if row is None:
+            # no quest today, or it is already completed
+            q = get_daily_quest(guild_id, user_id)
+            if not q:
+                return {'error': 'no_quest'}
+            return {'completed': True, 'claimed': False, 'progress': q['progress'], 'target': q['target'], 'rewards': {}}
+        progress, target, completed, reward_gold, reward_xp, reward_item = row
+        rewards = {}
+        if completed:
+            if reward_xp and reward_xp > 0:
+                add_user_xp(guild_id, user_id, reward_xp)
+                rewards['xp'] = reward_xp
+            if reward_gold and reward_gold > 0:
+                add_gold(guild_id, user_id, reward_gold)
+                rewards['gold'] = reward_gold
+            if reward_item:
+                add_item(guild_id, user_id, reward_item, qty=1)
+                rewards['item'] = reward_item
+        return {'completed': bool(completed), 'claimed': bool(completed), 'progress': progress, 'target': target,
+                'rewards': rewards}
 
 
 def add_buff(guild_id, user_id, buff_key: str, stat: str, amount: int, duration_seconds: int):
+    conn = get_conn(guild_id)
     expires = _now_ts() + int(duration_seconds)
-    cursor.execute("INSERT OR REPLACE INTO buffs(guild_id, user_id, buff_key, stat, amount, expires_ts) VALUES (?, ?, ?, ?, ?, ?)", (guild_id, user_id, buff_key, stat, amount, expires))
-    conn.commit()
+    conn.execute("INSERT OR REPLACE INTO buffs(guild_id, user_id, buff_key, stat, amount, expires_ts) VALUES (?, ?, ?, ?, ?, ?)", (guild_id, user_id, buff_key, stat, amount, expires))
+    _commit(conn)
 
 
 def get_active_buffs(guild_id, user_id):
+    conn = get_conn(guild_id)
     now = _now_ts()
-    cursor.execute("SELECT buff_key, stat, amount, expires_ts FROM buffs WHERE guild_id=? AND user_id=? AND expires_ts>?", (guild_id, user_id, now))
-    return cursor.fetchall()
+    cur = conn.execute(_SQL_ACTIVE_BUFFS, (guild_id, user_id, now))
+    return cur.fetchall()
 
 
 def cleanup_expired_buffs():
     now = _now_ts()
-    cursor.execute("DELETE FROM buffs WHERE expires_ts<=?", (now,))
-    conn.commit()
+    for conn in all_conns():
+        conn.execute(_SQL_CLEANUP_BUFFS, (now,))
+        _commit(conn)
 
 
 def delete_buff(guild_id, user_id, buff_key: str):
-    cursor.execute("DELETE FROM buffs WHERE guild_id=? AND user_id=? AND buff_key=?", (guild_id, user_id, buff_key))
-    conn.commit()
+    conn = get_conn(guild_id)
+    conn.execute("DELETE FROM buffs WHERE guild_id=? AND user_id=? AND buff_key=?", (guild_id, user_id, buff_key))
+    _commit(conn)
 
 
 def get_effective_profile(guild_id, user_id):
-    """Return profile with active buffs applied to atk/def."""
+    """Return profile with equipment bonuses and active buffs applied to atk/def."""
     prof = get_profile(guild_id, user_id)
-    atk = prof.get('atk', 0)
-    deff = prof.get('def', 0)
+    atk = prof.get('atk', 0) + prof.get('equip_atk', 0)
+    deff = prof.get('def', 0) + prof.get('equip_def', 0)
     buffs = get_active_buffs(guild_id, user_id)
     for bk, stat, amount, exp in buffs:
         if stat == 'atk':
@@ -555,65 +986,236 @@ def get_effective_profile(guild_id, user_id):
     return out
 
 
+def get_player_snapshot(guild_id, user_id) -> PlayerSnapshot:
+    """Load the player row, buffs and inventory in one read transaction.
+
+    Creates the default profile row for new players, like get_profile.
+    """
+    conn = get_conn(guild_id)
+    # under group commit the connection may already be inside a transaction,
+    # which gives the same consistent view
+    own_txn = not conn.in_transaction
+    created = False
+    if own_txn:
+        conn.execute("BEGIN")
+    try:
+        row = conn.execute(_SQL_GET_PLAYER, (guild_id, user_id)).fetchone()
+        if row is None:
+            # new player: create the default row in this transaction and read
+            # it back once (not via get_profile, whose cache may be stale)
+            conn.execute("INSERT OR IGNORE INTO players(guild_id, user_id) VALUES (?, ?)", (guild_id, user_id))
+            created = True
+            row = conn.execute(_SQL_GET_PLAYER, (guild_id, user_id)).fetchone()
+        buffs = conn.execute(_SQL_ACTIVE_BUFFS, (guild_id, user_id, _now_ts())).fetchall()
+        inventory = conn.execute(_SQL_GET_INVENTORY, (guild_id, user_id)).fetchall()
+    except BaseException:
+        if own_txn:
+            conn.rollback()
+        raise
+    if own_txn:
+        conn.commit()
+    elif created:
+        # joined an open transaction: commit the insert with it
+        _commit(conn)
+    # fresh read: refresh the row caches for the commands that follow
+    prof = _cache_player(guild_id, user_id, row)
+    wins, onboarded, badge = row[8:]
+    return PlayerSnapshot(
+        guild_id, user_id, prof['max_hp'], prof['hp'], prof['atk'], prof['def'], prof['gold'],
+        prof['equip_atk'], prof['equip_def'], row[0] or 0, int(wins or 0), bool(onboarded),
+        badge or None, tuple(buffs), tuple(inventory),
+    )
+
+
 def award_achievement(guild_id, user_id, badge_key: str):
+    conn = get_conn(guild_id)
     ts = _now_ts()
-    cursor.execute("INSERT OR REPLACE INTO achievements(guild_id, user_id, badge_key, earned_ts) VALUES (?, ?, ?, ?)", (guild_id, user_id, badge_key, ts))
-    conn.commit()
+    conn.execute("INSERT OR REPLACE INTO achievements(guild_id, user_id, badge_key, earned_ts) VALUES (?, ?, ?, ?)", (guild_id, user_id, badge_key, ts))
+    _commit(conn)
 
 
 def list_user_achievements(guild_id, user_id):
-    cursor.execute("SELECT badge_key, earned_ts FROM achievements WHERE guild_id=? AND user_id=?", (guild_id, user_id))
-    return cursor.fetchall()
+    conn = get_conn(guild_id)
+    cur = conn.execute("SELECT badge_key, earned_ts FROM achievements WHERE guild_id=? AND user_id=?", (guild_id, user_id))
+    return cur.fetchall()
 
 
 def set_selected_badge(guild_id, user_id, badge_key: str):
+    conn = get_conn(guild_id)
     # ensure profile exists
-    cursor.execute("INSERT INTO user_profile(guild_id, user_id) VALUES (?, ?) ON CONFLICT(guild_id, user_id) DO NOTHING", (guild_id, user_id))
-    cursor.execute("UPDATE user_profile SET selected_badge=? WHERE guild_id=? AND user_id=?", (badge_key, guild_id, user_id))
-    conn.commit()
+    conn.execute("INSERT INTO players(guild_id, user_id) VALUES (?, ?) ON CONFLICT(guild_id, user_id) DO NOTHING", (guild_id, user_id))
+    conn.execute("UPDATE players SET selected_badge=? WHERE guild_id=? AND user_id=?", (badge_key, guild_id, user_id))
+    _commit(conn)
 
 
 def get_selected_badge(guild_id, user_id):
-    cursor.execute("SELECT selected_badge FROM user_profile WHERE guild_id=? AND user_id=?", (guild_id, user_id))
-    row = cursor.fetchone()
+    conn = get_conn(guild_id)
+    cur = conn.execute("SELECT selected_badge FROM players WHERE guild_id=? AND user_id=?", (guild_id, user_id))
+    row = cur.fetchone()
     return row[0] if row and row[0] else None
 
 
 def get_all_user_xp(guild_id):
-    cursor.execute("SELECT xp FROM user_xp WHERE guild_id=?", (guild_id,))
-    return [r[0] for r in cursor.fetchall()]
+    conn = get_read_conn(guild_id)
+    cur = conn.execute("SELECT xp FROM players WHERE guild_id=? AND xp IS NOT NULL", (guild_id,))
+    return [r[0] for r in cur.fetchall()]
+
+
+def get_xp_stats(guild_id, percentiles=XP_PERCENTILES) -> XpStats:
+    """Count, sum, average, min, max and percentiles of the guild's XP (see readonly_db.xp_stats)."""
+    return readonly_db.xp_stats(get_read_conn(guild_id), guild_id, percentiles)
+
+
+def get_xp_histogram(guild_id, bucket_size=100) -> list:
+    """[(bucket_start, users), ...] ascending; the default bucket is one level (100 XP)."""
+    return readonly_db.xp_histogram(get_read_conn(guild_id), guild_id, bucket_size)
+
+
+def append_ledger(rows):
+    """Insert (guild_id, user_id, kind, item, delta, reason, ts) rows; see ledger.py."""
+    by_path = {}
+    for row in rows:
+        by_path.setdefault(sharding.path_for(row[0]), []).append(row)
+    for path, batch in by_path.items():
+        conn = _conn_for_path(path)
+        conn.executemany(
+            "INSERT INTO ledger(guild_id, user_id, kind, item, delta, reason, ts) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            batch
+        )
+        _commit(conn)
+
+
+def get_ledger_history(guild_id, user_id, limit=20, kind=None):
+    """[(kind, item, delta, reason, ts), ...] for one user, newest first."""
+    conn = get_read_conn(guild_id)
+    sql = "SELECT kind, item, delta, reason, ts FROM ledger WHERE guild_id=? AND user_id=?"
+    params = [guild_id, user_id]
+    if kind:
+        sql += " AND kind=?"
+        params.append(kind)
+    sql += " ORDER BY ts DESC, id DESC LIMIT ?"
+    params.append(limit)
+    return conn.execute(sql, params).fetchall()
+
+
+def get_ledger_summary(guild_id, since=0):
+    """Guild-wide flow since a timestamp, grouped by kind, item and reason.
+
+    Returns [(kind, item, reason, created, destroyed, entries), ...] where
+    created/destroyed are the summed positive/negative deltas (destroyed >= 0),
+    largest movement first.
+    """
+    conn = get_read_conn(guild_id)
+    cur = conn.execute(
+        "SELECT kind, item, reason,"
+        " SUM(CASE WHEN delta>0 THEN delta ELSE 0 END),"
+        " -SUM(CASE WHEN delta<0 THEN delta ELSE 0 END),"
+        " COUNT(*)"
+        " FROM ledger WHERE guild_id=? AND ts>=?"
+        " GROUP BY kind, item, reason ORDER BY SUM(ABS(delta)) DESC",
+        (guild_id, since)
+    )
+    return cur.fetchall()
+
+
+def get_xp_rows(guild_id):
+    """[(user_id, xp), ...] for every user in the guild, unordered (loads ranks)."""
+    conn = get_conn(guild_id)
+    return conn.execute("SELECT user_id, xp FROM players WHERE guild_id=? AND xp IS NOT NULL", (guild_id,)).fetchall()
 
 
 def get_wins(guild_id, user_id):
-    cursor.execute("SELECT wins FROM user_profile WHERE guild_id=? AND user_id=?", (guild_id, user_id))
-    row = cursor.fetchone()
+    conn = get_conn(guild_id)
+    cur = conn.execute("SELECT wins FROM players WHERE guild_id=? AND user_id=?", (guild_id, user_id))
+    row = cur.fetchone()
     if not row:
-        cursor.execute("INSERT INTO user_profile(guild_id, user_id) VALUES (?, ?)", (guild_id, user_id))
-        conn.commit()
+        conn.execute("INSERT INTO players(guild_id, user_id) VALUES (?, ?)", (guild_id, user_id))
+        _commit(conn)
         return 0
     return int(row[0] or 0)
 
 
 def add_win(guild_id, user_id, amount: int = 1):
-    cur = get_wins(guild_id, user_id) + amount
-    cursor.execute("INSERT INTO user_profile(guild_id, user_id) VALUES (?, ?) ON CONFLICT(guild_id, user_id) DO NOTHING", (guild_id, user_id))
-    cursor.execute("UPDATE user_profile SET wins=? WHERE guild_id=? AND user_id=?", (cur, guild_id, user_id))
-    conn.commit()
-    return cur
+    conn = get_conn(guild_id)
+    cur = conn.execute(
+        "INSERT INTO players(guild_id, user_id, wins) VALUES (?, ?, ?)"
+        " ON CONFLICT(guild_id, user_id) DO UPDATE SET wins=COALESCE(wins, 0)+excluded.wins"
+        " RETURNING wins",
+        (guild_id, user_id, amount)
+    )
+    new = cur.fetchall()[0][0]
+    _commit(conn)
+    return new
 
 
 def get_onboarded(guild_id, user_id):
-    cursor.execute("SELECT onboarded FROM user_profile WHERE guild_id=? AND user_id=?", (guild_id, user_id))
-    row = cursor.fetchone()
+    conn = get_conn(guild_id)
+    cur = conn.execute("SELECT onboarded FROM players WHERE guild_id=? AND user_id=?", (guild_id, user_id))
+    row = cur.fetchone()
     if not row:
         # create default profile
-        cursor.execute("INSERT INTO user_profile(guild_id, user_id) VALUES (?, ?)", (guild_id, user_id))
-        conn.commit()
+        conn.execute("INSERT INTO players(guild_id, user_id) VALUES (?, ?)", (guild_id, user_id))
+        _commit(conn)
         return False
     return bool(row[0])
 
 
 def set_onboarded(guild_id, user_id):
-    cursor.execute("INSERT INTO user_profile(guild_id, user_id) VALUES (?, ?) ON CONFLICT(guild_id, user_id) DO NOTHING", (guild_id, user_id))
-    cursor.execute("UPDATE user_profile SET onboarded=1 WHERE guild_id=? AND user_id=?", (guild_id, user_id))
-    conn.commit()
+    conn = get_conn(guild_id)
+    conn.execute("INSERT INTO players(guild_id, user_id) VALUES (?, ?) ON CONFLICT(guild_id, user_id) DO NOTHING", (guild_id, user_id))
+    conn.execute("UPDATE players SET onboarded=1 WHERE guild_id=? AND user_id=?", (guild_id, user_id))
+    _commit(conn)
+
+
+# ======================
+# HOUSEKEEPING
+# ======================
+# Rows that can never be read again. Each purge deletes at most `limit` rows
+# per database file so the write lock is held only briefly; callers loop until
+# a batch comes back short (see cogs/housekeeping.py).
+def _retention_rules(now: int) -> dict:
+    return {
+        'buffs': ("buffs", "expires_ts<=?", (now,)),
+        # get_daily_quest only ever reads today's date
+        'daily_quests': ("daily_quests", "date<?", (_today_date(),)),
+        'cooldowns': ("cooldowns", "last_used<?", (now - config.COOLDOWN_RETENTION_SECONDS,)),
+    }
+
+
+PURGE_KINDS = ('buffs', 'daily_quests', 'cooldowns')
+
+
+def purge_expired_batch(kind, limit=500) -> int:
+    """Delete up to limit expired rows of one kind (see PURGE_KINDS) per database file."""
+    table, where, params = _retention_rules(_now_ts())[kind]
+    deleted = 0
+    for conn in all_conns():
+        cur = conn.execute(
+            f"DELETE FROM {table} WHERE rowid IN (SELECT rowid FROM {table} WHERE {where} LIMIT ?)",
+            (*params, limit)
+        )
+        deleted += cur.rowcount
+        _commit(conn)
+    return deleted
+
+
+def compact(vacuum_pages=1000) -> dict:
+    """Return free pages to the OS and refresh planner statistics.
+
+    Runs ``PRAGMA incremental_vacuum`` (when the file uses incremental
+    auto-vacuum) and ``PRAGMA optimize`` on every database file. Returns
+    ``{'pages_freed': n, 'pages_free': n}`` summed over all files.
+    """
+    flush()
+    freed = free_left = 0
+    for conn in all_conns():
+        before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            # execute() steps a column-less statement only once (one page);
+            # executescript runs it to completion
+            conn.executescript(f"PRAGMA incremental_vacuum({int(vacuum_pages)})")
+        conn.execute("PRAGMA optimize")
+        after = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        freed += before - after
+        free_left += after
+    return {'pages_freed': freed, 'pages_free': free_left}
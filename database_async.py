@@ -0,0 +1,239 @@
+"""Async access layer for :mod:`database`.
+
+Every helper in ``database`` runs a blocking sqlite3 query (plus a commit for
+writes). Calling them straight from a command handler stalls the discord.py
+event loop — and with it every guild's heartbeat — whenever the disk is slow.
+
+This module exposes the same helpers, with the same names and return values,
+as coroutines, dispatched to the storage backend chosen by STORAGE_BACKEND
+(see :mod:`storage`). The actual work runs on a dedicated DB executor thread so
+the event loop only awaits a future::
+
+    from database_async import get_profile, add_gold
+
+    profile = await get_profile(guild_id, user_id)
+    await add_gold(guild_id, user_id, 10)
+
+Composite actions that need several helpers in a row can ship a plain sync
+function to the DB thread in one hop with :func:`run_db`. Read-only analytics
+helpers (leaderboard, XP stats, ledger queries) instead run on a reader pool
+with read-only connections (:func:`run_read`), beside the DB thread.
+
+Every ``await`` here lets other commands run, so a read followed by a write
+in a later await is no longer atomic the way the old synchronous calls were.
+Gate once-per-period rewards with :func:`cooldowns.check`, which takes the
+cooldown before the command's first await, and put the reward writes in one
+:func:`run_db` transaction rather than checking and writing in separate
+awaits.
+"""
+import asyncio
+import contextvars
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import cache
+import config
+import ranks
+from storage import backend
+
+# A single worker keeps all sqlite access on one thread, in submission order.
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='bot-db')
+
+# Storage helpers (see storage.base.StorageBackend) that get an awaitable twin here.
+_SYNC_HELPERS = (
+    'set_roles_db',
+    'set_prefix_db',
+    'get_user_xp',
+    'set_user_xp',
+    'add_user_xp',
+    'spend_user_xp',
+    'add_shop_item',
+    'add_shop_items_bulk',
+    'remove_shop_item',
+    'list_shop_items',
+    'list_shop_items_with_stats',
+    'get_shop_item',
+    'get_profile',
+    'update_profile',
+    'add_gold',
+    'spend_gold',
+    'add_item',
+    'add_items_bulk',
+    'remove_items_bulk',
+    'get_inventory',
+    'find_inventory_item',
+    'remove_item',
+    'set_equipped',
+    'get_equipped_items',
+    'get_shop_item_with_stats',
+    'set_cooldown',
+    'get_cooldown',
+    'get_active_cooldowns',
+    'set_cooldowns_bulk',
+    'get_daily_quest',
+    'create_daily_quest',
+    'increment_daily_progress',
+    'add_buff',
+    'get_active_buffs',
+    'cleanup_expired_buffs',
+    'delete_buff',
+    'get_effective_profile',
+    'get_player_snapshot',
+    'award_achievement',
+    'list_user_achievements',
+    'set_selected_badge',
+    'get_selected_badge',
+    'get_xp_rows',
+    'append_ledger',
+    'get_wins',
+    'add_win',
+    'get_onboarded',
+    'set_onboarded',
+    'check_query_plans',
+    'purge_expired_batch',
+    'compact',
+)
+
+# Analytics-style reads. With a backend that supports it (SQLite: read-only
+# WAL connections) they run on a small reader pool instead of the DB thread,
+# so a long scan never delays gameplay writes queued behind it.
+_READ_HELPERS = (
+    'get_leaderboard',
+    'get_all_user_xp',
+    'get_xp_stats',
+    'get_xp_histogram',
+    'get_ledger_history',
+    'get_ledger_summary',
+)
+_read_executor = (
+    ThreadPoolExecutor(max_workers=max(config.DB_READ_POOL_SIZE, 1), thread_name_prefix='bot-db-read')
+    if backend.concurrent_reads else _executor
+)
+
+
+async def run_db(func, *args, **kwargs):
+    """Run ``func(*args, **kwargs)`` on the DB thread and return its result.
+
+    The caller's context variables (e.g. the ledger reason) are visible to func.
+    """
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(_executor, functools.partial(ctx.run, func, *args, **kwargs))
+
+
+async def run_read(func, *args, **kwargs):
+    """Run a read-only ``func`` on the reader pool (the DB thread if the backend has none)."""
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(_read_executor, functools.partial(ctx.run, func, *args, **kwargs))
+
+
+def _wrap(func, runner=run_db):
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await runner(func, *args, **kwargs)
+    return wrapper
+
+
+for _name in _SYNC_HELPERS:
+    globals()[_name] = _wrap(getattr(backend, _name))
+for _name in _READ_HELPERS:
+    globals()[_name] = _wrap(getattr(backend, _name), run_read)
+del _name
+
+
+# The guild config is read for every message the bot sees (command prefix).
+# Once cached, answer straight from memory instead of hopping to the DB thread.
+async def get_guild_config(guild_id):
+    conf = cache.guild_configs.get(guild_id)
+    if conf is cache._MISSING:
+        conf = await run_db(backend.get_guild_config, guild_id)
+    return conf
+
+
+async def get_prefix_db(guild_id):
+    return (await get_guild_config(guild_id)).prefix
+
+
+async def get_roles_db(guild_id):
+    conf = await get_guild_config(guild_id)
+    if conf.admin_role is None and conf.mod_role is None:
+        return None
+    return conf.admin_role, conf.mod_role
+
+
+# Ranks are answered from the in-memory ranking (see ranks.py); the guild is
+# loaded on the DB thread the first time, so it is ordered with XP writes.
+def _load_ranks(guild_id):
+    guild_ranks = ranks.get(guild_id)
+    if guild_ranks is None:
+        guild_ranks = ranks.load(guild_id, backend.get_xp_rows(guild_id))
+    return guild_ranks
+
+
+async def _guild_ranks(guild_id):
+    guild_ranks = ranks.get(guild_id)
+    if guild_ranks is None:
+        guild_ranks = await run_db(_load_ranks, guild_id)
+    return guild_ranks
+
+
+async def get_rank(guild_id, user_id):
+    """ranks.Rank(rank, xp, total) for the user, or None if they have no XP."""
+    return (await _guild_ranks(guild_id)).rank(user_id)
+
+
+async def get_rank_page(guild_id, page=1, per_page=10):
+    """[(rank, user_id, xp), ...] for one leaderboard page, highest XP first."""
+    return (await _guild_ranks(guild_id)).page(page, per_page)
+
+
+async def get_rank_total(guild_id):
+    return len(await _guild_ranks(guild_id))
+
+
+_flush_task = None
+
+
+async def _group_commit_flusher():
+    """Commit deferred writes at least every DB_GROUP_COMMIT_MS."""
+    interval = max(config.DB_GROUP_COMMIT_MS, 1) / 1000
+    try:
+        while True:
+            await asyncio.sleep(interval)
+            if backend.pending_writes():
+                try:
+                    await run_db(backend.flush)
+                except Exception:
+                    logging.getLogger('bot').exception('[db] group commit flush failed')
+    except asyncio.CancelledError:
+        return
+
+
+def start():
+    """Start background DB jobs (group-commit flusher). Call once the loop runs."""
+    global _flush_task
+    if config.DB_GROUP_COMMIT and _flush_task is None:
+        _flush_task = asyncio.get_running_loop().create_task(_group_commit_flusher())
+
+
+async def shutdown():
+    """Flush pending writes, stop the DB thread and close connections."""
+    global _flush_task
+    if _flush_task is not None:
+        _flush_task.cancel()
+        _flush_task = None
+    try:
+        await run_db(backend.flush)
+    except Exception:
+        logging.getLogger('bot').exception('[db] final flush failed')
+    loop = asyncio.get_running_loop()
+    if _read_executor is not _executor:
+        await loop.run_in_executor(None, functools.partial(_read_executor.shutdown, wait=True))
+    await loop.run_in_executor(None, functools.partial(_executor.shutdown, wait=True))
+    backend.close()
+
+
+__all__ = ['run_db', 'run_read', 'start', 'shutdown', 'get_guild_config', 'get_prefix_db', 'get_roles_db',
+           'get_rank', 'get_rank_page', 'get_rank_total', *_SYNC_HELPERS, *_READ_HELPERS]
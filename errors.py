@@ -0,0 +1,14 @@
+"""Exceptions raised by checks and handled in main.on_command_error."""
+from discord.ext import commands
+
+
+class CooldownActive(commands.CheckFailure):
+    """The user invoked a command that is still on cooldown (see cooldowns.check).
+
+    ``str(error)`` is the message to show the user.
+    """
+
+    def __init__(self, command: str, remaining: int, message: str):
+        super().__init__(message)
+        self.command = command
+        self.remaining = remaining
@@ -0,0 +1,309 @@
+"""Export one guild's data to a compressed JSONL file and import it elsewhere.
+
+An export holds the guild's rows from every table in
+``migrations.GUILD_TABLES``, read in one read transaction (a consistent
+snapshot) and streamed to ``EXPORT_DIR/guild-<id>-YYYYmmdd-HHMMSS.jsonl.gz``
+``EXPORT_BATCH_SIZE`` rows at a time, so memory stays flat however big the
+guild is. Layout, one JSON value per line::
+
+    {"type": "header", "format": 1, "guild_id": ..., "schema_version": 7, "created": ...}
+    {"type": "table", "table": "permissions", "columns": ["guild_id", "admin_role", "mod_role"]}
+    {"type": "end", "table": "permissions", "rows": 0, "sha256": "..."}
+    {"type": "table", "table": "guild_config", "columns": ["guild_id", "prefix"]}
+    [123, "?"]                        <- one array per row
+    {"type": "end", "table": "guild_config", "rows": 1, "sha256": "..."}
+    ... (every table in GUILD_TABLES order) ...
+    {"type": "footer", "tables": 10, "rows": ..., "sha256": "..."}
+
+Each ``end`` line carries the SHA-256 of that table's row lines and the
+footer the hash of every row line in the file. Import checks them while it
+loads and rolls back on any mismatch or truncation.
+
+Import replaces the target guild's rows (all tables) in one
+``BEGIN IMMEDIATE`` transaction with ``executemany`` batches, optionally
+under another guild id. The file must come from the same schema version;
+export again from an up-to-date bot if it does not.
+
+From the shell::
+
+    python scripts/guild_export.py export 1234567890
+    python scripts/guild_export.py import exports/guild-1234567890-....jsonl.gz
+
+or with the owner ``export`` / ``import`` commands.
+"""
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+from typing import NamedTuple
+
+import cache
+import config
+import ledger
+import migrations
+import ranks
+import sharding
+
+logger = logging.getLogger('bot')
+
+FORMAT = 1
+
+_lock = asyncio.Lock()
+
+
+class ExportError(Exception):
+    """The file is not a usable export (bad checksum, truncated, wrong schema)."""
+
+
+class TransferResult(NamedTuple):
+    guild_id: int
+    path: str
+    tables: dict      # table -> rows
+    rows: int
+    size: int         # compressed bytes
+    seconds: float
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    # autocommit mode: transactions below are explicit
+    conn = sqlite3.connect(path, timeout=config.DB_BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+    return conn
+
+
+def _columns(conn: sqlite3.Connection, table: str) -> list:
+    """Columns to transfer; a surrogate rowid key (ledger.id) is left to the target database."""
+    info = conn.execute(f"PRAGMA table_info({table})").fetchall()
+    pks = [row for row in info if row[5]]
+    skip = None
+    if len(pks) == 1 and pks[0][2].upper() == 'INTEGER' and pks[0][1] != 'guild_id':
+        skip = pks[0][1]
+    return [row[1] for row in info if row[1] != skip]
+
+
+def _line(value) -> bytes:
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False).encode('utf-8') + b'\n'
+
+
+def export_file(guild_id: int, path: str, db_path: str | None = None) -> TransferResult:
+    """Write guild_id's rows to path (gzip JSONL). Blocking; run it off the event loop."""
+    started = time.monotonic()
+    db_path = db_path or sharding.path_for(guild_id)
+    conn = _connect(db_path)
+    tables = {}
+    total = hashlib.sha256()
+    try:
+        migrations.migrate(conn)
+        with gzip.open(path + '.tmp', 'wb', compresslevel=config.BACKUP_GZIP_LEVEL) as out:
+            # one read transaction: every table comes from the same snapshot
+            conn.execute("BEGIN")
+            try:
+                out.write(_line({'type': 'header', 'format': FORMAT, 'guild_id': guild_id,
+                                 'schema_version': migrations.current_version(conn), 'created': int(time.time())}))
+                for table in migrations.GUILD_TABLES:
+                    cols = _columns(conn, table)
+                    out.write(_line({'type': 'table', 'table': table, 'columns': cols}))
+                    digest = hashlib.sha256()
+                    n = 0
+                    cur = conn.execute(f"SELECT {', '.join(cols)} FROM {table} WHERE guild_id=?", (guild_id,))
+                    while True:
+                        batch = cur.fetchmany(config.EXPORT_BATCH_SIZE)
+                        if not batch:
+                            break
+                        for row in batch:
+                            line = _line(row)
+                            digest.update(line)
+                            total.update(line)
+                            out.write(line)
+                        n += len(batch)
+                    out.write(_line({'type': 'end', 'table': table, 'rows': n, 'sha256': digest.hexdigest()}))
+                    tables[table] = n
+            finally:
+                conn.execute("COMMIT")
+            out.write(_line({'type': 'footer', 'tables': len(tables), 'rows': sum(tables.values()),
+                             'sha256': total.hexdigest()}))
+        os.replace(path + '.tmp', path)
+    except BaseException:
+        if os.path.exists(path + '.tmp'):
+            os.remove(path + '.tmp')
+        raise
+    finally:
+        conn.close()
+    return TransferResult(guild_id, path, tables, sum(tables.values()), os.path.getsize(path),
+                          time.monotonic() - started)
+
+
+def _records(path: str):
+    """Yield (raw line, decoded value) from an export file."""
+    with gzip.open(path, 'rb') as f:
+        try:
+            for raw in f:
+                try:
+                    yield raw, json.loads(raw)
+                except ValueError:
+                    raise ExportError(f'invalid line: {raw[:80]!r}') from None
+        except (OSError, EOFError) as e:
+            # bad gzip data or a file cut short
+            raise ExportError(f'unreadable export: {e}') from None
+
+
+def _expect(record, kind: str) -> dict:
+    if not isinstance(record, dict) or record.get('type') != kind:
+        raise ExportError(f'expected a {kind} line, got {str(record)[:80]}')
+    return record
+
+
+def import_file(path: str, guild_id: int | None = None, db_path: str | None = None) -> TransferResult:
+    """Replace a guild's rows with the contents of an export. Blocking.
+
+    guild_id defaults to the guild the file was exported from. Nothing is
+    written unless every checksum matches.
+    """
+    started = time.monotonic()
+    records = _records(path)
+    try:
+        raw, header = next(records)
+    except StopIteration:
+        raise ExportError('empty file') from None
+    _expect(header, 'header')
+    if header.get('format') != FORMAT:
+        raise ExportError(f"unsupported export format {header.get('format')}")
+    source_guild = header['guild_id']
+    guild_id = source_guild if guild_id is None else guild_id
+    db_path = db_path or sharding.path_for(guild_id)
+
+    conn = _connect(db_path)
+    tables = {}
+    total = hashlib.sha256()
+    try:
+        migrations.migrate(conn)
+        version = migrations.current_version(conn)
+        if header.get('schema_version') != version:
+            raise ExportError(f"export is schema version {header.get('schema_version')}, "
+                              f"this database is {version}; export again from an up-to-date bot")
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for table in migrations.GUILD_TABLES:
+                conn.execute(f"DELETE FROM {table} WHERE guild_id=?", (guild_id,))
+            for raw, record in records:
+                if isinstance(record, dict) and record.get('type') == 'footer':
+                    break
+                start = _expect(record, 'table')
+                table, cols = start['table'], start['columns']
+                if table not in migrations.GUILD_TABLES:
+                    raise ExportError(f'unknown table {table!r}')
+                unknown = set(cols) - set(_columns(conn, table))
+                if unknown:
+                    raise ExportError(f"{table}: unknown columns {', '.join(sorted(unknown))}")
+                gi = cols.index('guild_id')
+                sql = f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})"
+                digest = hashlib.sha256()
+                n = 0
+                batch = []
+                for raw, record in records:
+                    if isinstance(record, dict):
+                        break
+                    digest.update(raw)
+                    total.update(raw)
+                    record[gi] = guild_id
+                    batch.append(record)
+                    if len(batch) >= config.EXPORT_BATCH_SIZE:
+                        conn.executemany(sql, batch)
+                        n += len(batch)
+                        batch.clear()
+                else:
+                    raise ExportError(f'{table}: file ends mid-table')
+                if batch:
+                    conn.executemany(sql, batch)
+                    n += len(batch)
+                end = _expect(record, 'end')
+                if end.get('table') != table or end.get('rows') != n or end.get('sha256') != digest.hexdigest():
+                    raise ExportError(f'{table}: checksum or row count mismatch')
+                tables[table] = n
+            else:
+                raise ExportError('file ends before the footer')
+            footer = record
+            if footer.get('rows') != sum(tables.values()) or footer.get('sha256') != total.hexdigest():
+                raise ExportError('footer checksum or row count mismatch')
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        records.close()
+        conn.close()
+    return TransferResult(guild_id, path, tables, sum(tables.values()), os.path.getsize(path),
+                          time.monotonic() - started)
+
+
+def read_header(path: str) -> dict:
+    """The header line of an export (guild_id, schema_version, ...)."""
+    records = _records(path)
+    try:
+        raw, header = next(records)
+    except StopIteration:
+        raise ExportError('empty file') from None
+    finally:
+        records.close()
+    return _expect(header, 'header')
+
+
+def export_path(guild_id: int, directory: str | None = None) -> str:
+    directory = directory or config.EXPORT_DIR
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"guild-{guild_id}-{time.strftime('%Y%m%d-%H%M%S')}.jsonl.gz")
+
+
+async def export_guild(guild_id: int, directory: str | None = None) -> TransferResult:
+    """Export a guild from async code (SQLite backend only)."""
+    if config.STORAGE_BACKEND.lower() != 'sqlite':
+        raise ExportError('export needs STORAGE_BACKEND=sqlite')
+    from database_async import run_db
+    from storage import backend
+    async with _lock:
+        # commit writes held back by group commit / the ledger buffer first
+        await ledger.flush()
+        await run_db(backend.flush)
+        result = await asyncio.to_thread(export_file, guild_id, export_path(guild_id, directory))
+    logger.info(f'[export] guild {guild_id} -> {result.path} ({result.rows} rows, {result.size} bytes, '
+                f'{result.seconds:.1f}s)')
+    return result
+
+
+def _import_on_db_thread(path, guild_id):
+    from storage import backend
+    # nothing else writes while the import runs, and the DB thread's own
+    # connection holds no open transaction that would block it
+    backend.flush()
+    try:
+        return import_file(path, guild_id)
+    finally:
+        # rows changed under the caches either way
+        cache.clear_all()
+        ranks.clear()
+
+
+async def import_guild(path: str, guild_id: int | None = None) -> TransferResult:
+    """Import an export from async code, on the DB thread (SQLite backend only)."""
+    if config.STORAGE_BACKEND.lower() != 'sqlite':
+        raise ExportError('import needs STORAGE_BACKEND=sqlite')
+    import cooldowns
+    from database_async import run_db
+    target = read_header(path)['guild_id'] if guild_id is None else guild_id
+    async with _lock:
+        await ledger.flush()
+        # the import replaces the guild's cooldowns rows: write pending
+        # cooldowns first (kept if the import rolls back), then drop the guild
+        # so nothing stale is flushed over the imported rows afterwards
+        await cooldowns.flush()
+        cooldowns.forget_guild(target)
+        try:
+            result = await run_db(_import_on_db_thread, path, guild_id)
+        finally:
+            # imported rows on success, the untouched ones after a rollback
+            await cooldowns.reload_guild(target)
+    logger.info(f'[import] {path} -> guild {result.guild_id} ({result.rows} rows, {result.seconds:.1f}s)')
+    return result
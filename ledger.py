@@ -0,0 +1,153 @@
+"""Append-only ledger of XP, gold and item changes.
+
+Every balance change made through the storage helpers (``add_user_xp``,
+``spend_gold``, ``add_items_bulk``, ...) records one row: who, what (``kind``
+``'xp'``, ``'gold'`` or ``'item'`` plus the item name), the signed delta, a
+reason and a timestamp. Rows are buffered in memory and written in one batch
+every ``LEDGER_FLUSH_SECONDS`` and on shutdown, so recording costs a list
+append on the command path.
+
+The reason is the running command's name, set by ``main.py`` before each
+command; the context variable follows the work onto the DB thread through
+``database_async.run_db``. Background jobs name themselves with::
+
+    with ledger.reason('event_reward'):
+        ...
+
+Entries recorded inside a transaction that rolls back are dropped with it.
+Query with ``get_ledger_history`` / ``get_ledger_summary`` (after
+:func:`flush` if the last seconds matter).
+"""
+import asyncio
+import contextlib
+import contextvars
+import logging
+import threading
+import time
+
+import config
+
+logger = logging.getLogger('bot')
+
+KINDS = ('xp', 'gold', 'item')
+
+_reason = contextvars.ContextVar('ledger_reason', default=None)
+
+_buffer = []      # (guild_id, user_id, kind, item, delta, reason, ts)
+_base_seq = 0     # sequence number of _buffer[0]
+_lock = threading.Lock()
+_flush_task = None
+
+
+def enabled() -> bool:
+    return config.LEDGER_ENABLED
+
+
+def set_reason(value: str | None):
+    """Set the reason for entries recorded in the current context. Returns a reset token."""
+    return _reason.set(value)
+
+
+@contextlib.contextmanager
+def reason(value: str):
+    token = _reason.set(value)
+    try:
+        yield
+    finally:
+        _reason.reset(token)
+
+
+def record(guild_id, user_id, kind: str, delta: int, item: str = ''):
+    """Buffer one change. Zero deltas are skipped."""
+    if not delta or not config.LEDGER_ENABLED:
+        return
+    row = (guild_id, user_id, kind, item or '', int(delta), _reason.get() or 'system', int(time.time()))
+    with _lock:
+        _buffer.append(row)
+
+
+def position() -> int:
+    """Sequence number the next entry will get (see discard_since)."""
+    with _lock:
+        return _base_seq + len(_buffer)
+
+
+def discard_since(seq: int):
+    """Drop entries recorded at or after seq (a rolled-back transaction)."""
+    with _lock:
+        del _buffer[max(seq - _base_seq, 0):]
+
+
+def pending() -> int:
+    return len(_buffer)
+
+
+def drain() -> list:
+    """Take every buffered entry, oldest first."""
+    global _base_seq
+    with _lock:
+        rows = _buffer[:]
+        _base_seq += len(rows)
+        _buffer.clear()
+    return rows
+
+
+def requeue(rows: list):
+    """Put drained entries back after a failed write."""
+    global _base_seq
+    with _lock:
+        _buffer[:0] = rows
+        _base_seq -= len(rows)
+
+
+def _write_pending() -> int:
+    # runs on the DB thread, so it never splits a transaction's entries
+    from storage import backend
+    rows = drain()
+    if rows:
+        try:
+            backend.append_ledger(rows)
+        except Exception:
+            requeue(rows)
+            raise
+    return len(rows)
+
+
+async def flush() -> int:
+    """Write buffered entries in one batch. Returns how many were written."""
+    if not _buffer:
+        return 0
+    from database_async import run_db
+    return await run_db(_write_pending)
+
+
+async def _flusher():
+    interval = max(config.LEDGER_FLUSH_SECONDS, 1)
+    try:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await flush()
+            except Exception:
+                logger.exception('[ledger] flush failed')
+    except asyncio.CancelledError:
+        return
+
+
+def start():
+    """Start the periodic flush. Call once the event loop runs."""
+    global _flush_task
+    if _flush_task is None and config.LEDGER_ENABLED:
+        _flush_task = asyncio.get_running_loop().create_task(_flusher())
+
+
+async def shutdown():
+    """Stop the periodic flush and write whatever is still buffered."""
+    global _flush_task
+    if _flush_task is not None:
+        _flush_task.cancel()
+        _flush_task = None
+    try:
+        await flush()
+    except Exception:
+        logger.exception('[ledger] final flush failed')
@@ -5,7 +5,13 @@ import logging
 from discord.ext import commands
 from dotenv import load_dotenv
 from redis_client import is_bot_enabled
-from database import get_prefix_db
+import config
+import backup
+import cooldowns
+import database_async
+import ledger
+from errors import CooldownActive
+from database_async import get_prefix_db
 import io
 from PIL import Image, ImageDraw, ImageFont
 from utils.fonts import load_font
@@ -22,7 +28,7 @@ async def get_prefix(bot, message):
     # DM -> default prefix
     if not message.guild:
         return '!'
-    prefix = get_prefix_db(message.guild.id)
+    prefix = await get_prefix_db(message.guild.id)
     return prefix
 
 
@@ -68,8 +74,21 @@ async def maintenance_check(ctx):
 
     return await is_bot_enabled()
 
+@bot.before_invoke
+async def tag_ledger_reason(ctx):
+    # XP/gold/item changes made by this command are recorded under its name
+    ledger.set_reason(ctx.command.qualified_name if ctx.command else None)
+
 @bot.event
 async def on_command_error(ctx, error):
+    # cooldown rejections are CheckFailures too, but not maintenance
+    if isinstance(error, CooldownActive):
+        await ctx.reply(str(error))
+        return
+    if isinstance(error, (commands.CheckFailure, commands.UserInputError)):
+        # the command body never ran; give back a cooldown its check started
+        cooldowns.release(ctx)
+
     if isinstance(error, commands.CheckFailure):
         # Jika maintenance aktif, kirim PNG bertuliskan 'Bot sedang maintenance' menggunakan font Undertale
         try:
@@ -207,9 +226,22 @@ async def load_cogs():
             await bot.load_extension(f"cogs.{file[:-3]}")
 
 async def main():
-    async with bot:
-        await load_cogs()
-        await bot.start(TOKEN)
+    try:
+        async with bot:
+            database_async.start()
+            cooldowns.start()
+            ledger.start()
+            backup.start()
+            if config.DB_CHECK_QUERY_PLANS:
+                await database_async.check_query_plans()
+            await load_cogs()
+            await bot.start(TOKEN)
+    finally:
+        # let queued DB writes finish before the process exits
+        backup.shutdown()
+        await cooldowns.shutdown()
+        await ledger.shutdown()
+        await database_async.shutdown()
 
 if os.environ.get('PORT'):
     # For Replit, run Flask on the provided port
@@ -0,0 +1,375 @@
+"""Versioned schema migrations for bot.db.
+
+The schema version lives in SQLite's ``PRAGMA user_version``. On startup
+:func:`migrate` reads it once; when the database is already current that single
+PRAGMA is the whole cost. Otherwise every pending migration runs, in order,
+inside one ``BEGIN IMMEDIATE`` transaction together with the version bump, so a
+failure leaves the database exactly as it was.
+
+To change the schema, append a new ``(version, description, function)`` entry
+to ``MIGRATIONS``. Never edit a migration that has already shipped.
+
+Plan without applying anything::
+
+    python scripts/migrate_db.py --dry-run
+"""
+import logging
+import sqlite3
+
+from models import slugify
+
+logger = logging.getLogger('bot')
+
+
+def _columns(conn: sqlite3.Connection, table: str) -> set:
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def _add_missing_columns(conn: sqlite3.Connection, table: str, required: dict):
+    existing = _columns(conn, table)
+    for col, col_def in required.items():
+        if col not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {col} {col_def}")
+
+
+def _m001_baseline(conn: sqlite3.Connection):
+    """Create every table the bot had before versioning existed.
+
+    Databases created by the old import-time setup may be missing columns that
+    were bolted on later with ALTER TABLE, so those are added when absent.
+    """
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS permissions (
+        guild_id INTEGER PRIMARY KEY,
+        admin_role TEXT,
+        mod_role TEXT
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS guild_config (
+        guild_id INTEGER PRIMARY KEY,
+        prefix TEXT DEFAULT '!'
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS user_xp (
+        guild_id INTEGER,
+        user_id INTEGER,
+        xp INTEGER DEFAULT 0,
+        PRIMARY KEY (guild_id, user_id)
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS shop_items (
+        guild_id INTEGER,
+        item_name TEXT,
+        price INTEGER,
+        description TEXT,
+        atk INTEGER DEFAULT 0,
+        def INTEGER DEFAULT 0,
+        slot TEXT DEFAULT 'none',
+        PRIMARY KEY (guild_id, item_name)
+    )
+    """)
+    _add_missing_columns(conn, 'shop_items', {
+        'atk': 'INTEGER DEFAULT 0',
+        'def': 'INTEGER DEFAULT 0',
+        'slot': "TEXT DEFAULT 'none'",
+    })
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS user_profile (
+        guild_id INTEGER,
+        user_id INTEGER,
+        max_hp INTEGER DEFAULT 100,
+        hp INTEGER DEFAULT 100,
+        atk INTEGER DEFAULT 10,
+        def INTEGER DEFAULT 5,
+        gold INTEGER DEFAULT 0,
+        onboarded INTEGER DEFAULT 0,
+        selected_badge TEXT DEFAULT NULL,
+        wins INTEGER DEFAULT 0,
+        PRIMARY KEY (guild_id, user_id)
+    )
+    """)
+    _add_missing_columns(conn, 'user_profile', {
+        'onboarded': 'INTEGER DEFAULT 0',
+        'selected_badge': 'TEXT DEFAULT NULL',
+        'wins': 'INTEGER DEFAULT 0',
+    })
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS inventory (
+        guild_id INTEGER,
+        user_id INTEGER,
+        item_name TEXT,
+        qty INTEGER DEFAULT 1,
+        equipped INTEGER DEFAULT 0,
+        slot TEXT DEFAULT 'none',
+        PRIMARY KEY (guild_id, user_id, item_name)
+    )
+    """)
+    _add_missing_columns(conn, 'inventory', {
+        'equipped': 'INTEGER DEFAULT 0',
+        'slot': "TEXT DEFAULT 'none'",
+    })
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS cooldowns (
+        guild_id INTEGER,
+        user_id INTEGER,
+        command TEXT,
+        last_used INTEGER,
+        PRIMARY KEY (guild_id, user_id, command)
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS daily_quests (
+        guild_id INTEGER,
+        user_id INTEGER,
+        date TEXT,
+        quest_key TEXT,
+        progress INTEGER DEFAULT 0,
+        target INTEGER DEFAULT 1,
+        completed INTEGER DEFAULT 0,
+        reward_gold INTEGER DEFAULT 0,
+        reward_xp INTEGER DEFAULT 0,
+        reward_item TEXT,
+        created_ts INTEGER DEFAULT 0,
+        PRIMARY KEY (guild_id, user_id, date)
+    )
+    """)
+    _add_missing_columns(conn, 'daily_quests', {
+        'created_ts': 'INTEGER DEFAULT 0',
+    })
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS buffs (
+        guild_id INTEGER,
+        user_id INTEGER,
+        buff_key TEXT,
+        stat TEXT,
+        amount INTEGER,
+        expires_ts INTEGER,
+        PRIMARY KEY (guild_id, user_id, buff_key)
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS achievements (
+        guild_id INTEGER,
+        user_id INTEGER,
+        badge_key TEXT,
+        earned_ts INTEGER,
+        PRIMARY KEY (guild_id, user_id, badge_key)
+    )
+    """)
+
+
+def _m002_hot_query_indexes(conn: sqlite3.Connection):
+    """Indexes backing the queries registered in database.HOT_QUERIES."""
+    # leaderboard: WHERE guild_id=? ORDER BY xp DESC, covering user_id too
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_user_xp_guild_xp ON user_xp(guild_id, xp DESC, user_id)")
+    # expired-buff cleanup filters on expires_ts alone
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_buffs_expires ON buffs(expires_ts)")
+    # equipped items are a handful of rows out of the whole inventory
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_inventory_equipped ON inventory(guild_id, user_id, item_name, qty, slot)"
+        " WHERE equipped=1"
+    )
+
+
+def _m003_retention_indexes(conn: sqlite3.Connection):
+    """Indexes for the housekeeping purges (old quest dates, stale cooldowns)."""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_daily_quests_date ON daily_quests(date)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_cooldowns_last_used ON cooldowns(last_used)")
+
+
+def _m004_ledger(conn: sqlite3.Connection):
+    """Append-only record of XP, gold and item changes (see ledger.py)."""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS ledger (
+        id INTEGER PRIMARY KEY,
+        guild_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        kind TEXT NOT NULL,
+        item TEXT NOT NULL DEFAULT '',
+        delta INTEGER NOT NULL,
+        reason TEXT NOT NULL,
+        ts INTEGER NOT NULL
+    )
+    """)
+    # per-user history, newest first
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_ledger_user ON ledger(guild_id, user_id, ts)")
+    # per-guild flow over a time window
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_ledger_guild_ts ON ledger(guild_id, ts)")
+
+
+def _m005_item_slugs(conn: sqlite3.Connection):
+    """slug columns so item names resolve with one index lookup (models.slugify)."""
+    conn.create_function('slugify', 1, slugify, deterministic=True)
+    for table, index, cols in (
+        ('shop_items', 'idx_shop_items_slug', 'guild_id, slug, item_name'),
+        ('inventory', 'idx_inventory_slug', 'guild_id, user_id, slug, item_name'),
+    ):
+        _add_missing_columns(conn, table, {'slug': 'TEXT'})
+        conn.execute(f"UPDATE {table} SET slug=slugify(item_name) WHERE item_name IS NOT NULL")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {index} ON {table}({cols})")
+
+
+def _m006_equipment_bonus(conn: sqlite3.Connection):
+    """Materialized equipment bonuses: per-item stats on inventory, totals on user_profile.
+
+    Equipping used to add the item's stats to user_profile.atk/def; those
+    bonuses move to equip_atk/equip_def, leaving atk/def as base stats.
+    Bonuses of equipped items no longer in the shop cannot be told apart and
+    stay in the base stats.
+    """
+    _add_missing_columns(conn, 'inventory', {'atk': 'INTEGER DEFAULT 0', 'def': 'INTEGER DEFAULT 0'})
+    _add_missing_columns(conn, 'user_profile', {'equip_atk': 'INTEGER DEFAULT 0', 'equip_def': 'INTEGER DEFAULT 0'})
+    conn.execute("""
+    UPDATE inventory SET (atk, def) = (
+        SELECT COALESCE(s.atk, 0), COALESCE(s.def, 0) FROM shop_items s
+        WHERE s.guild_id=inventory.guild_id AND s.item_name=inventory.item_name
+    )
+    WHERE EXISTS (SELECT 1 FROM shop_items s WHERE s.guild_id=inventory.guild_id AND s.item_name=inventory.item_name)
+    """)
+    conn.execute("""
+    UPDATE user_profile SET (equip_atk, equip_def) = (
+        SELECT COALESCE(SUM(i.atk), 0), COALESCE(SUM(i.def), 0) FROM inventory i
+        WHERE i.guild_id=user_profile.guild_id AND i.user_id=user_profile.user_id AND i.equipped=1
+    )
+    """)
+    conn.execute(
+        "UPDATE user_profile SET atk=MAX(atk-equip_atk, 0), def=MAX(def-equip_def, 0)"
+        " WHERE equip_atk<>0 OR equip_def<>0"
+    )
+    # the equipped-items index now also covers the bonus refresh
+    conn.execute("DROP INDEX IF EXISTS idx_inventory_equipped")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_inventory_equipped ON inventory(guild_id, user_id, item_name, qty, slot, atk, def)"
+        " WHERE equipped=1"
+    )
+    # shop stat changes find every copy of the item
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_inventory_item ON inventory(guild_id, item_name)")
+
+
+def _m007_players(conn: sqlite3.Connection):
+    """Merge user_xp and user_profile into one WITHOUT ROWID players table.
+
+    xp stays NULL for players who never had an XP row, so they keep out of
+    leaderboards and XP statistics as before. Read-only views under the old
+    names keep ad-hoc SQL working; writes must go to players.
+    """
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS players (
+        guild_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        xp INTEGER,
+        max_hp INTEGER DEFAULT 100,
+        hp INTEGER DEFAULT 100,
+        atk INTEGER DEFAULT 10,
+        def INTEGER DEFAULT 5,
+        gold INTEGER DEFAULT 0,
+        equip_atk INTEGER DEFAULT 0,
+        equip_def INTEGER DEFAULT 0,
+        wins INTEGER DEFAULT 0,
+        onboarded INTEGER DEFAULT 0,
+        selected_badge TEXT DEFAULT NULL,
+        PRIMARY KEY (guild_id, user_id)
+    ) WITHOUT ROWID
+    """)
+    conn.execute("""
+    INSERT INTO players(guild_id, user_id, xp, max_hp, hp, atk, def, gold, equip_atk, equip_def,
+                        wins, onboarded, selected_badge)
+    SELECT p.guild_id, p.user_id, x.xp, p.max_hp, p.hp, p.atk, p.def, p.gold, p.equip_atk, p.equip_def,
+           p.wins, p.onboarded, p.selected_badge
+    FROM user_profile p LEFT JOIN user_xp x ON x.guild_id=p.guild_id AND x.user_id=p.user_id
+    WHERE p.guild_id IS NOT NULL AND p.user_id IS NOT NULL
+    """)
+    # XP without a profile: the profile columns take their defaults
+    conn.execute("""
+    INSERT INTO players(guild_id, user_id, xp)
+    SELECT x.guild_id, x.user_id, x.xp FROM user_xp x
+    WHERE x.guild_id IS NOT NULL AND x.user_id IS NOT NULL
+      AND NOT EXISTS (SELECT 1 FROM user_profile p WHERE p.guild_id=x.guild_id AND p.user_id=x.user_id)
+    """)
+    conn.execute("DROP TABLE user_xp")
+    conn.execute("DROP TABLE user_profile")
+    # leaderboard, ranks and XP statistics: players with XP, highest first
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_players_guild_xp ON players(guild_id, xp DESC, user_id) WHERE xp IS NOT NULL"
+    )
+    conn.execute("CREATE VIEW user_xp AS SELECT guild_id, user_id, xp FROM players WHERE xp IS NOT NULL")
+    conn.execute(
+        "CREATE VIEW user_profile AS SELECT guild_id, user_id, max_hp, hp, atk, def, gold, onboarded,"
+        " selected_badge, wins, equip_atk, equip_def FROM players"
+    )
+
+
+# Every table, all keyed by guild_id first. Tools that move whole guilds
+# between database files (scripts/shard_db.py) copy exactly these.
+GUILD_TABLES = (
+    'permissions',
+    'guild_config',
+    'players',
+    'shop_items',
+    'inventory',
+    'cooldowns',
+    'daily_quests',
+    'buffs',
+    'achievements',
+    'ledger',
+)
+
+# (version, description, function) — versions must be consecutive.
+MIGRATIONS = [
+    (1, 'baseline schema', _m001_baseline),
+    (2, 'indexes for leaderboard, buffs and equipped items', _m002_hot_query_indexes),
+    (3, 'indexes for quest and cooldown retention', _m003_retention_indexes),
+    (4, 'economy ledger', _m004_ledger),
+    (5, 'slug columns for item lookup', _m005_item_slugs),
+    (6, 'materialized equipment bonuses', _m006_equipment_bonus),
+    (7, 'players table replaces user_xp and user_profile', _m007_players),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def pending(conn: sqlite3.Connection) -> list:
+    """Return ``[(version, description), ...]`` for migrations not yet applied."""
+    version = current_version(conn)
+    return [(v, desc) for v, desc, _ in MIGRATIONS if v > version]
+
+
+def migrate(conn: sqlite3.Connection, dry_run: bool = False) -> list:
+    """Apply pending migrations in a single transaction.
+
+    Returns the list of ``(version, description)`` that were applied, or that
+    would be applied when ``dry_run`` is true.
+    """
+    if current_version(conn) >= LATEST_VERSION:
+        return []
+    if dry_run:
+        return pending(conn)
+
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # another process may have migrated while we waited for the lock
+        version = current_version(conn)
+        applied = []
+        for v, desc, func in MIGRATIONS:
+            if v <= version:
+                continue
+            func(conn)
+            applied.append((v, desc))
+        if applied:
+            conn.execute(f"PRAGMA user_version={int(applied[-1][0])}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    for v, desc in applied:
+        logger.info(f"[db] applied migration {v}: {desc}")
+    return applied
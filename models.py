@@ -0,0 +1,84 @@
+"""Value types returned by the storage helpers (database.py and storage/).
+
+They are plain NamedTuples so every backend returns exactly the same shapes.
+"""
+import math
+import re
+from typing import NamedTuple
+
+
+class GuildConfig(NamedTuple):
+    """Per-guild settings, loaded once and cached (see database.get_guild_config)."""
+    guild_id: int
+    prefix: str = '!'
+    admin_role: str | None = None
+    mod_role: str | None = None
+
+
+def slugify(name: str) -> str:
+    """Lookup key for item names: lowercase, runs of other characters -> '_'.
+
+    "Sword of Light", "sword of light" and "sword_of_light" all give
+    "sword_of_light". Stored in the slug columns of shop_items/inventory.
+    """
+    return re.sub(r"[^a-z0-9]+", "_", name.lower()).strip("_")
+
+
+XP_PERCENTILES = (25, 50, 75, 90, 99)
+
+
+class XpStats(NamedTuple):
+    """XP distribution of one guild (see database.get_xp_stats)."""
+    count: int
+    total: int
+    avg: float
+    min: int
+    max: int
+    percentiles: dict  # {p: xp} by nearest rank, e.g. {50: median}
+
+
+def percentile_rank(p: float, count: int) -> int:
+    """1-based ascending position of the p-th percentile (nearest-rank method)."""
+    return min(max(math.ceil(p / 100 * count), 1), count)
+
+
+class PlayerSnapshot(NamedTuple):
+    """Immutable, consistent view of one player's state (see database.get_player_snapshot)."""
+    guild_id: int
+    user_id: int
+    max_hp: int
+    hp: int
+    atk: int
+    defense: int
+    gold: int
+    equip_atk: int    # bonuses of equipped items, on top of atk/defense
+    equip_def: int
+    xp: int
+    wins: int
+    onboarded: bool
+    selected_badge: str | None
+    buffs: tuple      # (buff_key, stat, amount, expires_ts), active only
+    inventory: tuple  # (item_name, qty, equipped, slot)
+
+    @property
+    def equipment(self) -> tuple:
+        """Equipped items as (item_name, qty, slot), like get_equipped_items."""
+        return tuple((name, qty, slot) for name, qty, equipped, slot in self.inventory if equipped)
+
+    @property
+    def profile(self) -> dict:
+        """Same dict shape as get_profile."""
+        return {'max_hp': self.max_hp, 'hp': self.hp, 'atk': self.atk, 'def': self.defense, 'gold': self.gold,
+                'equip_atk': self.equip_atk, 'equip_def': self.equip_def}
+
+    def effective_profile(self) -> dict:
+        """Same dict shape as get_effective_profile (equipment and buffs applied to atk/def)."""
+        out = self.profile
+        out['atk'] += self.equip_atk
+        out['def'] += self.equip_def
+        for bk, stat, amount, exp in self.buffs:
+            if stat == 'atk':
+                out['atk'] += int(amount)
+            elif stat == 'def':
+                out['def'] += int(amount)
+        return out
@@ -0,0 +1,116 @@
+"""In-memory XP ranking per guild for ``!rank`` and ``!leaderboard``.
+
+Each guild that has been asked about keeps a sorted list of ``(-xp, user_id)``
+keys plus a ``user_id -> xp`` dict. A user's rank is a binary search (the
+number of users with strictly more XP, plus one, so ties share a rank) and a
+leaderboard page is a slice; neither touches the ``players`` table.
+
+A guild is loaded on the DB thread, from ``get_xp_rows``, the first time it is
+asked about; after that the XP writers in the storage backends call
+:func:`update`, so the ranking follows every change without re-reading. Writes
+for guilds that are not loaded are ignored. At most ``RANKS_MAX_GUILDS``
+guilds are held (a :class:`cache.LRUCache`): the least recently queried is
+dropped and reloads on its next lookup. A rolled-back transaction calls
+:func:`clear` (like ``cache.clear_all``) and the next lookup reloads.
+
+Use the async helpers in ``database_async`` (``get_rank``, ``get_rank_page``)
+from cogs; they load the guild on first use.
+"""
+import bisect
+import threading
+from typing import NamedTuple
+
+import cache
+import config
+
+
+class Rank(NamedTuple):
+    rank: int      # 1-based, ties share a rank
+    xp: int
+    total: int     # ranked users in the guild
+
+
+class GuildRanks:
+    """Order-statistics list for one guild.
+
+    Lookups are O(log n). Updates are a binary search plus a list
+    insert/delete (a memmove, microseconds even for 100k users).
+    """
+
+    def __init__(self, rows=()):
+        self._xp = {}
+        for user_id, xp in rows:
+            self._xp[user_id] = int(xp)
+        self._keys = sorted((-xp, uid) for uid, xp in self._xp.items())
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def update(self, user_id, xp: int):
+        xp = int(xp)
+        with self._lock:
+            old = self._xp.get(user_id)
+            if old == xp:
+                return
+            if old is not None:
+                i = bisect.bisect_left(self._keys, (-old, user_id))
+                del self._keys[i]
+            self._xp[user_id] = xp
+            bisect.insort(self._keys, (-xp, user_id))
+
+    def rank(self, user_id):
+        """:class:`Rank` for user_id, or None if they have no XP row."""
+        with self._lock:
+            xp = self._xp.get(user_id)
+            if xp is None:
+                return None
+            # (-xp,) sorts before every (-xp, uid): counts users with more XP
+            return Rank(bisect.bisect_left(self._keys, (-xp,)) + 1, xp, len(self._keys))
+
+    def page(self, page: int = 1, per_page: int = 10) -> list:
+        """[(rank, user_id, xp), ...] for a 1-based page, highest XP first."""
+        start = max(page - 1, 0) * per_page
+        with self._lock:
+            chunk = self._keys[start:start + per_page]
+            out = []
+            for neg_xp, uid in chunk:
+                out.append((bisect.bisect_left(self._keys, (neg_xp,)) + 1, uid, -neg_xp))
+            return out
+
+    def top(self, n: int = 10) -> list:
+        return self.page(1, n)
+
+
+# guild_id -> GuildRanks. No TTL: update() keeps every held list current.
+_guilds = cache.LRUCache('ranks', config.RANKS_MAX_GUILDS)
+
+
+def get(guild_id):
+    """The guild's ranking, or None if it has not been loaded (or was evicted)."""
+    return _guilds.get(guild_id, None)
+
+
+def load(guild_id, rows) -> GuildRanks:
+    """Build the guild's ranking from [(user_id, xp), ...]. Call on the DB thread."""
+    ranks = GuildRanks(rows)
+    _guilds.put(guild_id, ranks)
+    return ranks
+
+
+def update(guild_id, user_id, xp: int):
+    """Record a new XP total. Called by the storage backends after every XP write."""
+    # a write is not a query: it neither counts as a hit nor keeps the guild held
+    ranks = _guilds.peek(guild_id)
+    if ranks is not None:
+        ranks.update(user_id, xp)
+
+
+def clear():
+    """Forget every guild; each reloads on its next lookup."""
+    _guilds.clear()
+
+
+def stats() -> dict:
+    """Hit/miss/eviction counters of the held guilds (see cache.LRUCache.stats)."""
+    return _guilds.stats()
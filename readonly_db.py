@@ -0,0 +1,71 @@
+"""Read-only access to the bot's database files.
+
+Unlike :mod:`database`, importing this module opens nothing, runs no
+migrations and never creates a file: connections use ``mode=ro`` plus
+``PRAGMA query_only`` and fail if the file does not exist. ``database``
+opens its analytics connections (``get_read_conn``) through :func:`connect`;
+processes that only read, such as the dashboard, use this module directly
+so they never take the write lock from the bot or migrate its files.
+"""
+import os
+import pathlib
+import sqlite3
+
+import config
+import sharding
+from models import XP_PERCENTILES, XpStats, percentile_rank
+
+
+def connect(path: str, factory=sqlite3.Connection) -> sqlite3.Connection:
+    """Open an existing database file read-only. FileNotFoundError if it is missing."""
+    if not os.path.isfile(path):
+        raise FileNotFoundError(path)
+    # mode=ro opens an existing file only; query_only also refuses writes
+    # through ATTACH or a future helper that forgets which connection it has
+    uri = pathlib.Path(path).resolve().as_uri() + '?mode=ro'
+    conn = sqlite3.connect(uri, uri=True, timeout=config.DB_BUSY_TIMEOUT_MS / 1000,
+                           check_same_thread=False, factory=factory)
+    conn.execute("PRAGMA query_only=1")
+    conn.execute(f"PRAGMA cache_size=-{int(config.DB_CACHE_SIZE_KB)}")
+    conn.execute(f"PRAGMA mmap_size={int(config.DB_MMAP_SIZE)}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+
+def connect_guild(guild_id) -> sqlite3.Connection:
+    """Read-only connection to the file holding guild_id (see sharding.path_for)."""
+    return connect(sharding.path_for(guild_id))
+
+
+def xp_stats(conn: sqlite3.Connection, guild_id, percentiles=XP_PERCENTILES) -> XpStats:
+    """Count, sum, average, min, max and percentiles of the guild's XP.
+
+    Aggregated in SQL over the covering (guild_id, xp) index, so memory use
+    does not grow with the guild. Each percentile is an ``OFFSET`` read, which
+    still steps through that many index entries: a full stats call walks the
+    guild's index a few times over, without touching table rows.
+    """
+    count, total, lo, hi = conn.execute(
+        "SELECT COUNT(*), COALESCE(SUM(xp), 0), MIN(xp), MAX(xp) FROM players WHERE guild_id=? AND xp IS NOT NULL",
+        (guild_id,)
+    ).fetchone()
+    if not count:
+        return XpStats(0, 0, 0.0, 0, 0, {})
+    pct = {}
+    for p in percentiles:
+        # the index is ordered by xp DESC: ascending position r is offset count - r
+        offset = count - percentile_rank(p, count)
+        pct[p] = conn.execute(
+            "SELECT xp FROM players WHERE guild_id=? AND xp IS NOT NULL ORDER BY xp DESC LIMIT 1 OFFSET ?",
+            (guild_id, offset)
+        ).fetchone()[0]
+    return XpStats(count, total, total / count, lo, hi, pct)
+
+
+def xp_histogram(conn: sqlite3.Connection, guild_id, bucket_size=100) -> list:
+    """[(bucket_start, users), ...] ascending; the default bucket is one level (100 XP)."""
+    cur = conn.execute(
+        "SELECT xp / ? AS b, COUNT(*) FROM players WHERE guild_id=? AND xp IS NOT NULL GROUP BY b ORDER BY b",
+        (bucket_size, guild_id)
+    )
+    return [(b * bucket_size, n) for b, n in cur.fetchall()]
@@ -0,0 +1,42 @@
+"""Take an online backup of the bot database (safe while the bot is running).
+
+Every database file in use (``bot.db`` or each shard) is copied with the
+SQLite backup API, integrity-checked, gzip-compressed into the backup
+directory and rotated (see backup.py and the BACKUP_* settings).
+
+Usage:
+    python scripts/backup_db.py                  # -> backups/bot-YYYYmmdd-HHMMSS.db.gz
+    python scripts/backup_db.py --dir /mnt/snap  # another directory
+"""
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import backup  # noqa: E402
+import config  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dir', default=config.BACKUP_DIR, help='backup directory (default: BACKUP_DIR / backups)')
+    args = parser.parse_args()
+
+    results = backup.backup_all(args.dir)
+    if not results:
+        print('No database files found.')
+        return
+    failed = False
+    for r in results:
+        if r.path:
+            print(f'  {r.source} -> {r.path} ({r.pages} pages, {r.size} bytes, {r.restarts} restarts, {r.seconds:.1f}s)')
+        else:
+            failed = True
+            print(f'  {r.source}: integrity check FAILED: {r.integrity}')
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
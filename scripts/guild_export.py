@@ -0,0 +1,60 @@
+"""Export one guild's data to gzip JSONL, or import such a file.
+
+Exports are consistent snapshots and are safe while the bot is running.
+Import replaces the guild's rows in one transaction after checking every
+checksum; stop the bot first (or use the owner ``import`` command) so its
+caches do not keep serving the old rows. See guild_export.py for the format.
+
+Usage:
+    python scripts/guild_export.py export 1234567890                 # -> exports/guild-1234567890-....jsonl.gz
+    python scripts/guild_export.py export 1234567890 --out g.jsonl.gz
+    python scripts/guild_export.py import g.jsonl.gz                 # same guild id as exported
+    python scripts/guild_export.py import g.jsonl.gz --guild 42      # load under another guild
+"""
+import argparse
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import config  # noqa: E402
+import guild_export  # noqa: E402
+
+
+def _report(verb: str, result):
+    for table, n in result.tables.items():
+        print(f'  {table}: {n} rows')
+    print(f'{verb} {result.rows} rows for guild {result.guild_id} ({result.path}, {result.size} bytes, '
+          f'{result.seconds:.1f}s)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest='command', required=True)
+    exp = sub.add_parser('export', help='write one guild to a .jsonl.gz file')
+    exp.add_argument('guild_id', type=int)
+    exp.add_argument('--out', help='output file (default: EXPORT_DIR/guild-<id>-<time>.jsonl.gz)')
+    exp.add_argument('--db', help='database file (default: the shard holding the guild)')
+    imp = sub.add_parser('import', help='replace a guild with the contents of an export')
+    imp.add_argument('path')
+    imp.add_argument('--guild', type=int, help='target guild id (default: the exported guild)')
+    imp.add_argument('--db', help='database file (default: the shard holding the guild)')
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        out = args.out or guild_export.export_path(args.guild_id, config.EXPORT_DIR)
+        _report('Exported', guild_export.export_file(args.guild_id, out, args.db))
+        return
+    if not os.path.isfile(args.path):
+        parser.error(f'{args.path} does not exist')
+    try:
+        result = guild_export.import_file(args.path, args.guild, args.db)
+    except guild_export.ExportError as e:
+        print(f'Import failed, nothing was changed: {e}')
+        sys.exit(1)
+    _report('Imported', result)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""Apply (or preview) pending schema migrations for the bot database.
+
+Usage:
+    python scripts/migrate_db.py            # apply pending migrations
+    python scripts/migrate_db.py --dry-run  # only list what would run
+    python scripts/migrate_db.py --vacuum   # also switch to incremental auto-vacuum (stop the bot first)
+"""
+import argparse
+import sqlite3
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import config  # noqa: E402
+import migrations  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', default=config.DB_PATH, help='database file (default: DB_PATH / bot.db)')
+    parser.add_argument('--dry-run', action='store_true', help='show pending migrations without applying them')
+    parser.add_argument('--vacuum', action='store_true',
+                        help='rebuild the file with auto_vacuum=INCREMENTAL so housekeeping can shrink it')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    try:
+        version = migrations.current_version(conn)
+        steps = migrations.migrate(conn, dry_run=args.dry_run)
+        if args.vacuum and not args.dry_run:
+            # auto_vacuum only changes for an existing file after a full VACUUM
+            before = conn.execute("PRAGMA page_count").fetchone()[0]
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("VACUUM")
+            after = conn.execute("PRAGMA page_count").fetchone()[0]
+            print(f'{args.db}: vacuumed, {before} -> {after} pages, auto_vacuum=INCREMENTAL')
+    finally:
+        conn.close()
+
+    print(f'{args.db}: schema version {version}, latest {migrations.LATEST_VERSION}')
+    if not steps:
+        print('Nothing to do.')
+        return
+    verb = 'Would apply' if args.dry_run else 'Applied'
+    for v, desc in steps:
+        print(f'  {verb} {v}: {desc}')
+
+
+if __name__ == '__main__':
+    main()
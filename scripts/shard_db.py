@@ -0,0 +1,94 @@
+"""Split a single bot database into per-guild shard files.
+
+Each guild's rows are copied to shard ``guild_id % N`` under the shard
+directory; the source file is left untouched. Afterwards start the bot with
+``DB_SHARDS=N`` (and ``DB_SHARD_DIR`` if you changed it).
+
+Usage:
+    python scripts/shard_db.py --shards 8              # bot.db -> shards/shard_000.db ...
+    python scripts/shard_db.py --shards 8 --dry-run    # only print row counts per shard
+"""
+import argparse
+import os
+import sqlite3
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import config  # noqa: E402
+import migrations  # noqa: E402
+import sharding  # noqa: E402
+
+
+def _columns(conn: sqlite3.Connection, schema: str, table: str) -> list:
+    return [row[1] for row in conn.execute(f"PRAGMA {schema}.table_info({table})")]
+
+
+def split(src: str, shards: int, directory: str, dry_run: bool = False) -> dict:
+    """Copy every guild's rows from ``src`` into its shard. Returns {shard path: rows copied}."""
+    # bring the source up to the current schema so columns line up
+    conn = sqlite3.connect(src)
+    try:
+        if not dry_run:
+            migrations.migrate(conn)
+        counts = {}
+        for i in range(shards):
+            path = sharding.shard_path(i, directory)
+            counts[path] = sum(
+                conn.execute(f"SELECT COUNT(*) FROM {t} WHERE guild_id % ? = ?", (shards, i)).fetchone()[0]
+                for t in migrations.GUILD_TABLES
+            )
+    finally:
+        conn.close()
+    if dry_run:
+        return counts
+
+    os.makedirs(directory, exist_ok=True)
+    for i in range(shards):
+        path = sharding.shard_path(i, directory)
+        conn = sqlite3.connect(path)
+        try:
+            migrations.migrate(conn)
+            conn.execute("ATTACH DATABASE ? AS src", (src,))
+            conn.execute("BEGIN IMMEDIATE")
+            for table in migrations.GUILD_TABLES:
+                cols = ', '.join(c for c in _columns(conn, 'main', table) if c in _columns(conn, 'src', table))
+                conn.execute(
+                    f"INSERT OR REPLACE INTO main.{table} ({cols}) SELECT {cols} FROM src.{table} WHERE guild_id % ? = ?",
+                    (shards, i)
+                )
+            conn.commit()
+            conn.execute("DETACH DATABASE src")
+        finally:
+            conn.close()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--src', default=config.DB_PATH, help='database to split (default: DB_PATH / bot.db)')
+    parser.add_argument('--shards', type=int, required=True, help='number of shard files')
+    parser.add_argument('--dir', default=config.DB_SHARD_DIR, help='output directory (default: DB_SHARD_DIR / shards)')
+    parser.add_argument('--dry-run', action='store_true', help='print row counts per shard without writing')
+    parser.add_argument('--force', action='store_true', help='write into shard files that already exist')
+    args = parser.parse_args()
+
+    if args.shards < 1:
+        parser.error('--shards must be at least 1')
+    if not os.path.isfile(args.src):
+        parser.error(f'{args.src} does not exist')
+    existing = [p for p in (sharding.shard_path(i, args.dir) for i in range(args.shards)) if os.path.exists(p)]
+    if existing and not args.dry_run and not args.force:
+        parser.error(f'{existing[0]} already exists (use --force to merge into existing shards)')
+
+    counts = split(args.src, args.shards, args.dir, dry_run=args.dry_run)
+    verb = 'Would copy' if args.dry_run else 'Copied'
+    for path, n in counts.items():
+        print(f'  {verb} {n} rows -> {path}')
+    if not args.dry_run:
+        print(f'Done. Start the bot with DB_SHARDS={args.shards} DB_SHARD_DIR={args.dir}')
+
+
+if __name__ == '__main__':
+    main()
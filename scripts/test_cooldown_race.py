@@ -0,0 +1,79 @@
+"""Two concurrent invocations of a cooldown command must pay out exactly once.
+
+Runs the real cooldowns.check predicate against the in-memory storage
+backend: both invocations are started together, each awaits the DB between
+the check and the reward (as daily/adventure/claim do), and only one may get
+through.
+
+Usage:
+    python scripts/test_cooldown_race.py
+"""
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+os.environ['STORAGE_BACKEND'] = 'memory'
+
+import cooldowns  # noqa: E402
+import database_async  # noqa: E402
+from errors import CooldownActive  # noqa: E402
+
+GUILD, USER = 1, 42
+
+
+class FakeBot:
+    async def is_owner(self, user):
+        return False
+
+
+class FakeCtx:
+    def __init__(self):
+        self.bot = FakeBot()
+        self.guild = type('Guild', (), {'id': GUILD})()
+        self.author = type('Member', (), {'id': USER})()
+
+
+check = cooldowns.check('race_test', 3600, 'wait {minutes}m')
+
+
+async def invoke(payouts: list, fail: bool = False):
+    ctx = FakeCtx()
+    try:
+        await check.predicate(ctx)
+    except CooldownActive:
+        return
+    if fail:
+        # an early exit: the command gives the cooldown back
+        cooldowns.release(ctx)
+        return
+    # awaits between the check and the reward write, like the real commands
+    await database_async.get_profile(GUILD, USER)
+    await database_async.add_gold(GUILD, USER, 10)
+    payouts.append(ctx)
+
+
+async def test():
+    payouts = []
+    await asyncio.gather(invoke(payouts), invoke(payouts))
+    gold = (await database_async.get_profile(GUILD, USER))['gold']
+    print(f'concurrent: {len(payouts)} payout(s), gold={gold}')
+    assert len(payouts) == 1, payouts
+
+    # released cooldowns let the next invocation through
+    cooldowns.release(payouts[0])   # stands in for an expired cooldown
+    await invoke([], fail=True)
+    assert cooldowns.remaining(GUILD, USER, 'race_test') == 0
+    payouts = []
+    await asyncio.gather(invoke(payouts), invoke(payouts))
+    print(f'after release: {len(payouts)} payout(s)')
+    assert len(payouts) == 1, payouts
+    print('OK')
+
+
+if __name__ == '__main__':
+    asyncio.run(test())
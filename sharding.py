@@ -0,0 +1,46 @@
+"""Routing of guilds to database files.
+
+By default (``DB_SHARDS=0``) every guild lives in ``DB_PATH``. With
+``DB_SHARDS=N`` each guild is stored in one of N SQLite files under
+``DB_SHARD_DIR``, picked by ``guild_id % N``. Every table is keyed by
+``guild_id``, so a guild's rows never span files and each shard has its own
+write lock: a busy guild only serializes the guilds that share its shard.
+
+``database`` routes through :func:`path_for`; nothing else needs to know
+whether sharding is on. Split an existing ``bot.db`` with::
+
+    python scripts/shard_db.py --shards 8
+"""
+import os
+
+import config
+
+
+def shard_count() -> int:
+    return max(config.DB_SHARDS, 0)
+
+
+def shard_index(guild_id: int, shards: int) -> int:
+    # same expression as the split script's SQL (guild_id % N)
+    return int(guild_id) % shards
+
+
+def shard_path(index: int, directory: str | None = None) -> str:
+    return os.path.join(directory or config.DB_SHARD_DIR, f'shard_{index:03d}.db')
+
+
+def path_for(guild_id) -> str:
+    """Database file holding ``guild_id``'s rows."""
+    shards = config.DB_SHARDS
+    if shards <= 0:
+        return config.DB_PATH
+    # guild-less callers (DMs use guild 0) land in shard 0
+    return shard_path(shard_index(guild_id or 0, shards))
+
+
+def all_paths() -> list:
+    """Every database file in use, for maintenance jobs and cross-guild queries."""
+    shards = shard_count()
+    if shards == 0:
+        return [config.DB_PATH]
+    return [shard_path(i) for i in range(shards)]
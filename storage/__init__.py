@@ -0,0 +1,37 @@
+"""Storage backends behind the database helpers.
+
+``backend`` is the instance selected by ``STORAGE_BACKEND``:
+
+* ``sqlite`` (default) — ``database.py``: WAL, group commit, sharding, caches.
+* ``memory`` — plain dicts, nothing persisted; for load tests and dev bots.
+
+``database_async`` dispatches every helper to it. Sync code that runs on the
+DB thread (``run_db`` closures in cogs) should use it too rather than
+importing ``database`` directly, so it follows the selected backend::
+
+    from storage import backend as db
+
+    with db.transaction(guild_id):
+        db.add_gold(guild_id, user_id, 10)
+"""
+import config
+from storage.base import StorageBackend
+
+BACKENDS = ('sqlite', 'memory')
+
+
+def create_backend(name: str) -> StorageBackend:
+    name = (name or 'sqlite').lower()
+    # imported lazily so the memory backend never opens a database file
+    if name == 'sqlite':
+        from storage.sqlite import SQLiteBackend
+        return SQLiteBackend()
+    if name == 'memory':
+        from storage.memory import MemoryBackend
+        return MemoryBackend()
+    raise ValueError(f"unknown STORAGE_BACKEND {name!r}, expected one of {', '.join(BACKENDS)}")
+
+
+backend = create_backend(config.STORAGE_BACKEND)
+
+__all__ = ['StorageBackend', 'BACKENDS', 'create_backend', 'backend']
@@ -0,0 +1,310 @@
+"""The storage interface every backend implements.
+
+Method names, arguments and return shapes match the helpers in ``database.py``
+(which is what the SQLite backend delegates to), so ``database_async`` and the
+cogs work unchanged whichever backend is selected. Rows are returned as tuples
+in the same column order as the SQL helpers.
+
+Methods are synchronous and are called from a single thread (the DB executor
+in ``database_async``); backends do not need their own locking for that path.
+"""
+import abc
+import contextlib
+
+from models import XP_PERCENTILES, GuildConfig, PlayerSnapshot, XpStats, percentile_rank
+
+
+class StorageBackend(abc.ABC):
+    name = 'base'
+    # True if the read-only analytics helpers (database_async._READ_HELPERS)
+    # may run on other threads concurrently with the DB thread's writes
+    concurrent_reads = False
+
+    # ---- guild config -------------------------------------------------------
+    @abc.abstractmethod
+    def get_guild_config(self, guild_id) -> GuildConfig:
+        """Prefix and admin/mod roles for a guild (defaults when unset)."""
+
+    @abc.abstractmethod
+    def set_prefix_db(self, guild_id, prefix):
+        ...
+
+    @abc.abstractmethod
+    def set_roles_db(self, guild_id, admin, mod):
+        ...
+
+    def get_prefix_db(self, guild_id) -> str:
+        return self.get_guild_config(guild_id).prefix
+
+    def get_roles_db(self, guild_id):
+        """(admin_role, mod_role), or None when neither is set."""
+        conf = self.get_guild_config(guild_id)
+        if conf.admin_role is None and conf.mod_role is None:
+            return None
+        return conf.admin_role, conf.mod_role
+
+    # ---- xp -----------------------------------------------------------------
+    @abc.abstractmethod
+    def get_user_xp(self, guild_id, user_id) -> int:
+        ...
+
+    @abc.abstractmethod
+    def set_user_xp(self, guild_id, user_id, xp):
+        ...
+
+    @abc.abstractmethod
+    def add_user_xp(self, guild_id, user_id, delta) -> int:
+        """Add delta (creating the row) and return the new total."""
+
+    @abc.abstractmethod
+    def spend_user_xp(self, guild_id, user_id, amount):
+        """Deduct amount only if the user has it. New total, or None."""
+
+    @abc.abstractmethod
+    def get_leaderboard(self, guild_id, limit=10) -> list:
+        """[(user_id, xp), ...] highest first."""
+
+    @abc.abstractmethod
+    def get_all_user_xp(self, guild_id) -> list:
+        """[xp, ...] for every user in the guild."""
+
+    @abc.abstractmethod
+    def get_xp_rows(self, guild_id) -> list:
+        """[(user_id, xp), ...] for every user in the guild, unordered."""
+
+    def get_xp_stats(self, guild_id, percentiles=XP_PERCENTILES) -> XpStats:
+        """Count/sum/avg/min/max and nearest-rank percentiles of the guild's XP."""
+        xps = sorted(self.get_all_user_xp(guild_id))
+        if not xps:
+            return XpStats(0, 0, 0.0, 0, 0, {})
+        n = len(xps)
+        pct = {p: xps[percentile_rank(p, n) - 1] for p in percentiles}
+        return XpStats(n, sum(xps), sum(xps) / n, xps[0], xps[-1], pct)
+
+    def get_xp_histogram(self, guild_id, bucket_size=100) -> list:
+        """[(bucket_start, users), ...] ascending."""
+        counts = {}
+        for xp in self.get_all_user_xp(guild_id):
+            b = int(xp / bucket_size) * bucket_size  # truncates toward zero like SQLite
+            counts[b] = counts.get(b, 0) + 1
+        return sorted(counts.items())
+
+    # ---- shop ---------------------------------------------------------------
+    @abc.abstractmethod
+    def add_shop_item(self, guild_id, item_name, price, description='', atk=0, defn=0, slot='none'):
+        ...
+
+    @abc.abstractmethod
+    def add_shop_items_bulk(self, guild_id, items, replace=False) -> int:
+        """Upsert (name, price, desc[, atk, def, slot]) tuples; return how many."""
+
+    @abc.abstractmethod
+    def remove_shop_item(self, guild_id, item_name):
+        ...
+
+    @abc.abstractmethod
+    def list_shop_items(self, guild_id) -> list:
+        """[(item_name, price, description), ...]"""
+
+    @abc.abstractmethod
+    def list_shop_items_with_stats(self, guild_id) -> list:
+        """[(item_name, price, description, atk, def, slot), ...]"""
+
+    @abc.abstractmethod
+    def get_shop_item(self, guild_id, item_name):
+        """(item_name, price, description, atk, def, slot) or None."""
+
+    @abc.abstractmethod
+    def get_shop_item_with_stats(self, guild_id, item_name):
+        """Like get_shop_item, falling back to a slug match (models.slugify)."""
+
+    # ---- profile ------------------------------------------------------------
+    @abc.abstractmethod
+    def get_profile(self, guild_id, user_id) -> dict:
+        """{'max_hp', 'hp', 'atk', 'def', 'gold', 'equip_atk', 'equip_def'}; creates the default profile.
+
+        atk/def are base stats; equip_atk/equip_def are the totals of the
+        equipped items, kept current by set_equipped and shop stat changes.
+        """
+
+    @abc.abstractmethod
+    def update_profile(self, guild_id, user_id, **kwargs) -> bool:
+        """Set any of max_hp, hp, atk, def, gold. False if none was given."""
+
+    @abc.abstractmethod
+    def add_gold(self, guild_id, user_id, amount) -> int:
+        """Add gold (creating the profile) and return the new balance."""
+
+    @abc.abstractmethod
+    def spend_gold(self, guild_id, user_id, amount) -> bool:
+        """Debit gold only if the balance covers it."""
+
+    @abc.abstractmethod
+    def get_player_snapshot(self, guild_id, user_id) -> PlayerSnapshot:
+        ...
+
+    @abc.abstractmethod
+    def get_wins(self, guild_id, user_id) -> int:
+        ...
+
+    @abc.abstractmethod
+    def add_win(self, guild_id, user_id, amount: int = 1) -> int:
+        ...
+
+    @abc.abstractmethod
+    def get_onboarded(self, guild_id, user_id) -> bool:
+        ...
+
+    @abc.abstractmethod
+    def set_onboarded(self, guild_id, user_id):
+        ...
+
+    @abc.abstractmethod
+    def set_selected_badge(self, guild_id, user_id, badge_key: str):
+        ...
+
+    @abc.abstractmethod
+    def get_selected_badge(self, guild_id, user_id):
+        ...
+
+    def get_effective_profile(self, guild_id, user_id) -> dict:
+        """get_profile with equipment bonuses and active buffs applied to atk/def."""
+        out = self.get_profile(guild_id, user_id)
+        out['atk'] += out['equip_atk']
+        out['def'] += out['equip_def']
+        for bk, stat, amount, exp in self.get_active_buffs(guild_id, user_id):
+            if stat in ('atk', 'def'):
+                out[stat] += int(amount)
+        return out
+
+    # ---- inventory ----------------------------------------------------------
+    @abc.abstractmethod
+    def add_items_bulk(self, guild_id, user_id, items) -> dict:
+        """Add (item_name, qty) pairs; return the new {item_name: qty}."""
+
+    @abc.abstractmethod
+    def remove_items_bulk(self, guild_id, user_id, items) -> dict:
+        """Remove (item_name, qty) pairs, deleting rows at zero; return remaining {item_name: qty}."""
+
+    @abc.abstractmethod
+    def remove_item(self, guild_id, user_id, item_name, qty=1) -> bool:
+        """False if the user does not have the item."""
+
+    @abc.abstractmethod
+    def get_inventory(self, guild_id, user_id) -> list:
+        """[(item_name, qty, equipped, slot), ...]"""
+
+    @abc.abstractmethod
+    def set_equipped(self, guild_id, user_id, item_name, equipped: bool):
+        """Equip or unequip an item and refresh the player's equip_atk/equip_def."""
+
+    def add_item(self, guild_id, user_id, item_name, qty=1):
+        self.add_items_bulk(guild_id, user_id, [(item_name, qty)])
+
+    @abc.abstractmethod
+    def find_inventory_item(self, guild_id, user_id, item_name):
+        """(item_name, qty, equipped, slot) by exact name or slug, or None."""
+
+    def get_equipped_items(self, guild_id, user_id) -> list:
+        """[(item_name, qty, slot), ...] for equipped items."""
+        return [(name, qty, slot) for name, qty, equipped, slot in self.get_inventory(guild_id, user_id) if equipped]
+
+    # ---- cooldowns ----------------------------------------------------------
+    @abc.abstractmethod
+    def set_cooldown(self, guild_id, user_id, command, ts=None):
+        ...
+
+    @abc.abstractmethod
+    def get_cooldown(self, guild_id, user_id, command):
+        """Last use timestamp or None."""
+
+    @abc.abstractmethod
+    def get_active_cooldowns(self, command, since) -> list:
+        """[(guild_id, user_id, last_used), ...] for uses after since, all guilds."""
+
+    @abc.abstractmethod
+    def set_cooldowns_bulk(self, rows):
+        """Upsert (guild_id, user_id, command, last_used) rows."""
+
+    # ---- daily quests -------------------------------------------------------
+    @abc.abstractmethod
+    def get_daily_quest(self, guild_id, user_id):
+        """Today's quest as a dict, or None."""
+
+    @abc.abstractmethod
+    def create_daily_quest(self, guild_id, user_id, quest_key: str, target: int = 1, reward_gold: int = 0,
+                           reward_xp: int = 0, reward_item: str | None = None):
+        ...
+
+    @abc.abstractmethod
+    def increment_daily_progress(self, guild_id, user_id, amount: int = 1) -> dict:
+        """Advance today's quest and pay out rewards on completion.
+
+        Rewards are paid once; the completed quest stays as today's quest.
+        ``claimed`` is True only for the call that completed it.
+        """
+
+    # ---- buffs --------------------------------------------------------------
+    @abc.abstractmethod
+    def add_buff(self, guild_id, user_id, buff_key: str, stat: str, amount: int, duration_seconds: int):
+        ...
+
+    @abc.abstractmethod
+    def get_active_buffs(self, guild_id, user_id) -> list:
+        """[(buff_key, stat, amount, expires_ts), ...] not yet expired."""
+
+    @abc.abstractmethod
+    def cleanup_expired_buffs(self):
+        ...
+
+    @abc.abstractmethod
+    def delete_buff(self, guild_id, user_id, buff_key: str):
+        ...
+
+    # ---- achievements -------------------------------------------------------
+    @abc.abstractmethod
+    def award_achievement(self, guild_id, user_id, badge_key: str):
+        ...
+
+    @abc.abstractmethod
+    def list_user_achievements(self, guild_id, user_id) -> list:
+        """[(badge_key, earned_ts), ...]"""
+
+    # ---- ledger -------------------------------------------------------------
+    @abc.abstractmethod
+    def append_ledger(self, rows):
+        """Store (guild_id, user_id, kind, item, delta, reason, ts) rows (see ledger.py)."""
+
+    @abc.abstractmethod
+    def get_ledger_history(self, guild_id, user_id, limit=20, kind=None) -> list:
+        """[(kind, item, delta, reason, ts), ...] newest first."""
+
+    @abc.abstractmethod
+    def get_ledger_summary(self, guild_id, since=0) -> list:
+        """[(kind, item, reason, created, destroyed, entries), ...] largest movement first."""
+
+    # ---- housekeeping -------------------------------------------------------
+    def purge_expired_batch(self, kind, limit=500) -> int:
+        """Delete up to limit expired rows of kind ('buffs', 'daily_quests', 'cooldowns')."""
+        return 0
+
+    def compact(self, vacuum_pages=1000) -> dict:
+        """Reclaim free space; returns {'pages_freed', 'pages_free'}."""
+        return {'pages_freed': 0, 'pages_free': 0}
+
+    # ---- lifecycle ----------------------------------------------------------
+    @abc.abstractmethod
+    def transaction(self, guild_id=None) -> contextlib.AbstractContextManager:
+        """Context manager: everything inside commits together or not at all."""
+
+    def check_query_plans(self) -> dict:
+        return {}
+
+    def flush(self):
+        """Persist deferred writes, if the backend defers any."""
+
+    def pending_writes(self) -> int:
+        return 0
+
+    def close(self):
+        """Release connections/files on shutdown."""
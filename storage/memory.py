@@ -0,0 +1,443 @@
+"""Pure in-memory backend for load tests and throwaway dev bots.
+
+Everything lives in plain dicts keyed like the SQLite primary keys and is lost
+when the process exits. Transactions keep an undo log: every write records the
+value it replaced, and a block that raises puts those values back in reverse.
+
+Select it with ``STORAGE_BACKEND=memory``.
+"""
+import contextlib
+import heapq
+import time
+
+import cache
+import config
+import ledger
+import ranks
+from models import GuildConfig, PlayerSnapshot, slugify
+from storage.base import StorageBackend
+
+_MISSING = object()
+
+_PROFILE_DEFAULTS = {
+    'max_hp': 100, 'hp': 100, 'atk': 10, 'def': 5, 'gold': 0, 'equip_atk': 0, 'equip_def': 0,
+    'wins': 0, 'onboarded': 0, 'selected_badge': None,
+}
+_PROFILE_FIELDS = ('max_hp', 'hp', 'atk', 'def', 'gold')
+_EQUIP_FIELDS = ('equip_atk', 'equip_def')
+
+
+class MemoryBackend(StorageBackend):
+    name = 'memory'
+
+    def __init__(self):
+        self._prefix = {}        # guild_id -> prefix
+        self._roles = {}         # guild_id -> (admin_role, mod_role)
+        self._xp = {}            # guild_id -> {user_id: xp}
+        self._shop = {}          # guild_id -> {item_name: (price, description, atk, def, slot)}
+        self._shop_slugs = {}    # guild_id -> {slug: item_name}, alphabetically first name per slug
+        self._profiles = {}      # (guild_id, user_id) -> profile dict (replaced, never mutated)
+        self._inventory = {}     # (guild_id, user_id) -> {item_name: (qty, equipped, slot, atk, def)}
+        self._cooldowns = {}     # (guild_id, user_id, command) -> last_used
+        self._quests = {}        # (guild_id, user_id, date) -> quest dict (replaced, never mutated)
+        self._buffs = {}         # (guild_id, user_id) -> {buff_key: (stat, amount, expires_ts)}
+        self._achievements = {}  # (guild_id, user_id) -> {badge_key: earned_ts}
+        self._ledger = []        # (guild_id, user_id, kind, item, delta, reason, ts), append-only
+        self._undo = None        # [(dict, key, old value or _MISSING)] inside transaction()
+
+    # ---- write primitives (undo-logged) -------------------------------------
+    def _put(self, d: dict, key, value):
+        if self._undo is not None:
+            self._undo.append((d, key, d.get(key, _MISSING)))
+        d[key] = value
+
+    def _pop(self, d: dict, key):
+        if key in d:
+            if self._undo is not None:
+                self._undo.append((d, key, d[key]))
+            del d[key]
+
+    @staticmethod
+    def _child(d: dict, key) -> dict:
+        # containers are created outside the undo log; an empty one is harmless
+        return d.setdefault(key, {})
+
+    @contextlib.contextmanager
+    def transaction(self, guild_id=None):
+        outer = self._undo is None
+        if outer:
+            self._undo = []
+        mark = len(self._undo)
+        ledger_mark = ledger.position()
+        try:
+            yield self
+        except BaseException:
+            ledger.discard_since(ledger_mark)
+            for d, key, old in reversed(self._undo[mark:]):
+                if old is _MISSING:
+                    d.pop(key, None)
+                else:
+                    d[key] = old
+            del self._undo[mark:]
+            ranks.clear()
+            raise
+        finally:
+            if outer:
+                self._undo = None
+
+    # ---- guild config -------------------------------------------------------
+    def get_guild_config(self, guild_id):
+        # same cache entry database_async's fast path reads
+        conf = cache.guild_configs.get(guild_id)
+        if conf is not cache._MISSING:
+            return conf
+        admin, mod = self._roles.get(guild_id, (None, None))
+        conf = GuildConfig(guild_id, self._prefix.get(guild_id) or '!', admin, mod)
+        cache.guild_configs.put(guild_id, conf)
+        return conf
+
+    def set_prefix_db(self, guild_id, prefix):
+        self._put(self._prefix, guild_id, prefix)
+        cache.guild_configs.invalidate(guild_id)
+
+    def set_roles_db(self, guild_id, admin, mod):
+        self._put(self._roles, guild_id, (admin, mod))
+        cache.guild_configs.invalidate(guild_id)
+
+    # ---- xp -----------------------------------------------------------------
+    def get_user_xp(self, guild_id, user_id):
+        return self._xp.get(guild_id, {}).get(user_id, 0)
+
+    def set_user_xp(self, guild_id, user_id, xp):
+        if ledger.enabled():
+            ledger.record(guild_id, user_id, 'xp', xp - self.get_user_xp(guild_id, user_id))
+        self._put(self._child(self._xp, guild_id), user_id, xp)
+        ranks.update(guild_id, user_id, xp)
+
+    def add_user_xp(self, guild_id, user_id, delta):
+        new = self.get_user_xp(guild_id, user_id) + delta
+        self.set_user_xp(guild_id, user_id, new)
+        return new
+
+    def spend_user_xp(self, guild_id, user_id, amount):
+        xp = self._xp.get(guild_id, {}).get(user_id)
+        if xp is None or xp < amount:
+            return None
+        self.set_user_xp(guild_id, user_id, xp - amount)
+        return xp - amount
+
+    def get_leaderboard(self, guild_id, limit=10):
+        return heapq.nlargest(limit, self._xp.get(guild_id, {}).items(), key=lambda kv: kv[1])
+
+    def get_all_user_xp(self, guild_id):
+        return list(self._xp.get(guild_id, {}).values())
+
+    def get_xp_rows(self, guild_id):
+        return list(self._xp.get(guild_id, {}).items())
+
+    # ---- ledger -------------------------------------------------------------
+    def append_ledger(self, rows):
+        self._ledger.extend(tuple(r) for r in rows)
+
+    def get_ledger_history(self, guild_id, user_id, limit=20, kind=None):
+        rows = [r for r in self._ledger if r[0] == guild_id and r[1] == user_id and (not kind or r[2] == kind)]
+        # sorted() is stable, so reversing also puts the newest first within a second
+        rows = sorted(rows, key=lambda r: r[6])[::-1]
+        return [(r[2], r[3], r[4], r[5], r[6]) for r in rows[:limit]]
+
+    def get_ledger_summary(self, guild_id, since=0):
+        groups = {}
+        for g, u, kind, item, delta, reason, ts in self._ledger:
+            if g == guild_id and ts >= since:
+                created, destroyed, n, moved = groups.get((kind, item, reason), (0, 0, 0, 0))
+                groups[(kind, item, reason)] = (created + max(delta, 0), destroyed + max(-delta, 0), n + 1, moved + abs(delta))
+        ordered = sorted(groups.items(), key=lambda kv: -kv[1][3])
+        return [(*key, created, destroyed, n) for key, (created, destroyed, n, moved) in ordered]
+
+    # ---- shop ---------------------------------------------------------------
+    def add_shop_item(self, guild_id, item_name, price, description='', atk=0, defn=0, slot='none'):
+        self._put(self._child(self._shop, guild_id), item_name, (price, description, atk, defn, slot))
+        self._sync_item_stats(guild_id, item_name, atk or 0, defn or 0)
+        slugs = self._child(self._shop_slugs, guild_id)
+        slug = slugify(item_name)
+        if slug not in slugs or item_name < slugs[slug]:
+            self._put(slugs, slug, item_name)
+
+    def add_shop_items_bulk(self, guild_id, items, replace=False):
+        with self.transaction(guild_id):
+            if replace:
+                for name in list(self._shop.get(guild_id, {})):
+                    self.remove_shop_item(guild_id, name)
+            n = 0
+            for item in items:
+                self.add_shop_item(guild_id, *(tuple(item) + (0, 0, 'none'))[:6])
+                n += 1
+        return n
+
+    def remove_shop_item(self, guild_id, item_name):
+        shop = self._shop.get(guild_id, {})
+        if item_name not in shop:
+            return
+        self._pop(shop, item_name)
+        slugs = self._shop_slugs.get(guild_id, {})
+        slug = slugify(item_name)
+        if slugs.get(slug) == item_name:
+            # another item may share the slug (rare): hand the key over to it
+            rest = sorted(n for n in shop if slugify(n) == slug)
+            if rest:
+                self._put(slugs, slug, rest[0])
+            else:
+                self._pop(slugs, slug)
+
+    def _sync_item_stats(self, guild_id, item_name, atk, defn):
+        for (g, user_id), inv in self._inventory.items():
+            row = inv.get(item_name) if g == guild_id else None
+            if row and row[3:] != (atk, defn):
+                self._put(inv, item_name, (*row[:3], atk, defn))
+                if row[1]:
+                    self._refresh_equipment(guild_id, user_id)
+
+    def list_shop_items(self, guild_id):
+        return [(name, row[0], row[1]) for name, row in self._shop.get(guild_id, {}).items()]
+
+    def list_shop_items_with_stats(self, guild_id):
+        return [(name, *row) for name, row in self._shop.get(guild_id, {}).items()]
+
+    def get_shop_item(self, guild_id, item_name):
+        row = self._shop.get(guild_id, {}).get(item_name)
+        return (item_name, *row) if row else None
+
+    def get_shop_item_with_stats(self, guild_id, item_name):
+        row = self.get_shop_item(guild_id, item_name)
+        if row:
+            return row
+        name = self._shop_slugs.get(guild_id, {}).get(slugify(item_name))
+        return self.get_shop_item(guild_id, name) if name else None
+
+    # ---- profile ------------------------------------------------------------
+    def _profile_row(self, guild_id, user_id) -> dict:
+        key = (guild_id, user_id)
+        row = self._profiles.get(key)
+        if row is None:
+            row = dict(_PROFILE_DEFAULTS)
+            self._put(self._profiles, key, row)
+        return row
+
+    def _update_row(self, guild_id, user_id, **fields):
+        row = self._profile_row(guild_id, user_id)
+        if 'gold' in fields:
+            ledger.record(guild_id, user_id, 'gold', fields['gold'] - row['gold'])
+        self._put(self._profiles, (guild_id, user_id), {**row, **fields})
+
+    def get_profile(self, guild_id, user_id):
+        row = self._profile_row(guild_id, user_id)
+        return {k: row[k] for k in _PROFILE_FIELDS + _EQUIP_FIELDS}
+
+    def update_profile(self, guild_id, user_id, **kwargs):
+        fields = {k: v for k, v in kwargs.items() if k in _PROFILE_FIELDS}
+        if not fields:
+            return False
+        # like the SQL UPDATE, a missing profile is not created
+        if (guild_id, user_id) in self._profiles:
+            self._update_row(guild_id, user_id, **fields)
+        return True
+
+    def add_gold(self, guild_id, user_id, amount):
+        new = self._profile_row(guild_id, user_id)['gold'] + amount
+        self._update_row(guild_id, user_id, gold=new)
+        return new
+
+    def spend_gold(self, guild_id, user_id, amount):
+        row = self._profiles.get((guild_id, user_id))
+        if row is None or row['gold'] < amount:
+            return False
+        self._update_row(guild_id, user_id, gold=row['gold'] - amount)
+        return True
+
+    def get_player_snapshot(self, guild_id, user_id):
+        row = self._profile_row(guild_id, user_id)
+        return PlayerSnapshot(
+            guild_id, user_id, row['max_hp'], row['hp'], row['atk'], row['def'], row['gold'],
+            row['equip_atk'], row['equip_def'], self.get_user_xp(guild_id, user_id), int(row['wins'] or 0), bool(row['onboarded']),
+            row['selected_badge'] or None,
+            tuple(self.get_active_buffs(guild_id, user_id)), tuple(self.get_inventory(guild_id, user_id)),
+        )
+
+    def get_wins(self, guild_id, user_id):
+        return int(self._profile_row(guild_id, user_id)['wins'] or 0)
+
+    def add_win(self, guild_id, user_id, amount: int = 1):
+        new = self.get_wins(guild_id, user_id) + amount
+        self._update_row(guild_id, user_id, wins=new)
+        return new
+
+    def get_onboarded(self, guild_id, user_id):
+        return bool(self._profile_row(guild_id, user_id)['onboarded'])
+
+    def set_onboarded(self, guild_id, user_id):
+        self._update_row(guild_id, user_id, onboarded=1)
+
+    def set_selected_badge(self, guild_id, user_id, badge_key: str):
+        self._update_row(guild_id, user_id, selected_badge=badge_key)
+
+    def get_selected_badge(self, guild_id, user_id):
+        row = self._profiles.get((guild_id, user_id))
+        return row['selected_badge'] if row and row['selected_badge'] else None
+
+    # ---- inventory ----------------------------------------------------------
+    def add_items_bulk(self, guild_id, user_id, items):
+        inv = self._child(self._inventory, (guild_id, user_id))
+        shop = self._shop.get(guild_id, {})
+        out = {}
+        for name, qty in items:
+            item = shop.get(name)
+            atk, defn, slot = (item[2] or 0, item[3] or 0, item[4]) if item else (0, 0, 'none')
+            # like the SQL upsert, a re-added item keeps its stats (shop changes sync them)
+            old_qty, equipped, _, atk, defn = inv.get(name, (0, 0, slot, atk, defn))
+            self._put(inv, name, (old_qty + qty, equipped, slot, atk, defn))
+            ledger.record(guild_id, user_id, 'item', qty, name)
+            out[name] = old_qty + qty
+        return out
+
+    def remove_items_bulk(self, guild_id, user_id, items):
+        inv = self._inventory.get((guild_id, user_id), {})
+        out = {}
+        for name, qty in items:
+            if name in inv:
+                have, equipped = inv[name][:2]
+                left = have - qty
+                if left <= 0:
+                    self._pop(inv, name)
+                    if equipped:
+                        self._refresh_equipment(guild_id, user_id)
+                else:
+                    self._put(inv, name, (left, *inv[name][1:]))
+                ledger.record(guild_id, user_id, 'item', -min(have, qty), name)
+            out[name] = inv[name][0] if name in inv else 0
+        return out
+
+    def remove_item(self, guild_id, user_id, item_name, qty=1):
+        if item_name not in self._inventory.get((guild_id, user_id), {}):
+            return False
+        self.remove_items_bulk(guild_id, user_id, [(item_name, qty)])
+        return True
+
+    def find_inventory_item(self, guild_id, user_id, item_name):
+        inv = self._inventory.get((guild_id, user_id), {})
+        if item_name not in inv:
+            # a user's inventory is small; no per-user slug map
+            slug = slugify(item_name)
+            item_name = min((n for n in inv if slugify(n) == slug), default=None)
+        return (item_name, *inv[item_name][:3]) if item_name is not None else None
+
+    def get_inventory(self, guild_id, user_id):
+        return [(name, *row[:3]) for name, row in self._inventory.get((guild_id, user_id), {}).items()]
+
+    def set_equipped(self, guild_id, user_id, item_name, equipped: bool):
+        inv = self._inventory.get((guild_id, user_id), {})
+        if item_name in inv:
+            qty, _, *rest = inv[item_name]
+            self._put(inv, item_name, (qty, 1 if equipped else 0, *rest))
+            self._refresh_equipment(guild_id, user_id)
+
+    def _refresh_equipment(self, guild_id, user_id):
+        rows = [row for row in self._inventory.get((guild_id, user_id), {}).values() if row[1]]
+        self._update_row(guild_id, user_id, equip_atk=sum(r[3] for r in rows), equip_def=sum(r[4] for r in rows))
+
+    # ---- cooldowns ----------------------------------------------------------
+    def set_cooldown(self, guild_id, user_id, command, ts=None):
+        self._put(self._cooldowns, (guild_id, user_id, command), int(time.time()) if ts is None else ts)
+
+    def get_cooldown(self, guild_id, user_id, command):
+        return self._cooldowns.get((guild_id, user_id, command))
+
+    def get_active_cooldowns(self, command, since):
+        return [(g, u, ts) for (g, u, c), ts in self._cooldowns.items() if c == command and ts > since]
+
+    def set_cooldowns_bulk(self, rows):
+        for guild_id, user_id, command, ts in rows:
+            self.set_cooldown(guild_id, user_id, command, ts)
+
+    # ---- daily quests -------------------------------------------------------
+    def get_daily_quest(self, guild_id, user_id):
+        q = self._quests.get((guild_id, user_id, time.strftime('%Y-%m-%d')))
+        if q is None or (q['created_ts'] and time.time() - q['created_ts'] >= 86400):
+            return None
+        return dict(q)
+
+    def create_daily_quest(self, guild_id, user_id, quest_key: str, target: int = 1, reward_gold: int = 0,
+                           reward_xp: int = 0, reward_item: str | None = None):
+        self._put(self._quests, (guild_id, user_id, time.strftime('%Y-%m-%d')), {
+            'quest_key': quest_key, 'progress': 0, 'target': target, 'completed': False,
+            'reward_gold': reward_gold, 'reward_xp': reward_xp, 'reward_item': reward_item,
+            'created_ts': int(time.time()),
+        })
+
+    def increment_daily_progress(self, guild_id, user_id, amount: int = 1):
+        with self.transaction(guild_id):
+            key = (guild_id, user_id, time.strftime('%Y-%m-%d'))
+            q = self.get_daily_quest(guild_id, user_id)
+            if not q:
+                return {'error': 'no_quest'}
+            if q['completed']:
+                return {'completed': True, 'claimed': False, 'progress': q['progress'], 'target': q['target'],
+                        'rewards': {}}
+            new_progress = q['progress'] + amount
+            claimed = new_progress >= q['target']
+            # the finished quest stays as today's completed marker
+            self._put(self._quests, key, {**q, 'progress': new_progress, 'completed': claimed})
+            rewards = {}
+            if claimed:
+                if q['reward_xp'] and q['reward_xp'] > 0:
+                    self.add_user_xp(guild_id, user_id, q['reward_xp'])
+                    rewards['xp'] = q['reward_xp']
+                if q['reward_gold'] and q['reward_gold'] > 0:
+                    self.add_gold(guild_id, user_id, q['reward_gold'])
+                    rewards['gold'] = q['reward_gold']
+                if q['reward_item']:
+                    self.add_item(guild_id, user_id, q['reward_item'], qty=1)
+                    rewards['item'] = q['reward_item']
+            return {'completed': claimed, 'claimed': claimed, 'progress': new_progress, 'target': q['target'],
+                    'rewards': rewards}
+
+    # ---- buffs --------------------------------------------------------------
+    def add_buff(self, guild_id, user_id, buff_key: str, stat: str, amount: int, duration_seconds: int):
+        buffs = self._child(self._buffs, (guild_id, user_id))
+        self._put(buffs, buff_key, (stat, amount, int(time.time()) + int(duration_seconds)))
+
+    def get_active_buffs(self, guild_id, user_id):
+        now = int(time.time())
+        return [(k, stat, amount, exp) for k, (stat, amount, exp) in self._buffs.get((guild_id, user_id), {}).items()
+                if exp > now]
+
+    def purge_expired_batch(self, kind, limit=500):
+        now = int(time.time())
+        if kind == 'buffs':
+            rows = [(buffs, k) for buffs in self._buffs.values() for k, (_, _, exp) in buffs.items() if exp <= now]
+        elif kind == 'daily_quests':
+            today = time.strftime('%Y-%m-%d')
+            rows = [(self._quests, key) for key in self._quests if key[2] < today]
+        elif kind == 'cooldowns':
+            cutoff = now - config.COOLDOWN_RETENTION_SECONDS
+            rows = [(self._cooldowns, key) for key, ts in self._cooldowns.items() if ts < cutoff]
+        else:
+            raise KeyError(kind)
+        for d, key in rows[:limit]:
+            self._pop(d, key)
+        return min(len(rows), limit)
+
+    def cleanup_expired_buffs(self):
+        now = int(time.time())
+        for buffs in self._buffs.values():
+            for k in [k for k, (_, _, exp) in buffs.items() if exp <= now]:
+                self._pop(buffs, k)
+
+    def delete_buff(self, guild_id, user_id, buff_key: str):
+        self._pop(self._buffs.get((guild_id, user_id), {}), buff_key)
+
+    # ---- achievements -------------------------------------------------------
+    def award_achievement(self, guild_id, user_id, badge_key: str):
+        self._put(self._child(self._achievements, (guild_id, user_id)), badge_key, int(time.time()))
+
+    def list_user_achievements(self, guild_id, user_id):
+        return list(self._achievements.get((guild_id, user_id), {}).items())
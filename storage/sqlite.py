@@ -0,0 +1,21 @@
+"""SQLite backend: the helpers in ``database.py``, unchanged."""
+import abc
+
+import database
+from storage.base import StorageBackend
+
+
+class SQLiteBackend(StorageBackend):
+    """Every interface method is the ``database`` function of the same name."""
+    name = 'sqlite'
+    concurrent_reads = True   # read-only WAL connections, see database.get_read_conn
+
+    def close(self):
+        database.close_connections()
+
+
+for _name in dir(StorageBackend):
+    if not _name.startswith('_') and hasattr(database, _name) and callable(getattr(database, _name)):
+        setattr(SQLiteBackend, _name, staticmethod(getattr(database, _name)))
+del _name
+abc.update_abstractmethods(SQLiteBackend)